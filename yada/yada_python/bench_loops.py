@@ -0,0 +1,74 @@
+import argparse
+import sys
+import threading
+import time
+
+from yada.yada_python.yada_lexer import Lexer
+from yada.yada_python.yada_parser import Parser
+from yada.yada_python.yada_object import new_environment
+from yada.yada_python.yada_evaluator import Interpreter
+
+# Each Yada call is a dozen or so Python frames, so the recursive version is
+# run as several shallower recursions that add up to the same iteration count.
+RECURSION_DEPTH = 10000
+
+WHILE_LOOP = """
+let i = 0;
+while (i < {n}) {{ let i = i + 1; }};
+i;
+"""
+
+FOR_LOOP = """
+let i = 0;
+for (x in range({n})) {{ let i = i + 1; }};
+i;
+"""
+
+RECURSIVE = """
+let count = fn(i, n) {{ if (i < n) {{ count(i + 1, n) }} else {{ i }} }};
+count(0, {n});
+"""
+
+def parse(source: str):
+    p = Parser(Lexer(source))
+    program = p.parse_program()
+    if len(p.errors) != 0:
+        raise Exception(f"benchmark source did not parse: {p.errors}")
+    return program
+
+def time_program(source: str, interp: Interpreter, repeat: int = 1) -> float:
+    program = parse(source)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        evaluated = interp.eval(program, new_environment())
+        if evaluated is None or evaluated.type().value == "ERROR":
+            raise Exception(f"benchmark failed: {evaluated.inspect() if evaluated else evaluated}")
+    return time.perf_counter() - start
+
+def report(name: str, seconds: float, iterations: int):
+    print(f"{name:<10} {iterations:>9} iterations {seconds:8.3f}s {seconds / iterations * 1e9:10.0f} ns/iter")
+
+def run(iterations: int, interp: Interpreter):
+    report("while", time_program(WHILE_LOOP.format(n=iterations), interp), iterations)
+    report("for", time_program(FOR_LOOP.format(n=iterations), interp), iterations)
+    depth = min(iterations, RECURSION_DEPTH)
+    repeat = max(iterations // depth, 1)
+    report("recursive", time_program(RECURSIVE.format(n=depth), interp, repeat), depth * repeat)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compare native loops against recursion")
+    arg_parser.add_argument("-n", "--iterations", type=int, default=1000000)
+    # Limits far above what the benchmarks need, to measure what checking them costs
+    arg_parser.add_argument("--max-steps", type=int, default=None)
+    arg_parser.add_argument("--timeout", type=float, default=None)
+    args = arg_parser.parse_args()
+    interp = Interpreter(max_steps=args.max_steps, timeout=args.timeout)
+
+    sys.setrecursionlimit(RECURSION_DEPTH * 20)
+    threading.stack_size(512 * 1024 * 1024)
+    t = threading.Thread(target=run, args=(args.iterations, interp))
+    t.start()
+    t.join()
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
-from yada_ast import Program, LetStatement, Identifier
+import json
+from yada_ast import Program, LetStatement, Identifier, iter_json
 from yada_token import Token, TokenEnum
+from yada_lexer import Lexer
+from yada_parser import Parser
 
 def test_string():
     # let myVar = anotherVar;
@@ -16,4 +19,16 @@ def test_string():
             ),
         )
     ])
-    assert program.string() == "let myVar = anotherVar;", f"program.string() wrong, got={program.string()}"
\ No newline at end of file
+    assert program.string() == "let myVar = anotherVar;", f"program.string() wrong, got={program.string()}"
+
+def test_iter_json():
+    inputs = [
+        "let x = 1; let f = fn(a, b) { return a + b; }; f(x, -2);",
+        'if (x < 1) { "a" } else { [1, 2][0] }',
+        'for (i in range(3)) { while (!true) { {"k": i}["k"] } }',
+    ]
+    for inp in inputs:
+        program = Parser(Lexer(inp)).parse_program()
+        expected = json.dumps(program.to_json())
+        actual = "".join(iter_json(program))
+        assert actual == expected, f"iter_json() differs from to_json(), got={actual}"
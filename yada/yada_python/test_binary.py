@@ -0,0 +1,96 @@
+import json
+import pytest
+from yada_binary import encode_program, decode_program, encode_value, decode_value, encode_environment, decode_environment
+from yada_lexer import Lexer
+from yada_parser import Parser
+from yada_object import new_environment, Integer, String, Builtin, Sequence
+from yada_evaluator import Eval, TRUE, NULL, BUILTINS
+
+PROGRAMS = [
+    "let x = 1; let f = fn(a, b) { return a + b; }; f(x, -2);",
+    'if (x < 1) { "a" } else { [1, 2][0] }',
+    'let h = {"k": 1, 2: true}; h["k"] + h[2 - 0];',
+    'let s = 0; for (i in range(3)) { while (s < 100) { let s = s + i + 1; } }; s;',
+    "let big = 12345678901234567890123; big * -big;",
+]
+
+def parse(inp: str):
+    p = Parser(Lexer(inp))
+    program = p.parse_program()
+    assert len(p.errors) == 0, f"parser errors: {p.errors}"
+    return program
+
+def test_program_round_trip():
+    for inp in PROGRAMS:
+        program = parse(inp)
+        data = encode_program(program)
+        decoded = decode_program(data)
+        assert decoded.string() == program.string(), f"decoded program string wrong, got={decoded.string()}"
+        assert decoded.to_json() == program.to_json(), f"decoded program JSON differs for {inp}"
+        expected = Eval(program, new_environment())
+        actual = Eval(decoded, new_environment())
+        assert actual.inspect() == expected.inspect(), f"decoded program evaluates differently, got={actual.inspect()}, want={expected.inspect()}"
+        size = len(json.dumps(program.to_json()).encode("utf-8"))
+        assert len(data) < size / 4, f"encoding not compact, got={len(data)} bytes, JSON={size} bytes"
+
+def test_value_round_trip():
+    inputs = [
+        "5", "-300", "10 / 4", "true", "false", '"hello"',
+        '[1, "two", [3], [[]]]', "range(100)", "range(5)", "range(40) * 2",
+        'len(1)',
+    ]
+    for inp in inputs:
+        value = Eval(parse(inp), new_environment())
+        if type(value) == Sequence:
+            value.materialize()
+        decoded = decode_value(encode_value(value))
+        assert decoded.type() == value.type(), f"decoded type wrong for {inp}, got={decoded.type()}"
+        actual, expected = json.dumps(decoded.to_json()), json.dumps(value.to_json())
+        assert actual == expected, f"decoded value wrong for {inp}, got={actual}, want={expected}"
+    h = decode_value(encode_value(Eval(parse('{"a": 1, 2: "b", true: 3}'), new_environment())))
+    for key, want in [(String("a"), 1), (Integer(2), "b"), (TRUE, 3)]:
+        got = h.pairs[key.hash_key()].value.value
+        assert got == want, f"decoded hash lookup wrong for {key.inspect()}, got={got}, want={want}"
+    assert decode_value(encode_value(TRUE)) is TRUE, "booleans should decode to the TRUE/FALSE singletons"
+    assert decode_value(encode_value(NULL)) is NULL, "null should decode to the NULL singleton"
+
+def test_decode_errors():
+    program = encode_program(parse("1"))
+    with pytest.raises(ValueError):
+        decode_value(program)
+    with pytest.raises(ValueError):
+        decode_program(b"XYZ" + program[3:])
+    with pytest.raises(ValueError):
+        encode_value(Builtin(lambda interp: NULL))
+    with pytest.raises(ValueError):
+        decode_environment(program)
+    # Its elements would be computed outside of any run's limits
+    with pytest.raises(ValueError):
+        encode_value(Eval(parse("range(100000000)"), new_environment()))
+
+def test_environment_round_trip():
+    inp = """
+    let base = [1, 2, 3];
+    let also = base;
+    let h = {"a": base, 1: "one"};
+    let adder = fn(x) { fn(y) { x + y } };
+    let addtwo = adder(2);
+    let fact = fn(n) { if (n < 2) { 1 } else { n * fact(n - 1) } };
+    let fast = memo(fact);
+    fast(5);
+    let p = puts;
+    let big = array(range(50)) * 2;
+    """
+    env = new_environment(100)
+    Eval(parse(inp), env)
+    restored = decode_environment(encode_environment(env))
+    assert restored.get("also") is restored.get("base"), "shared array should stay shared"
+    assert restored.get("h").pairs[String("a").hash_key()].value is restored.get("base"), "array shared with a hash should stay shared"
+    assert restored.get("addtwo").env.outer is restored, "closure should point at the restored global environment"
+    assert restored.get("adder").body is not None and restored.get("fact").env is restored, "recursive closure should see its environment"
+    assert restored.get("p") is BUILTINS["puts"], "builtins should be restored from the builtin table"
+    assert restored.memo_budget.remaining == 100, f"memo budget not handed back, got={restored.memo_budget.remaining}"
+    assert restored.get("fast").hits == 0 and restored.get("fast").misses == 1, "memo stats not kept"
+    for check, want in [("addtwo(40)", "42"), ("fact(6)", "720"), ("fast(6)", "720"), ("h[1]", "one"), ("big[49]", "98"), ("len(also)", "3")]:
+        got = Eval(parse(check), restored)
+        assert got.inspect() == want, f"wrong result for {check} in restored environment, got={got.inspect()}, want={want}"
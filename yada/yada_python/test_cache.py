@@ -0,0 +1,100 @@
+import os
+import struct
+import yada_cache
+from yada_cache import ProgramCache, default_cache
+from yada_evaluator import Interpreter
+from yada_lexer import Lexer
+from yada_parser import Parser
+
+def parse(inp: str):
+    return Parser(Lexer(inp)).parse_program()
+
+def test_memory_tier():
+    cache = ProgramCache(max_entries=2)
+    for inp in ["1", "2", "3"]:
+        cache.put(inp, parse(inp))
+    assert cache.get("1") is None, "least recently used entry should be evicted"
+    program = cache.get("3")
+    assert program is not None and program.string() == "3", f"cached program wrong, got={program}"
+    assert cache.get("3") is program, "memory hits should return the same Program"
+    assert cache.stats == {"memory_hits": 2, "disk_hits": 0, "misses": 1}, f"stats wrong, got={cache.stats}"
+
+def test_disk_tier(tmp_path):
+    inp = "let add = fn(a, b) { a + b }; add(1, 2);"
+    ProgramCache(str(tmp_path)).put(inp, parse(inp))
+    cache = ProgramCache(str(tmp_path))
+    program = cache.get(inp)
+    assert program is not None, "program should be read back from disk"
+    assert program.string() == parse(inp).string(), f"program from disk wrong, got={program.string()}"
+    cache.get(inp)
+    assert cache.stats == {"memory_hits": 1, "disk_hits": 1, "misses": 0}, f"stats wrong, got={cache.stats}"
+
+def test_disk_eviction(tmp_path):
+    cache = ProgramCache(str(tmp_path), max_disk_bytes=400)
+    inputs = [f"let x{i} = [{i}, {i + 1}, {i + 2}]; x{i}[0] + {i};" for i in range(20)]
+    for i, inp in enumerate(inputs):
+        cache.put(inp, parse(inp))
+        path = cache._path(cache.key(inp))
+        os.utime(path, (i, i))
+    files = cache._files()
+    total = sum(size for _, size, _ in files)
+    assert total <= 400, f"disk tier too large, got={total} bytes"
+    assert 0 < len(files) < len(inputs), f"wrong number of files kept, got={len(files)}"
+    fresh = ProgramCache(str(tmp_path))
+    assert fresh.get(inputs[-1]) is not None, "newest program should be kept"
+    assert fresh.get(inputs[0]) is None, "oldest program should be evicted"
+
+def test_corrupt_file(tmp_path):
+    inp = "1 + 2"
+    cache = ProgramCache(str(tmp_path))
+    cache.put(inp, parse(inp))
+    path = cache._path(cache.key(inp))
+    with open(path, "r+b") as f:
+        f.truncate(8)
+    assert ProgramCache(str(tmp_path)).get(inp) is None, "corrupt file should be a miss"
+    assert not os.path.exists(path), "corrupt file should be removed"
+
+def test_truncated_file(tmp_path, monkeypatch):
+    inp = "let s = fn(x) { x * 2.5 }; s(len(\"abc\")) + [1, 2][0];"
+    cache = ProgramCache(str(tmp_path))
+    cache.put(inp, parse(inp))
+    path = cache._path(cache.key(inp))
+    with open(path, "rb") as f:
+        data = f.read()
+    for length in range(len(data)):
+        with open(path, "wb") as f:
+            f.write(data[:length])
+        assert ProgramCache(str(tmp_path)).get(inp) is None, f"file truncated to {length} bytes should be a miss"
+        assert not os.path.exists(path), f"file truncated to {length} bytes should be removed"
+    for error in [struct.error("unpack_from requires a buffer of at least 8 bytes"), TypeError("bad field")]:
+        def decode_program(data, error=error):
+            raise error
+        monkeypatch.setattr(yada_cache, "decode_program", decode_program)
+        with open(path, "wb") as f:
+            f.write(data)
+        assert ProgramCache(str(tmp_path)).get(inp) is None, f"{error!r} should be a miss"
+        assert not os.path.exists(path), f"{error!r} should remove the file"
+
+def test_interpreter_uses_cache(tmp_path):
+    cache = ProgramCache(str(tmp_path))
+    interp = Interpreter(program_cache=cache)
+    first = interp.run("let x = 2; x * 21").evaluated
+    second = interp.run("let x = 2; x * 21").evaluated
+    assert first.value == 42 and second.value == 42, f"wrong result, got={first.value}, {second.value}"
+    assert cache.stats["memory_hits"] == 1, f"second run should hit the cache, got={cache.stats}"
+    program, errors = interp.parse("let = ;")
+    assert len(errors) > 0 and cache.get("let = ;") is None, "programs with parse errors should not be cached"
+
+def test_default_cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(yada_cache, "_default_cache", None)
+    monkeypatch.delenv("YADA_CACHE_DIR", raising=False)
+    assert default_cache().directory is None, "disk tier should be off unless YADA_CACHE_DIR is set"
+    monkeypatch.setattr(yada_cache, "_default_cache", None)
+    monkeypatch.setenv("YADA_CACHE_DIR", str(tmp_path))
+    assert default_cache().directory == str(tmp_path), "YADA_CACHE_DIR not used"
+
+def test_key_covers_frontend(monkeypatch):
+    cache = ProgramCache()
+    key = cache.key("1 + 2")
+    monkeypatch.setattr(yada_cache, "FRONTEND_DIGEST", "changed-parser")
+    assert cache.key("1 + 2") != key, "a changed lexer or parser should not read old entries"
@@ -1,5 +1,6 @@
 from typing import Any, Dict, List
-from yada_evaluator import Eval
+import pytest
+from yada_evaluator import Eval, Interpreter, BUILTINS
 from yada_lexer import Lexer
 from yada_parser import Parser
 import yada_object as obj
@@ -356,6 +357,310 @@ def test_hash_index_expressions():
         else:
             _test_null_object(evaluated)
 
+def test_lazy_sequences():
+    class EvalSequenceTest:
+        def __init__(self, input, expected):
+            self.input: str = input
+            self.expected: any = expected
+    tests: List[EvalSequenceTest] = [
+        EvalSequenceTest("range(3)", [0, 1, 2]),
+        EvalSequenceTest("range(2, 5)", [2, 3, 4]),
+        EvalSequenceTest("len(range(10000000))", 10000000),
+        EvalSequenceTest("range(1000)[999]", 999),
+        EvalSequenceTest("range(3)[3]", None),
+        EvalSequenceTest("first(range(5, 10))", 5),
+        EvalSequenceTest("map([1, 2, 3], fn(x) { x * 2 })", [2, 4, 6]),
+        EvalSequenceTest("len(map([1, 2, 3], fn(x) { x * 2 }))", 3),
+        EvalSequenceTest("filter(range(10), fn(x) { x > 6 })", [7, 8, 9]),
+        EvalSequenceTest("len(filter(range(10), fn(x) { x > 6 }))", 3),
+        EvalSequenceTest("take(filter(range(10000000), fn(x) { x > 5 }), 3)", [6, 7, 8]),
+        EvalSequenceTest("map(take(range(10000000), 2), fn(x) { x + 1 })[1]", 2),
+        EvalSequenceTest("len(map([1, true], fn(x) { x + 1 }))", 2),
+        EvalSequenceTest("len(filter([1, true], fn(x) { x + 1 }))", "type mismatch: ObjectTypeEnum.BOOLEAN_OBJ + ObjectTypeEnum.INTEGER_OBJ"),
+        EvalSequenceTest("range(true)", "argument to 'range' must be INTEGER, got=ObjectTypeEnum.BOOLEAN_OBJ"),
+        EvalSequenceTest("map(1, fn(x) { x })", "argument to 'map' must be ARRAY or SEQUENCE, got=ObjectTypeEnum.INTEGER_OBJ"),
+    ]
+    for t in tests:
+        evaluated = _test_eval(t.input)
+        if t.expected is None:
+            _test_null_object(evaluated)
+            continue
+        expected_type = type(t.expected)
+        if expected_type == int:
+            _test_integer_object(evaluated, t.expected)
+        elif expected_type == str:
+            assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+            assert evaluated.message == t.expected, f"wrong error message. expected={t.expected}, got={evaluated.message}"
+        else:
+            assert type(evaluated) == obj.Sequence, f"object is not SEQUENCE. got={type(evaluated)}"
+            els = evaluated.materialize()
+            assert len(els) == len(t.expected), f"sequence has wrong number of elements, got={len(els)} want={len(t.expected)}"
+            for i in range(len(t.expected)):
+                _test_integer_object(els[i], t.expected[i])
+
+def test_loops():
+    class EvalLoopTest:
+        def __init__(self, input, expected):
+            self.input: str = input
+            self.expected: any = expected
+    tests: List[EvalLoopTest] = [
+        EvalLoopTest("let i = 0; while (i < 10) { let i = i + 1; }; i", 10),
+        EvalLoopTest("while (false) { 1 }", None),
+        EvalLoopTest("let total = 0; for (x in [1, 2, 3]) { let total = total + x; }; total", 6),
+        EvalLoopTest("let total = 0; for (x in range(100000)) { let total = total + 1; }; total", 100000),
+        EvalLoopTest("for (x in []) { x }", None),
+        EvalLoopTest("let f = fn() { for (x in range(10)) { if (x > 2) { return x; } } }; f()", 3),
+        EvalLoopTest("let f = fn() { let i = 0; while (true) { let i = i + 1; if (i == 5) { return i; } } }; f()", 5),
+        EvalLoopTest("while (true) { 1 + true }", "type mismatch: ObjectTypeEnum.INTEGER_OBJ + ObjectTypeEnum.BOOLEAN_OBJ"),
+        EvalLoopTest("for (x in 5) { x }", "for loop over non-iterable: ObjectTypeEnum.INTEGER_OBJ"),
+    ]
+    for t in tests:
+        evaluated = _test_eval(t.input)
+        if t.expected is None:
+            _test_null_object(evaluated)
+        elif type(t.expected) == int:
+            _test_integer_object(evaluated, t.expected)
+        else:
+            assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+            assert evaluated.message == t.expected, f"wrong error message. expected={t.expected}, got={evaluated.message}"
+
+def test_array_arithmetic():
+    class EvalArrayArithmeticTest:
+        def __init__(self, input, expected):
+            self.input: str = input
+            self.expected: any = expected
+    tests: List[EvalArrayArithmeticTest] = [
+        EvalArrayArithmeticTest("[1, 2, 3] + [10, 20, 30]", [11, 22, 33]),
+        EvalArrayArithmeticTest("[1, 2, 3] * 2", [2, 4, 6]),
+        EvalArrayArithmeticTest("10 - [1, 2, 3]", [9, 8, 7]),
+        EvalArrayArithmeticTest("array(range(100)) * 3 - array(range(100))", [2 * i for i in range(100)]),
+        EvalArrayArithmeticTest("array(range(100)) + 100000000000000000000", [i + 100000000000000000000 for i in range(100)]),
+        EvalArrayArithmeticTest("array(range(40))[39]", 39),
+        EvalArrayArithmeticTest("len(array(range(40)) * 2)", 40),
+        EvalArrayArithmeticTest("sum(array(range(1000)) * 2)", 999000),
+        EvalArrayArithmeticTest("sum([1, 2, 3])", 6),
+        EvalArrayArithmeticTest("sum(range(101))", 5050),
+        EvalArrayArithmeticTest("min(array(range(5, 100)))", 5),
+        EvalArrayArithmeticTest("max([3, 9, 2])", 9),
+        EvalArrayArithmeticTest("max([])", None),
+        EvalArrayArithmeticTest("dot([1, 2, 3], [4, 5, 6])", 32),
+        EvalArrayArithmeticTest("dot(array(range(50)), array(range(50)))", sum(i * i for i in range(50))),
+        EvalArrayArithmeticTest("[1, 2] + [1, 2, 3]", "array length mismatch: 2 + 3"),
+        EvalArrayArithmeticTest("[1, true] * 2", "type mismatch: ObjectTypeEnum.BOOLEAN_OBJ * ObjectTypeEnum.INTEGER_OBJ"),
+        EvalArrayArithmeticTest('sum(["a"])', "argument to 'sum' must only contain INTEGER, got=ObjectTypeEnum.STRING_OBJ"),
+    ]
+    for t in tests:
+        evaluated = _test_eval(t.input)
+        if t.expected is None:
+            _test_null_object(evaluated)
+            continue
+        expected_type = type(t.expected)
+        if expected_type == int:
+            _test_integer_object(evaluated, t.expected)
+        elif expected_type == str:
+            assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+            assert evaluated.message == t.expected, f"wrong error message. expected={t.expected}, got={evaluated.message}"
+        else:
+            assert isinstance(evaluated, obj.Array), f"object is not ARRAY. got={type(evaluated)}"
+            assert evaluated.to_json() == t.expected, f"array has wrong elements, got={evaluated.to_json()} want={t.expected}"
+
+def test_typed_arrays():
+    evaluated = _test_eval("array(range(1000)) * 2")
+    if obj.TYPED_ARRAYS:
+        assert type(evaluated) == obj.IntArray, f"object is not IntArray. got={type(evaluated)}"
+    assert evaluated.elements[999].value == 1998, f"wrong last element, got={evaluated.elements[999].value}"
+    evaluated = _test_eval("[1, 2, 3]")
+    assert type(evaluated) == obj.Array, f"short arrays should stay untyped. got={type(evaluated)}"
+
+def test_typed_array_overflow():
+    # Typed arrays hold int64 values, but their results must not wrap around
+    big = 2**62
+    setup = f"let a = array(map(range(32), fn(x) {{ {big} }})); "
+    tests = [
+        ("sum(a)", 32 * big),
+        ("(a * 4)[0]", 4 * big),
+        ("(a + a)[31]", 2 * big),
+        ("(0 - a - a - a)[0]", -3 * big),
+        ("dot(a, a)", 32 * big * big),
+        ("sum(a * 2)", 64 * big),
+        ("max(a * 2)", 2 * big),
+        ("(array(range(32)) + 9223372036854775776)[31]", 2**63 - 1),
+    ]
+    for tt, expected in tests:
+        _test_integer_object(_test_eval(setup + tt), expected)
+    # Results that fit stay typed
+    evaluated = _test_eval("array(range(32)) + 9223372036854775776")
+    if obj.TYPED_ARRAYS:
+        assert type(evaluated) == obj.IntArray, f"object is not IntArray. got={type(evaluated)}"
+
+def test_memo():
+    class EvalMemoTest:
+        def __init__(self, input, expected):
+            self.input: str = input
+            self.expected: any = expected
+    fib = """
+    let fib = memo(fn(n) { if (n < 2) { n } else { fib(n - 1) + fib(n - 2) } }, 100);
+    """
+    tests: List[EvalMemoTest] = [
+        EvalMemoTest(fib + "fib(60)", 1548008755920),
+        EvalMemoTest(fib + 'fib(30); memo_stats(fib)["misses"]', 31),
+        EvalMemoTest(fib + 'fib(30); memo_stats(fib)["hits"]', 28),
+        EvalMemoTest(fib + 'fib(30); fib(30); memo_stats(fib)["hits"]', 29),
+        EvalMemoTest('let sq = memo(fn(x) { x * x }, 2); sq(1); sq(2); sq(3); memo_stats(sq)["size"]', 2),
+        EvalMemoTest('let sq = memo(fn(x) { x * x }, 2); sq(1); sq(2); sq(3); sq(1); memo_stats(sq)["misses"]', 4),
+        EvalMemoTest('let f = memo(fn(x) { len(x) }); f([1, 2]); f([1, 2]); memo_stats(f)["misses"]', 0),
+        EvalMemoTest("memo(1)", "argument to 'memo' must be FUNCTION, got=ObjectTypeEnum.INTEGER_OBJ"),
+        EvalMemoTest("memo(fn(x) { x }, 0)", "maxsize of 'memo' must be a positive INTEGER, got=0"),
+    ]
+    for t in tests:
+        evaluated = _test_eval(t.input)
+        if type(t.expected) == int:
+            _test_integer_object(evaluated, t.expected)
+        else:
+            assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+            assert evaluated.message == t.expected, f"wrong error message. expected={t.expected}, got={evaluated.message}"
+
+def test_memo_global_cap():
+    input = """
+    let a = memo(fn(x) { x }, 100);
+    let b = memo(fn(x) { x }, 100);
+    a(1); a(2); a(3); b(1); b(2);
+    memo_stats(a)["size"] + memo_stats(b)["size"];
+    """
+    program = Parser(Lexer(input)).parse_program()
+    evaluated = Eval(program, obj.new_environment(memo_max_entries=3))
+    _test_integer_object(evaluated, 3)
+
+def test_memo_stats_printed():
+    result = Interpreter().run("let f = memo(fn(x) { [x, x] }, 8); f(1); f(1); puts(memo_stats(f)); puts(f(1))")
+    expected = "{hits: 1, misses: 1, size: 1, maxsize: 8}\n[1, 1]\n"
+    assert result.out.getvalue() == expected, f"wrong output, got={result.out.getvalue()!r}"
+
+def test_interpreter_run():
+    interp = Interpreter()
+    result = interp.run("let x = 2; puts(x * 3); x")
+    _test_integer_object(result.evaluated, 2)
+    assert result.out.getvalue() == "6\n", f"wrong output, got={result.out.getvalue()!r}"
+    _test_integer_object(result.env.get("x"), 2)
+    assert result.errors == [], f"unexpected parse errors, got={result.errors}"
+
+def test_interpreter_builtins():
+    builtins = {k: v for k, v in BUILTINS.items() if k != "puts"}
+    builtins["double"] = obj.Builtin(lambda interp, x: obj.Integer(x.value * 2))
+    interp = Interpreter(builtins=builtins)
+    _test_integer_object(interp.run("double(21)").evaluated, 42)
+    evaluated = interp.run("puts(1)").evaluated
+    assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+    assert evaluated.message == "identifier not found: puts", f"wrong error message, got={evaluated.message}"
+    # Other interpreters keep the default table
+    evaluated = Interpreter().run("double(1)").evaluated
+    assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+
+def test_interpreter_hooks():
+    class RecordingHook:
+        def __init__(self):
+            self.events = []
+        def before_eval(self, interp, program, env):
+            self.events.append("before")
+        def after_eval(self, interp, program, env, evaluated):
+            self.events.append(evaluated.inspect())
+    hook = RecordingHook()
+    Interpreter(hooks=[hook]).run("1 + 1")
+    assert hook.events == ["before", "2"], f"wrong hook events, got={hook.events}"
+
+def test_interpreter_limits():
+    interp = Interpreter(max_steps=10)
+    _test_integer_object(interp.run("let i = 0; while (i < 10) { let i = i + 1; }; i").evaluated, 10)
+    tests = [
+        "let i = 0; while (i < 11) { let i = i + 1; }; i",
+        "for (x in range(100)) { x }",
+        "let f = fn(n) { f(n + 1) }; f(0)",
+        "map(range(100), fn(x) { x })",
+        "sum(range(100000000))",
+        "range(100000000)[99999999]",
+        "len(filter(range(100000000), fn(x) { false }))",
+    ]
+    for tt in tests:
+        evaluated = interp.run(tt).evaluated
+        if type(evaluated) == obj.Sequence:
+            evaluated = list(evaluated.iter())[-1]
+        assert type(evaluated) == obj.Error, f"{tt}: object is not Error. got={type(evaluated)}"
+        assert evaluated.message == "step budget exhausted: more than 10 steps", \
+            f"{tt}: wrong error message, got={evaluated.message}"
+    # Every run starts with the whole budget
+    _test_integer_object(interp.run("let f = fn(x) { x }; f(f(f(3)))").evaluated, 3)
+
+    interp = Interpreter(timeout=0.05)
+    evaluated = interp.run("while (true) { 1 }").evaluated
+    assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+    assert evaluated.message == "timed out after 0.05s", f"wrong error message, got={evaluated.message}"
+    assert interp.timed_out, "timed_out not set"
+    _test_integer_object(interp.run("1").evaluated, 1)
+    assert not interp.timed_out, "timed_out not reset"
+    # A limit hit while evaluating a call's arguments
+    evaluated = interp.run('let g = fn(a, b) { a }; g(len("a"), fn() { while (true) { 1 } }())').evaluated
+    assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+    assert evaluated.message == "timed out after 0.05s", f"wrong error message, got={evaluated.message}"
+    # Builtins that walk a sequence stop on time as well
+    evaluated = interp.run("max(map(range(100000000), fn(x) { x }))").evaluated
+    assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+    assert interp.timed_out, "sequence walked past the deadline"
+
+    # A few steps of arithmetic on ever bigger integers
+    squares = "let x = 3; let n = 0; while (n < 31) { let x = x * x; let n = n + 1; }; n"
+    tests = [
+        (Interpreter(timeout=0.5, max_steps=100, max_allocated_bytes=1000000), "step budget exhausted: more than 100 steps"),
+        (Interpreter(timeout=0.5), "timed out after 0.5s"),
+    ]
+    for interp, expected in tests:
+        evaluated = interp.run(squares).evaluated
+        assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+        assert evaluated.message == expected, f"wrong error message, got={evaluated.message}"
+
+    evaluated = Interpreter().run("let f = fn(n) { f(n + 1) }; f(0)").evaluated
+    assert type(evaluated) == obj.Error, f"object is not Error. got={type(evaluated)}"
+    assert evaluated.message == "maximum recursion depth exceeded", f"wrong error message, got={evaluated.message}"
+
+def test_interpreter_memory_quota():
+    tests = [
+        ('"ab" + "c"', 3 * obj.OBJECT_BYTES + 6),
+        ('[1, 2, 3]', obj.OBJECT_BYTES + 3 * obj.SLOT_BYTES),
+        ('push(rest([1, 2]), 3)', 3 * obj.OBJECT_BYTES + 5 * obj.SLOT_BYTES),
+        ('{"a": 1}', 2 * obj.OBJECT_BYTES + 1 + obj.BINDING_BYTES),
+        ('let f = fn(x) { x }; f(1) + 2', 0),
+        ('len(filter(range(10), fn(x) { true }))', 10 * obj.MATERIALIZED_ELEMENT_BYTES),
+        ('sum(range(4))', 4 * obj.SLOT_BYTES),
+        ('array(range(2))', 2 * obj.MATERIALIZED_ELEMENT_BYTES + obj.OBJECT_BYTES + 2 * obj.SLOT_BYTES),
+        ('9223372036854775807 * 9223372036854775807', 0),
+        ('18446744073709551616 * 2', 9),
+    ]
+    for tt, expected in tests:
+        result = Interpreter().run(tt)
+        assert result.allocated_bytes == expected, f"{tt}: wrong allocated bytes, want={expected}, got={result.allocated_bytes}"
+
+    interp = Interpreter(max_allocated_bytes=10000)
+    result = interp.run('let s = ""; while (true) { let s = s + "x"; }')
+    assert type(result.evaluated) == obj.Error, f"object is not Error. got={type(result.evaluated)}"
+    assert result.evaluated.message == "memory quota exceeded: allocated more than 10000 bytes", \
+        f"wrong error message, got={result.evaluated.message}"
+    assert result.max_allocated_bytes == 10000, f"quota not reported, got={result.max_allocated_bytes}"
+    for tt in ("len(filter(range(5000000), fn(x) { true }))", "dot(range(5000000), range(5000000))"):
+        result = interp.run(tt)
+        assert type(result.evaluated) == obj.Error, f"{tt}: object is not Error. got={type(result.evaluated)}"
+        assert result.allocated_bytes < 20000, f"{tt}: kept allocating past the quota, got={result.allocated_bytes}"
+    # Integers that outgrow a word count too
+    result = Interpreter(max_allocated_bytes=1000000).run(
+        "let x = 3; let n = 0; while (n < 31) { let x = x * x; let n = n + 1; }; n")
+    assert type(result.evaluated) == obj.Error, f"object is not Error. got={type(result.evaluated)}"
+    assert result.evaluated.message == "memory quota exceeded: allocated more than 1000000 bytes", \
+        f"wrong error message, got={result.evaluated.message}"
+    result = interp.run('"x" + "y"')
+    assert result.evaluated.inspect() == "xy", f"quota not reset between runs, got={result.evaluated.inspect()}"
+
+def test_interpreter_engine():
+    with pytest.raises(ValueError):
+        Interpreter(engine="jit")
+
 def _test_eval(inp: str) -> obj.Object:
     lexer = Lexer(inp)
     parser = Parser(lexer)
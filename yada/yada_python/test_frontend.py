@@ -1,5 +1,12 @@
+import asyncio
 import json
-from yada_frontend import Yada
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from yada_frontend import Yada, YadaStream, YadaJSON, YadaBatch, YadaPool, Prelude, new_interpreter, yada_eval
+from yada_cache import ResultCache
+from yada_object import Builtin, Integer
 
 def load_test(file_name):
     with open(file_name) as f:
@@ -28,3 +35,223 @@ def test_simple():
     actual = Yada(t["input"])
 
     _test_results(expected, actual)
+
+def test_concurrent_output():
+    def run(i):
+        return Yada(f"for (x in range(200)) {{ puts({i}); }}")["output"]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        outputs = list(executor.map(run, range(16)))
+    for i, output in enumerate(outputs):
+        assert output == f"{i}\n" * 200, f"output of run {i} mixed with other runs, got={output[:40]!r}"
+
+def test_stream():
+    t = load_test("frontend_tests/00_simple_test.json")
+    events = list(YadaStream(t["input"] + " puts(1); puts(2);"))
+    output = "".join(e["output"] for e in events if "output" in e)
+    assert output == "1\n2\n", f"streamed output wrong, got={output!r}"
+    assert "result" in events[-1], f"last event is not the result, got={events[-1]}"
+    result = events[-1]["result"]
+    assert "output" not in result, f"result repeats the streamed output"
+    assert result["environment"] == t["expected"]["environment"], f'environment do not match, got={result["environment"]}'
+
+def test_stream_closed_early():
+    threads = threading.active_count()
+    stream = YadaStream("while (true) { puts(1); }")
+    first = next(stream)
+    assert first["output"].startswith("1\n"), f"first chunk wrong, got={first}"
+    stream.close()
+    deadline = time.time() + 5
+    while threading.active_count() > threads and time.time() < deadline:
+        time.sleep(0.05)
+    assert threading.active_count() == threads, "evaluation thread kept running after the stream was closed"
+
+    # A program that writes nothing more is cancelled too
+    interp = new_interpreter()
+    stream = YadaStream("puts(1); while (true) { 1 }", interpreter=interp)
+    next(stream)
+    stream.close()
+    deadline = time.time() + 5
+    while not interp.cancelled and time.time() < deadline:
+        time.sleep(0.01)
+    assert interp.cancelled, "silent program kept running after the stream was closed"
+
+    cancel = threading.Event()
+    stream = YadaStream("while (true) { 1 }", fields=["evaluated"], cancel=cancel)
+    cancel.set()
+    events = list(stream)
+    assert events == [{"result": {"evaluated": "ERROR: evaluation cancelled"}}], f"wrong events, got={events}"
+
+def test_fields():
+    t = load_test("frontend_tests/00_simple_test.json")
+    actual = Yada(t["input"], fields=["environment", "output"])
+    assert list(actual) == ["environment", "output"], f"wrong fields, got={list(actual)}"
+    assert actual["environment"] == t["expected"]["environment"], f'environment do not match, got={actual["environment"]}'
+    with pytest.raises(ValueError):
+        Yada(t["input"], fields=["bogus"])
+
+def test_json():
+    t = load_test("frontend_tests/00_simple_test.json")
+    actual = json.loads("".join(YadaJSON(t["input"])))
+    _test_results(t["expected"], actual)
+    actual = json.loads("".join(YadaJSON(t["input"], fields=["program"])))
+    assert actual == {"program": t["expected"]["program"]}, f"wrong result, got={actual}"
+
+def test_result_cache():
+    t = load_test("frontend_tests/00_simple_test.json")
+    cache = ResultCache()
+    first = Yada(t["input"], result_cache=cache)
+    second = Yada(t["input"], result_cache=cache)
+    _test_results(t["expected"], second)
+    assert first == second, "cached result differs from the evaluated one"
+    second["output"] = "changed"
+    assert Yada(t["input"], result_cache=cache)["output"] == first["output"], "cache hit handed out a shared dict"
+    assert cache.stats["hits"] == 2 and cache.stats["misses"] == 1, f"wrong stats, got={cache.stats}"
+    Yada(t["input"], result_cache=cache, fields=["output"])
+    Yada(t["input"], result_cache=cache, memo_max_entries=10)
+    assert cache.stats["misses"] == 3, f"fields and configuration should be part of the key, got={cache.stats}"
+
+def test_result_cache_nondeterministic():
+    calls = []
+    interp = new_interpreter()
+    interp.builtins["now"] = Builtin(lambda interp: Integer(len(calls.append(1) or calls)), deterministic=False)
+    cache = ResultCache()
+    first = Yada("now()", interpreter=interp, result_cache=cache)
+    second = Yada("now()", interpreter=interp, result_cache=cache)
+    assert first["evaluated"] == "1" and second["evaluated"] == "2", f"nondeterministic program was cached, got={second['evaluated']}"
+    assert len(cache.entries) == 0, "nondeterministic result should not be stored"
+
+def test_result_cache_eviction():
+    cache = ResultCache(max_entries=2)
+    for i in range(3):
+        cache.put(str(i), {"i": i})
+    assert cache.get("0") is None and cache.get("2") == {"i": 2}, "least recently used result should be evicted"
+    cache = ResultCache(max_bytes=20)
+    cache.put("a", {"x": "0123456789"})
+    cache.put("b", {"x": "0123456789"})
+    assert list(cache.entries) == ["b"] and cache.size <= 20, f"memory cap not enforced, got={cache.size} bytes"
+    cache = ResultCache(ttl=0)
+    cache.put("a", {})
+    assert cache.get("a") is None and cache.stats["expired"] == 1, f"expired entry returned, got={cache.stats}"
+
+def test_batch():
+    sources = [f"let x = {i}; puts(x * 2); x + 1" for i in range(50)] + ["let = ;", "1 + true"]
+    expected = [Yada(src, fields=["evaluated", "output", "errors"]) for src in sources]
+    actual = YadaBatch(sources, workers=2, fields=["evaluated", "output", "errors"])
+    assert actual == expected, "batch results differ from running each program with Yada()"
+    with YadaPool(workers=2) as pool:
+        first = pool.map(sources[:3], chunksize=1)
+        second = pool.map(iter(sources[3:5]))
+    assert [r["evaluated"] for r in first + second] == ["1", "2", "3", "4", "5"], "pool results out of order"
+
+def test_memory_field():
+    result = Yada('let s = "ab" + "cd"; s', fields=["memory"])
+    assert result["memory"]["allocated_bytes"] > 0, f"allocations not reported, got={result['memory']}"
+    assert result["memory"]["quota_bytes"] is None, f"quota reported without one, got={result['memory']}"
+    interp = new_interpreter(max_allocated_bytes=100)
+    result = Yada('let a = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]; a', interpreter=interp, fields=["evaluated", "memory"])
+    assert result["evaluated"].startswith("ERROR: memory quota exceeded"), f"quota not enforced, got={result['evaluated']}"
+    assert result["memory"]["quota_bytes"] == 100, f"wrong quota reported, got={result['memory']}"
+
+def test_metrics():
+    source = 'let add = fn(a) { fn(b) { a + b } }; let s = "x" + "y"; add(1)(2);'
+    assert "metrics" not in Yada(source), "metrics returned without being asked for"
+    interp = new_interpreter()
+    interp.program_cache = None
+    result = Yada(source, interpreter=interp, fields=["evaluated", "metrics"])
+    assert result["evaluated"] == "3", f"wrong result, got={result['evaluated']}"
+    metrics = result["metrics"]
+    assert list(metrics["phases"]) == ["lex", "parse", "eval", "serialize"], f"wrong phases, got={metrics['phases']}"
+    assert all(p["wall_seconds"] >= 0 and p["cpu_seconds"] >= 0 for p in metrics["phases"].values()), \
+        f"negative phase times, got={metrics['phases']}"
+    expected = {
+        "tokens": 35,
+        "ast_nodes": 25,
+        "program_cached": False,
+        "nodes_evaluated": 21,
+        "function_calls": 2,
+        "peak_env_depth": 3,
+        "allocated": {"FUNCTION": 2, "STRING": 3, "ENVIRONMENT": 2},
+    }
+    actual = {k: v for k, v in metrics.items() if k != "phases"}
+    assert actual == expected, f"wrong counters, want={expected}, got={actual}"
+    cache = ResultCache()
+    Yada(source, fields=["metrics"], result_cache=cache)
+    Yada(source, fields=["metrics"], result_cache=cache)
+    assert cache.stats["hits"] == 0, "results with metrics must not come from the result cache"
+
+def test_yada_eval():
+    async def run():
+        results = await asyncio.gather(*(yada_eval(f"let x = {i}; x * 2", fields=["evaluated"]) for i in range(4)))
+        interp = new_interpreter()
+        task = asyncio.create_task(yada_eval("while (true) { 1 }", interpreter=interp))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return results, interp
+    results, interp = asyncio.run(run())
+    assert [r["evaluated"] for r in results] == ["0", "2", "4", "6"], f"wrong results, got={results}"
+    deadline = time.time() + 2
+    while not interp.cancelled and time.time() < deadline:
+        time.sleep(0.01)
+    assert interp.cancelled, "cancelled program kept running"
+
+def test_serialization_limits():
+    # Lazy results are computed when serialized, still under the run's limits
+    interp = new_interpreter(max_steps=1000)
+    result = Yada("let r = range(100000000); range(100000000)", interpreter=interp, fields=["evaluated", "environment"])
+    message = "ERROR: step budget exhausted: more than 1000 steps"
+    assert result["evaluated"] == message, f"wrong evaluated, got={result['evaluated'][:100]}"
+    assert result["environment"]["r"][-1] == message, "serializing the environment ran past the budget"
+    assert Yada("range(3)", interpreter=interp, fields=["evaluated"])["evaluated"] == "[0, 1, 2]"
+
+def test_memory_quota_covers_serialization():
+    interp = new_interpreter(max_allocated_bytes=1000)
+    result = Yada("let r = range(5000000); 1", interpreter=interp, fields=["environment", "memory"])
+    assert result["environment"]["r"][-1] == "ERROR: memory quota exceeded: allocated more than 1000 bytes", \
+        "materializing a sequence to serialize it went past the quota"
+    assert 1000 < result["memory"]["allocated_bytes"] < 2000, f"wrong allocated bytes, got={result['memory']}"
+
+def test_prelude():
+    prelude = Prelude("let double = fn(x) { x * 2 }; let fib = memo(fn(n) { if (n < 2) { n } else { fib(n - 1) + fib(n - 2) } }); let base = 10; fib(20);")
+    result = Yada("let base = base + double(1); base", fields=["evaluated", "environment"], prelude=prelude)
+    assert result["evaluated"] == "12", f"expected 12, got {result['evaluated']}"
+    assert list(result["environment"]) == ["base"], f"fork holds more than its own bindings: {result['environment']}"
+    assert Yada("base", fields=["evaluated"], prelude=prelude)["evaluated"] == "10", "a fork changed the prelude"
+    assert Yada("fib(25)", fields=["evaluated"], prelude=prelude)["evaluated"] == "75025", "memoized prelude function"
+    assert len(prelude.env.get("fib").cache) == 21, "a fork added to a frozen memo cache"
+    with pytest.raises(RuntimeError):
+        prelude.env.set("base", Integer(1))
+    with pytest.raises(ValueError):
+        Prelude("let = ;")
+
+    def run(i):
+        return Yada(f"let mine = {i}; let base = base + mine; base", fields=["evaluated"], prelude=prelude)["evaluated"]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(run, range(200)))
+    assert results == [str(10 + i) for i in range(200)], "forks run on many threads saw each other's bindings"
+
+    cache = ResultCache()
+    Yada("double(base)", result_cache=cache, prelude=prelude)
+    Yada("double(base)", result_cache=cache, prelude=Prelude("let double = fn(x) { x }; let base = 1;"))
+    assert cache.stats["hits"] == 0, "results of different preludes shared a cache entry"
+
+def test_prelude_runs_on_the_callers_interpreter():
+    prelude = Prelude("let show = fn(x) { puts(x); x }; let shown = map(range(3), show); "
+                      "let slow = map(range(100000000), fn(x) { x });")
+    result = Yada("array(shown); show(9)", fields=["evaluated", "output"], prelude=prelude)
+    assert result == {"evaluated": "9", "output": "0\n1\n2\n9\n"}, f"prelude output went elsewhere, got={result}"
+    start = time.monotonic()
+    result = Yada("sum(slow)", interpreter=new_interpreter(timeout=0.2), fields=["evaluated"], prelude=prelude)
+    assert result["evaluated"] == "ERROR: timed out after 0.2s", f"prelude sequence ignored the timeout, got={result}"
+    assert time.monotonic() - start < 5, "prelude sequence ran long past the timeout"
+
+    calls = []
+    interp = new_interpreter()
+    interp.builtins["now"] = Builtin(lambda interp: Integer(len(calls.append(1) or calls)), deterministic=False)
+    prelude = Prelude("let stamp = fn() { now() };", interp)
+    cache = ResultCache()
+    first = Yada("stamp()", interpreter=interp, result_cache=cache, prelude=prelude)
+    second = Yada("stamp()", interpreter=interp, result_cache=cache, prelude=prelude)
+    assert (first["evaluated"], second["evaluated"]) == ("1", "2"), "program calling a nondeterministic prelude function was cached"
+    assert len(cache.entries) == 0, "nondeterministic result should not be stored"
@@ -132,4 +132,29 @@ def test_next_token():
         # print(tok.type, t.type, tok.literal, t.literal)
         
         assert tok.type == t.type, "incorrect token type"
-        assert tok.literal == t.literal, "incorrect literal"
\ No newline at end of file
+        assert tok.literal == t.literal, "incorrect literal"
+
+def test_loop_keywords():
+    inp = "while (x) { } for (e in xs) { }"
+    expected_tokens: List[Token] = [
+        Token(TokenEnum.WHILE, "while"),
+        Token(TokenEnum.LPAREN, "("),
+        Token(TokenEnum.IDENT, "x"),
+        Token(TokenEnum.RPAREN, ")"),
+        Token(TokenEnum.LBRACE, "{"),
+        Token(TokenEnum.RBRACE, "}"),
+        Token(TokenEnum.FOR, "for"),
+        Token(TokenEnum.LPAREN, "("),
+        Token(TokenEnum.IDENT, "e"),
+        Token(TokenEnum.IN, "in"),
+        Token(TokenEnum.IDENT, "xs"),
+        Token(TokenEnum.RPAREN, ")"),
+        Token(TokenEnum.LBRACE, "{"),
+        Token(TokenEnum.RBRACE, "}"),
+        Token(TokenEnum.EOF, ""),
+    ]
+    l = Lexer(inp)
+    for t in expected_tokens:
+        tok = l.next_token()
+        assert tok.type == t.type, f"incorrect token type, want={t.type}, got={tok.type}"
+        assert tok.literal == t.literal, f"incorrect token literal, want={t.literal}, got={tok.literal}"
@@ -11,4 +11,9 @@ def test_string_hash():
     diff_2 = obj.String("My name is johnny")
     assert hello_1.hash_key() == hello_2.hash_key(), f"strings with same content have different hash keys"
     assert diff_1.hash_key() == diff_2.hash_key(), f"strings with same content have different hash keys"
-    assert hello_1.hash_key() != diff_2.hash_key(), f"strings with different content have same hash keys"
\ No newline at end of file
+    assert hello_1.hash_key() != diff_2.hash_key(), f"strings with different content have same hash keys"
+def test_hash_to_json():
+    program = Parser(Lexer('{"a": 1, 2: [true], false: {"b": "c"}}')).parse_program()
+    evaluated = Eval(program, obj.new_environment())
+    expected = {"a": 1, "2": [True], "false": {"b": "c"}}
+    assert evaluated.to_json() == expected, f"wrong JSON, want={expected}, got={evaluated.to_json()}"
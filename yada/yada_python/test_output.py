@@ -0,0 +1,36 @@
+import pytest
+from yada_output import Output, OutputLimitExceeded
+from yada_evaluator import Interpreter
+import yada_object as obj
+
+def test_output_in_memory():
+    out = Output()
+    out.write("hello\n")
+    out.write("world\n")
+    assert out.getvalue() == "hello\nworld\n", f"wrong output, got={out.getvalue()!r}"
+    assert out.spill is None, "output without limits spilled to disk"
+
+def test_output_spills_to_disk():
+    out = Output(spill_bytes=8)
+    out.write("héllo\n")
+    assert out.spill is None, "output spilled before reaching the threshold"
+    out.write("world\n")
+    assert out.spill is not None, "output did not spill past the threshold"
+    out.write("again\n")
+    assert out.getvalue() == "héllo\nworld\nagain\n", f"wrong output, got={out.getvalue()!r}"
+    out.close()
+
+def test_output_limit():
+    out = Output(spill_bytes=4, max_bytes=10)
+    out.write("12345")
+    out.write("67890")
+    with pytest.raises(OutputLimitExceeded):
+        out.write("1")
+    assert out.getvalue() == "1234567890", f"wrong output, got={out.getvalue()!r}"
+    out.close()
+
+def test_output_limit_stops_evaluation():
+    result = Interpreter(max_output_bytes=12).run("while (true) { puts(12345); }")
+    assert type(result.evaluated) == obj.Error, f"object is not Error. got={type(result.evaluated)}"
+    assert result.evaluated.message == "output limit exceeded: 12 bytes", f"wrong error message, got={result.evaluated.message}"
+    assert result.out.getvalue() == "12345\n12345\n", f"wrong output, got={result.out.getvalue()!r}"
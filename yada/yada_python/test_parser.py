@@ -296,6 +296,40 @@ def test_if_else_expression():
     if not _test_identifier(alternative.expression, "y"):
         return
 
+def test_while_statement():
+    input = "while (x < y) { x }"
+
+    lexer = Lexer(input)
+    parser = Parser(lexer)
+    program: ast.Program = parser.parse_program()
+    check_parse_errors(parser)
+
+    assert len(program.statements) == 1, f"program.statements does not contain 1 statements. got={len(program.statements)}"
+    stmt = program.statements[0]
+    assert isinstance(stmt, ast.WhileStatement), f"stmt is not a WhileStatement, got={type(stmt)}"
+    if not _test_infix_expression(stmt.condition, "x", "<", "y"):
+        return
+    assert len(stmt.body.statements) == 1, f"stmt.body does not contain 1 statement. got={len(stmt.body.statements)}"
+    body = stmt.body.statements[0]
+    assert isinstance(body, ast.ExpressionStatement), f"body is not a ExpressionStatement, got={type(body)}"
+    _test_identifier(body.expression, "x")
+
+def test_for_statement():
+    input = "for (x in [1, 2]) { x; }"
+
+    lexer = Lexer(input)
+    parser = Parser(lexer)
+    program: ast.Program = parser.parse_program()
+    check_parse_errors(parser)
+
+    assert len(program.statements) == 1, f"program.statements does not contain 1 statements. got={len(program.statements)}"
+    stmt = program.statements[0]
+    assert isinstance(stmt, ast.ForStatement), f"stmt is not a ForStatement, got={type(stmt)}"
+    _test_identifier(stmt.variable, "x")
+    assert isinstance(stmt.iterable, ast.ArrayLiteral), f"stmt.iterable is not a ArrayLiteral, got={type(stmt.iterable)}"
+    assert len(stmt.body.statements) == 1, f"stmt.body does not contain 1 statement. got={len(stmt.body.statements)}"
+    assert stmt.string() == "for x in [1, 2] x", f"stmt.string() wrong, got={stmt.string()}"
+
 def test_function_literal_parsing():
     input = "fn(x, y) { x + y; }"
     lexer = Lexer(input)
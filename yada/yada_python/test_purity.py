@@ -0,0 +1,77 @@
+from typing import List
+from yada_evaluator import Eval, BUILTINS
+from yada_lexer import Lexer
+from yada_parser import Parser
+import yada_object as obj
+import yada_ast as ast
+import yada_purity as purity
+
+def test_function_purity():
+    class FunctionPurityTest:
+        def __init__(self, input, expected):
+            self.input: str = input
+            self.expected: bool = expected
+    tests: List[FunctionPurityTest] = [
+        FunctionPurityTest("fn(x) { x * 2 }", True),
+        FunctionPurityTest("fn(x) { len(x) + first(x) }", True),
+        FunctionPurityTest("fn(x) { puts(x); x }", False),
+        FunctionPurityTest("fn(x) { let y = fn() { puts(x) }; 1 }", False),
+        FunctionPurityTest("let puts = fn(x) { x }; fn(x) { puts(x) }", True),
+        FunctionPurityTest("let log = fn(x) { puts(x) }; fn(x) { log(x) }", False),
+        FunctionPurityTest("let log = fn(x) { puts(x) }; fn(x) { let f = log; 1 }", False),
+        FunctionPurityTest("let double = fn(x) { x * 2 }; fn(x) { double(x) }", True),
+        FunctionPurityTest("let fib = fn(n) { if (n < 2) { n } else { fib(n - 1) + fib(n - 2) } }; fib", True),
+        FunctionPurityTest("fn(x) { later(x) }", False),
+        FunctionPurityTest("fn(f, x) { f(x) }", False),
+        FunctionPurityTest("fn(f, xs) { map(xs, f) }", False),
+        FunctionPurityTest("fn(xs) { map(xs, fn(x) { x + 1 }) }", True),
+        FunctionPurityTest("fn(xs) { map(xs, puts) }", False),
+        FunctionPurityTest("fn(x) { fn(y) { y }(x) }", True),
+        FunctionPurityTest("fn(n) { let total = 0; for (i in range(n)) { let total = total + i; }; total }", True),
+        FunctionPurityTest("let sq = memo(fn(x) { x * x }); fn(x) { sq(x) }", True),
+        FunctionPurityTest("let f = fn(n) { g(n) }; let g = fn(n) { f(n) }; f", True),
+        # Free variables count as they are bound when asked, not when the closure was made
+        FunctionPurityTest("let g = fn(x) { x }; let f = fn(x) { g(x) }; let g = fn(x) { puts(x) }; f", False),
+        FunctionPurityTest("let g = fn(x) { puts(x) }; let f = fn(x) { g(x) }; let g = fn(x) { x }; f", True),
+        FunctionPurityTest("let h = fn(x) { x }; let g = fn(x) { h(x) }; let f = fn(x) { g(x) }; let h = puts; f", False),
+        FunctionPurityTest("let fib = fn(n) { fib(n) }; let f = fib; let fib = fn(n) { puts(n) }; f", False),
+    ]
+    for t in tests:
+        evaluated = _test_eval(t.input)
+        assert isinstance(evaluated, obj.Function), f"object is not Function. got={type(evaluated)}"
+        actual = purity.is_pure_value(evaluated, BUILTINS)
+        assert actual == t.expected, f"wrong purity for {t.input}. want={t.expected}, got={actual}"
+
+def test_program_purity():
+    class ProgramPurityTest:
+        def __init__(self, input, expected):
+            self.input: str = input
+            self.expected: bool = expected
+    tests: List[ProgramPurityTest] = [
+        ProgramPurityTest("let x = 1; let f = fn(y) { x + y }; f(2)", True),
+        ProgramPurityTest("let x = 1; puts(x)", False),
+        ProgramPurityTest("let p = puts; 1", False),
+    ]
+    for t in tests:
+        program: ast.Program = Parser(Lexer(t.input)).parse_program()
+        actual = purity.is_pure_program(program, BUILTINS)
+        assert actual == t.expected, f"wrong purity for {t.input}. want={t.expected}, got={actual}"
+
+def test_program_determinism():
+    builtins = dict(BUILTINS)
+    builtins["now"] = obj.Builtin(lambda interp: obj.Integer(0), deterministic=False)
+    tests = [
+        ("let x = 1; puts(x); x", True),
+        ("let f = fn() { now() }; 1", False),
+    ]
+    for inp, expected in tests:
+        program: ast.Program = Parser(Lexer(inp)).parse_program()
+        actual = purity.is_deterministic_program(program, builtins)
+        assert actual == expected, f"wrong determinism for {inp}. want={expected}, got={actual}"
+
+def _test_eval(inp: str) -> obj.Object:
+    lexer = Lexer(inp)
+    parser = Parser(lexer)
+    program: ast.Program = parser.parse_program()
+    env: obj.Environment = obj.new_environment()
+    return Eval(program, env)
@@ -1,5 +1,6 @@
+import json
 from abc import ABC
-from typing import Dict, List, Union
+from typing import Dict, Iterator, List, Union
 from yada.yada_python.yada_token import Token
 
 class Node(ABC):
@@ -284,6 +285,57 @@ class IfExpression(Expression):
             result += f" else {self.alternative.string()}"
         return result
 
+class WhileStatement(Statement):
+    token: Token
+    condition: Expression
+    body: BlockStatement
+
+    def __init__(self, token: Token, condition: Expression, body: BlockStatement):
+        self.token = token
+        self.condition = condition
+        self.body = body
+
+    def to_json(self) -> dict:
+        return {
+            "node": self.__class__.__name__,
+            "token": self.token.to_json(),
+            "condition": self.condition.to_json(),
+            "body": self.body.to_json(),
+        }
+
+    def token_literal(self) -> str:
+        return self.token.literal
+
+    def string(self) -> str:
+        return f"while {self.condition.string()} {self.body.string()}"
+
+class ForStatement(Statement):
+    token: Token
+    variable: Identifier
+    iterable: Expression
+    body: BlockStatement
+
+    def __init__(self, token: Token, variable: Identifier, iterable: Expression, body: BlockStatement):
+        self.token = token
+        self.variable = variable
+        self.iterable = iterable
+        self.body = body
+
+    def to_json(self) -> dict:
+        return {
+            "node": self.__class__.__name__,
+            "token": self.token.to_json(),
+            "variable": self.variable.to_json(),
+            "iterable": self.iterable.to_json(),
+            "body": self.body.to_json(),
+        }
+
+    def token_literal(self) -> str:
+        return self.token.literal
+
+    def string(self) -> str:
+        return f"for {self.variable.string()} in {self.iterable.string()} {self.body.string()}"
+
 class FunctionLiteral(Expression):
     token: Token
     parameters: List[Identifier]
@@ -425,4 +477,64 @@ class HashLiteral(Expression):
         ps = list()
         for k, v in self.pairs.items():
             ps.append(f"{k.string()}:{v.string()}")
-        return f"{{{', '.join(ps)}}}"
\ No newline at end of file
+        return f"{{{', '.join(ps)}}}"
+
+
+# Attribute order of each node class, which is also the key order of its
+# to_json() and the argument order of its constructor
+_NODE_FIELDS: Dict[type, List[str]] = dict()
+
+def node_fields(node_type: type) -> List[str]:
+    fields = _NODE_FIELDS.get(node_type)
+    if fields is None:
+        fields = list(node_type.__annotations__)
+        _NODE_FIELDS[node_type] = fields
+    return fields
+
+def iter_json(node: Node | List[Node] | None) -> Iterator[str]:
+    """
+    Yields the JSON text of `node.to_json()` a piece at a time, without ever
+    building the nested dicts, so writing out a large AST only needs memory
+    for the pieces in flight. The text is exactly what json.dumps() would
+    produce for `node.to_json()`.
+    """
+    if node is None:
+        yield "null"
+    elif type(node) == list:
+        yield "["
+        for i, n in enumerate(node):
+            if i > 0:
+                yield ", "
+            yield from iter_json(n)
+        yield "]"
+    elif isinstance(node, Node):
+        node_type = type(node)
+        fields = node_fields(node_type)
+        yield f'{{"node": "{node_type.__name__}"'
+        for name in fields:
+            yield f', "{name}": '
+            if node_type == HashLiteral and name == "pairs":
+                # Mirrors HashLiteral.to_json(), which does not serialize pairs yet
+                yield "null"
+            else:
+                yield from iter_json(getattr(node, name))
+        yield "}"
+    elif isinstance(node, Token):
+        yield json.dumps(node.to_json())
+    else:
+        yield json.dumps(node)
+
+def count_nodes(node: Node | List[Node] | None) -> int:
+    """ How many Nodes there are in `node`, itself included. """
+    if type(node) == list:
+        return sum(count_nodes(n) for n in node)
+    if not isinstance(node, Node):
+        return 0
+    count = 1
+    for name in node_fields(type(node)):
+        value = getattr(node, name)
+        if type(value) == dict:
+            count += sum(count_nodes(k) + count_nodes(v) for k, v in value.items())
+        else:
+            count += count_nodes(value)
+    return count
@@ -0,0 +1,499 @@
+"""
+A compact, self-describing binary encoding for parsed programs, runtime
+values and whole environments, used where JSON is too big or too slow
+(caching parsed programs, handing results to other processes, snapshotting
+sessions).
+
+Every encoding starts with a header (magic, format version, kind) followed by
+one tagged item. Integers are zigzag LEB128 varints, so small numbers take a
+byte and large ones never overflow. Each distinct string is written once and
+referred to by index afterwards, which is what makes ASTs small: identifiers,
+node literals and token literals repeat constantly.
+
+Environments, functions, arrays and hashes are written once as well: the
+second time the same object comes up, only a reference to the first is
+written. That keeps values shared between bindings shared after decoding,
+and lets closures refer to the environment that holds them. Builtins are
+written by name and looked up in the decoder's builtin table.
+"""
+
+import struct
+from typing import Dict, List
+import yada.yada_python.yada_ast as ast
+import yada.yada_python.yada_object as obj
+from yada.yada_python.yada_token import Token, TokenEnum
+from yada.yada_python.yada_evaluator import TRUE, FALSE, NULL, BUILTINS
+
+MAGIC = b"YDB"
+VERSION = 3
+HEADER = struct.Struct("<3sBB")
+DOUBLE = struct.Struct("<d")
+
+KIND_PROGRAM = ord("P")
+KIND_VALUE = ord("V")
+KIND_ENVIRONMENT = ord("E")
+
+# Plain Python values (AST fields)
+TAG_NONE = 0
+TAG_FALSE = 1
+TAG_TRUE = 2
+TAG_INT = 3
+TAG_FLOAT = 4
+TAG_STR = 5
+TAG_LIST = 6
+TAG_DICT = 7
+TAG_TOKEN = 8
+TAG_NODE = 9
+# Runtime objects
+TAG_INTEGER = 20
+TAG_INTEGER_FLOAT = 21
+TAG_BOOLEAN_TRUE = 22
+TAG_BOOLEAN_FALSE = 23
+TAG_NULL = 24
+TAG_STRING = 25
+TAG_ARRAY = 26
+TAG_INT_ARRAY = 27
+TAG_HASH = 28
+TAG_ERROR = 29
+TAG_RETURN_VALUE = 30
+TAG_FUNCTION = 31
+TAG_MEMOIZED_FUNCTION = 32
+TAG_BUILTIN = 33
+TAG_ENVIRONMENT = 34
+TAG_MEMO_BUDGET = 35
+TAG_SEQUENCE = 36
+# Something already written, by the order it was first written in
+TAG_REF = 40
+
+# Append-only: the position of a class is its tag on the wire
+NODE_TYPES: List[type] = [
+    ast.Program,
+    ast.Identifier,
+    ast.LetStatement,
+    ast.ReturnStatement,
+    ast.ExpressionStatement,
+    ast.IntegerLiteral,
+    ast.Boolean,
+    ast.PrefixExpression,
+    ast.InfixExpression,
+    ast.BlockStatement,
+    ast.IfExpression,
+    ast.FunctionLiteral,
+    ast.CallExpression,
+    ast.StringLiteral,
+    ast.ArrayLiteral,
+    ast.IndexExpression,
+    ast.HashLiteral,
+    ast.WhileStatement,
+    ast.ForStatement,
+]
+NODE_TAGS: Dict[type, int] = {t: i for i, t in enumerate(NODE_TYPES)}
+TOKEN_TYPES: List[TokenEnum] = list(TokenEnum)
+TOKEN_TAGS: Dict[TokenEnum, int] = {t: i for i, t in enumerate(TOKEN_TYPES)}
+
+INT64 = struct.Struct("<q")
+
+# Written once and referred to afterwards; Decoder.remember() registers the
+# same types in the same order
+SHARED_TYPES = (obj.IntArray, obj.Array, obj.Sequence, obj.Hash, obj.Environment, obj.Function,
+                obj.MemoizedFunction, obj.MemoBudget)
+
+class Encoder():
+    buf: bytearray
+    strings: Dict[str, int]
+    refs: Dict[int, int]
+    builtin_names: Dict[int, str]
+
+    def __init__(self, kind: int, builtins: Dict[str, obj.Builtin] = None):
+        self.buf = bytearray(HEADER.pack(MAGIC, VERSION, kind))
+        self.strings = dict()
+        self.refs = dict()
+        self.builtin_names = {id(b): name for name, b in (builtins or BUILTINS).items()}
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buf)
+
+    def write_uint(self, n: int) -> None:
+        buf = self.buf
+        while n >= 0x80:
+            buf.append((n & 0x7F) | 0x80)
+            n >>= 7
+        buf.append(n)
+
+    def write_int(self, n: int) -> None:
+        self.write_uint(n << 1 if n >= 0 else ((-n) << 1) - 1)
+
+    def write_str(self, s: str) -> None:
+        idx = self.strings.get(s)
+        if idx is not None:
+            self.write_uint(idx + 1)
+            return
+        data = s.encode("utf-8")
+        self.write_uint(0)
+        self.write_uint(len(data))
+        self.buf += data
+        self.strings[s] = len(self.strings)
+
+    def write_ref(self, value: any) -> bool:
+        """
+        Writes a reference and returns True when `value` was written before;
+        otherwise remembers it, and the caller writes it out in full.
+        """
+        idx = self.refs.get(id(value))
+        if idx is not None:
+            self.buf.append(TAG_REF)
+            self.write_uint(idx)
+            return True
+        self.refs[id(value)] = len(self.refs)
+        return False
+
+    def write(self, value: any) -> None:
+        value_type = type(value)
+        if value is None:
+            self.buf.append(TAG_NONE)
+        elif value_type == bool:
+            self.buf.append(TAG_TRUE if value else TAG_FALSE)
+        elif value_type == int:
+            self.buf.append(TAG_INT)
+            self.write_int(value)
+        elif value_type == float:
+            self.buf.append(TAG_FLOAT)
+            self.buf += DOUBLE.pack(value)
+        elif value_type == str:
+            self.buf.append(TAG_STR)
+            self.write_str(value)
+        elif value_type == list:
+            self.buf.append(TAG_LIST)
+            self.write_uint(len(value))
+            for v in value:
+                self.write(v)
+        elif value_type == dict:
+            self.buf.append(TAG_DICT)
+            self.write_uint(len(value))
+            for k, v in value.items():
+                self.write(k)
+                self.write(v)
+        elif value_type == Token:
+            self.buf.append(TAG_TOKEN)
+            self.write_uint(TOKEN_TAGS[value.type])
+            self.write_str(value.literal)
+        elif value_type in NODE_TAGS:
+            self.buf.append(TAG_NODE)
+            self.write_uint(NODE_TAGS[value_type])
+            for name in ast.node_fields(value_type):
+                self.write(getattr(value, name))
+        else:
+            self.write_object(value)
+
+    def write_object(self, value: obj.Object) -> None:
+        value_type = type(value)
+        if value is None:
+            self.buf.append(TAG_NONE)
+        elif value_type == obj.Integer:
+            if type(value.value) == float:
+                self.buf.append(TAG_INTEGER_FLOAT)
+                self.buf += DOUBLE.pack(value.value)
+            else:
+                self.buf.append(TAG_INTEGER)
+                self.write_int(value.value)
+        elif value_type == obj.Boolean:
+            self.buf.append(TAG_BOOLEAN_TRUE if value.value else TAG_BOOLEAN_FALSE)
+        elif value_type == obj.Null:
+            self.buf.append(TAG_NULL)
+        elif value_type == obj.String:
+            self.buf.append(TAG_STRING)
+            self.write_str(value.value)
+        elif value_type == obj.Builtin:
+            name = self.builtin_names.get(id(value))
+            if name is None:
+                raise ValueError("cannot encode a builtin that is not in the builtin table")
+            self.buf.append(TAG_BUILTIN)
+            self.write_str(name)
+        elif value_type in SHARED_TYPES and self.write_ref(value):
+            return
+        elif value_type == obj.IntArray:
+            # The raw int64 vector, eight bytes an element
+            self.buf.append(TAG_INT_ARRAY)
+            self.write_uint(len(value.values))
+            self.buf += value.values.astype("<i8").tobytes()
+        elif value_type == obj.Array:
+            self.buf.append(TAG_ARRAY)
+            self.write_uint(len(value.elements))
+            for e in value.elements:
+                self.write_object(e)
+        elif value_type == obj.Sequence:
+            # Computing the elements here would run outside of any run's
+            # limits, and a lazy sequence's recipe is Python code
+            if not value.materialized:
+                raise ValueError("cannot encode a sequence whose elements have not been computed")
+            els = value.materialize()
+            self.buf.append(TAG_SEQUENCE)
+            self.write_uint(len(els))
+            for e in els:
+                self.write_object(e)
+        elif value_type == obj.Hash:
+            self.buf.append(TAG_HASH)
+            self.write_uint(len(value.pairs))
+            for pair in value.pairs.values():
+                self.write_object(pair.key)
+                self.write_object(pair.value)
+        elif value_type == obj.Error:
+            self.buf.append(TAG_ERROR)
+            self.write_str(value.message)
+        elif value_type == obj.ReturnValue:
+            self.buf.append(TAG_RETURN_VALUE)
+            self.write_object(value.value)
+        elif value_type == obj.Environment:
+            self.buf.append(TAG_ENVIRONMENT)
+            self.write_uint(len(value.store))
+            for name, val in value.store.items():
+                self.write_str(name)
+                self.write_object(val)
+            self.write_object(value.outer)
+            self.write_object(value.memo_budget)
+        elif value_type == obj.Function:
+            self.buf.append(TAG_FUNCTION)
+            self.write(value.parameters)
+            # Every closure made from one literal shares its body
+            if not self.write_ref(value.body):
+                self.write(value.body)
+            self.write_object(value.env)
+        elif value_type == obj.MemoizedFunction:
+            # The cached results are left out: string hash keys do not
+            # survive a process restart. Their share of the budget is
+            # handed back on decoding.
+            self.buf.append(TAG_MEMOIZED_FUNCTION)
+            self.write_object(value.fn)
+            self.write_uint(value.maxsize)
+            self.write_object(value.budget)
+            self.write_uint(value.hits)
+            self.write_uint(value.misses)
+            self.write_uint(len(value.cache))
+        elif value_type == obj.MemoBudget:
+            self.buf.append(TAG_MEMO_BUDGET)
+            self.write(value.remaining)
+        else:
+            raise ValueError(f"cannot encode {value.type() if isinstance(value, obj.Object) else value_type}")
+
+class Decoder():
+    data: bytes
+    pos: int
+    strings: List[str]
+    objects: List[any]
+    builtins: Dict[str, obj.Builtin]
+
+    def __init__(self, data: bytes, kind: int, builtins: Dict[str, obj.Builtin] = None):
+        if len(data) < HEADER.size:
+            raise ValueError("not a Yada binary encoding: too short")
+        magic, version, actual_kind = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a Yada binary encoding: bad magic")
+        if version != VERSION:
+            raise ValueError(f"unsupported Yada binary encoding version: {version}")
+        if actual_kind != kind:
+            raise ValueError(f"expected encoding kind {chr(kind)}, got {chr(actual_kind)}")
+        self.data = data
+        self.pos = HEADER.size
+        self.strings = []
+        self.objects = []
+        self.builtins = builtins or BUILTINS
+
+    def read_byte(self) -> int:
+        b = self.data[self.pos]
+        self.pos += 1
+        return b
+
+    def read_uint(self) -> int:
+        data = self.data
+        result, shift = 0, 0
+        while True:
+            b = data[self.pos]
+            self.pos += 1
+            result |= (b & 0x7F) << shift
+            if b < 0x80:
+                return result
+            shift += 7
+
+    def read_int(self) -> int:
+        z = self.read_uint()
+        return z >> 1 if not z & 1 else -((z + 1) >> 1)
+
+    def read_double(self) -> float:
+        value = DOUBLE.unpack_from(self.data, self.pos)[0]
+        self.pos += DOUBLE.size
+        return value
+
+    def read_str(self) -> str:
+        idx = self.read_uint()
+        if idx > 0:
+            return self.strings[idx - 1]
+        length = self.read_uint()
+        s = str(self.data[self.pos:self.pos + length], "utf-8")
+        self.pos += length
+        self.strings.append(s)
+        return s
+
+    def read(self) -> any:
+        tag = self.read_byte()
+        if tag == TAG_NONE:
+            return None
+        elif tag == TAG_FALSE:
+            return False
+        elif tag == TAG_TRUE:
+            return True
+        elif tag == TAG_INT:
+            return self.read_int()
+        elif tag == TAG_FLOAT:
+            return self.read_double()
+        elif tag == TAG_STR:
+            return self.read_str()
+        elif tag == TAG_LIST:
+            return [self.read() for _ in range(self.read_uint())]
+        elif tag == TAG_DICT:
+            result = dict()
+            for _ in range(self.read_uint()):
+                k = self.read()
+                result[k] = self.read()
+            return result
+        elif tag == TAG_TOKEN:
+            token_type = TOKEN_TYPES[self.read_uint()]
+            return Token(token_type, self.read_str())
+        elif tag == TAG_NODE:
+            node_type = NODE_TYPES[self.read_uint()]
+            return node_type(*[self.read() for _ in ast.node_fields(node_type)])
+        return self.read_object(tag)
+
+    def remember(self, value: any) -> any:
+        # Must happen before the value's parts are read, in the same order
+        # as Encoder.write_ref saw them
+        self.objects.append(value)
+        return value
+
+    def read_object(self, tag: int = None) -> obj.Object:
+        if tag is None:
+            tag = self.read_byte()
+        if tag == TAG_NONE:
+            return None
+        elif tag == TAG_REF:
+            return self.objects[self.read_uint()]
+        elif tag == TAG_INTEGER:
+            return obj.Integer(self.read_int())
+        elif tag == TAG_INTEGER_FLOAT:
+            return obj.Integer(self.read_double())
+        elif tag == TAG_BOOLEAN_TRUE:
+            # The evaluator relies on TRUE, FALSE and NULL being singletons
+            return TRUE
+        elif tag == TAG_BOOLEAN_FALSE:
+            return FALSE
+        elif tag == TAG_NULL:
+            return NULL
+        elif tag == TAG_STRING:
+            return obj.String(self.read_str())
+        elif tag == TAG_BUILTIN:
+            name = self.read_str()
+            if name not in self.builtins:
+                raise ValueError(f"encoding refers to an unknown builtin: {name}")
+            return self.builtins[name]
+        elif tag == TAG_INT_ARRAY:
+            self.remember(None)
+            idx = len(self.objects) - 1
+            count = self.read_uint()
+            raw = self.data[self.pos:self.pos + count * INT64.size]
+            self.pos += len(raw)
+            if obj.TYPED_ARRAYS:
+                arr = obj.IntArray(obj.np.frombuffer(raw, dtype="<i8").astype(obj.np.int64))
+            else:
+                arr = obj.Array([obj.Integer(v) for (v,) in INT64.iter_unpack(raw)])
+            self.objects[idx] = arr
+            return arr
+        elif tag == TAG_ARRAY:
+            arr = self.remember(obj.Array([]))
+            arr.elements = [self.read_object() for _ in range(self.read_uint())]
+            return arr
+        elif tag == TAG_SEQUENCE:
+            els = []
+            seq = self.remember(obj.new_materialized_sequence(els))
+            els.extend(self.read_object() for _ in range(self.read_uint()))
+            seq.length = len(els)
+            return seq
+        elif tag == TAG_HASH:
+            h = self.remember(obj.Hash(dict()))
+            for _ in range(self.read_uint()):
+                key = self.read_object()
+                h.pairs[key.hash_key()] = obj.HashPair(key, self.read_object())
+            return h
+        elif tag == TAG_ERROR:
+            return obj.Error(self.read_str())
+        elif tag == TAG_RETURN_VALUE:
+            return obj.ReturnValue(self.read_object())
+        elif tag == TAG_ENVIRONMENT:
+            env = self.remember(obj.Environment(dict(), None))
+            for _ in range(self.read_uint()):
+                name = self.read_str()
+                env.store[name] = self.read_object()
+            env.outer = self.read_object()
+            env.memo_budget = self.read_object()
+            return env
+        elif tag == TAG_FUNCTION:
+            fn = self.remember(obj.Function([], None, None))
+            fn.parameters = self.read()
+            if self.data[self.pos] == TAG_REF:
+                fn.body = self.read_object()
+            else:
+                idx = len(self.objects)
+                self.remember(None)
+                fn.body = self.objects[idx] = self.read()
+            fn.env = self.read_object()
+            return fn
+        elif tag == TAG_MEMOIZED_FUNCTION:
+            memo = self.remember(obj.MemoizedFunction(None, 0, None))
+            memo.fn = self.read_object()
+            memo.maxsize = self.read_uint()
+            memo.budget = self.read_object()
+            memo.hits = self.read_uint()
+            memo.misses = self.read_uint()
+            for _ in range(self.read_uint()):
+                memo.budget.release()
+            return memo
+        elif tag == TAG_MEMO_BUDGET:
+            budget = self.remember(obj.MemoBudget(None))
+            budget.remaining = self.read()
+            return budget
+        raise ValueError(f"corrupt Yada binary encoding: unknown tag {tag} at byte {self.pos - 1}")
+
+def encode_program(program: ast.Program) -> bytes:
+    e = Encoder(KIND_PROGRAM)
+    e.write(program)
+    return e.getvalue()
+
+def decode_program(data: bytes) -> ast.Program:
+    program = Decoder(data, KIND_PROGRAM).read()
+    if type(program) != ast.Program:
+        raise ValueError(f"encoding does not hold a Program, got={type(program).__name__}")
+    return program
+
+def encode_value(value: obj.Object, builtins: Dict[str, obj.Builtin] = None) -> bytes:
+    e = Encoder(KIND_VALUE, builtins)
+    e.write_object(value)
+    return e.getvalue()
+
+def decode_value(data: bytes, builtins: Dict[str, obj.Builtin] = None) -> obj.Object:
+    return Decoder(data, KIND_VALUE, builtins).read_object()
+
+def encode_environment(env: obj.Environment, builtins: Dict[str, obj.Builtin] = None) -> bytes:
+    """
+    A snapshot of `env`, its outer environments and everything their
+    bindings reach, closures included. `builtins` is the table of the
+    interpreter the environment came from. Sequences are only encoded once
+    materialized; raises ValueError on one that is not.
+    """
+    e = Encoder(KIND_ENVIRONMENT, builtins)
+    e.write_object(env)
+    return e.getvalue()
+
+def decode_environment(data: bytes, builtins: Dict[str, obj.Builtin] = None) -> obj.Environment:
+    """ Rebuilds an environment from encode_environment(), without evaluating anything. """
+    env = Decoder(data, KIND_ENVIRONMENT, builtins).read_object()
+    if type(env) != obj.Environment:
+        raise ValueError(f"encoding does not hold an Environment, got={type(env).__name__}")
+    return env
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+import yada.yada_python.yada_ast as ast
+import yada.yada_python.yada_binary as yada_binary
+import yada.yada_python.yada_lexer as yada_lexer
+import yada.yada_python.yada_parser as yada_parser
+import yada.yada_python.yada_token as yada_token
+from yada.yada_python.yada_binary import encode_program, decode_program, VERSION
+
+# Parsed programs kept in memory, and bytes kept on disk, by default
+MEMORY_MAX_ENTRIES = 1024
+DISK_MAX_BYTES = 256 * 1024 * 1024
+CACHE_SUFFIX = ".ydb"
+# Whole results kept by a ResultCache by default
+RESULT_MAX_ENTRIES = 1024
+RESULT_MAX_BYTES = 64 * 1024 * 1024
+RESULT_TTL_SECONDS = 300.0
+
+def _frontend_digest() -> str:
+    h = hashlib.sha256()
+    for module in (yada_token, yada_lexer, yada_parser, ast, yada_binary):
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+# Changes whenever the code that turns source into a stored AST does
+FRONTEND_DIGEST = _frontend_digest()
+
+class ProgramCache():
+    """
+    Maps the digest of a program's source to its parsed AST, like __pycache__
+    does for Python. Lookups go to an in-memory LRU of Program objects first,
+    then to binary encodings (see yada_binary) in `directory`, which may be
+    shared by several processes. Once the directory holds more than
+    `max_disk_bytes`, the least recently used files are removed. With no
+    `directory` only the memory tier is used.
+
+    The key covers the encoding version and the source of the modules that
+    lex, parse and encode programs (see FRONTEND_DIGEST), so a cache written
+    by an older parser is never read back. Only programs that parsed without
+    errors are cached. Cached Program objects are shared and must not be
+    modified.
+    """
+    directory: str | None
+    max_entries: int
+    max_disk_bytes: int
+    memory: OrderedDict
+    disk_bytes: int | None
+    stats: Dict[str, int]
+
+    def __init__(self, directory: str | None = None, max_entries: int = MEMORY_MAX_ENTRIES,
+                 max_disk_bytes: int = DISK_MAX_BYTES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.disk_bytes = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def key(self, source: str) -> str:
+        h = hashlib.sha256(f"yada-ast-{VERSION}-{FRONTEND_DIGEST}\0".encode("utf-8"))
+        h.update(source.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, source: str) -> ast.Program | None:
+        key = self.key(source)
+        with self._lock:
+            program = self.memory.get(key)
+            if program is not None:
+                self.memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return program
+        program = self._read(key)
+        with self._lock:
+            if program is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, program)
+        return program
+
+    def put(self, source: str, program: ast.Program) -> None:
+        key = self.key(source)
+        with self._lock:
+            self._remember(key, program)
+        self._write(key, program)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.memory.clear()
+            if self.directory is not None:
+                for path, _, _ in self._files():
+                    _remove(path)
+                self.disk_bytes = 0
+
+    def _remember(self, key: str, program: ast.Program) -> None:
+        self.memory[key] = program
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + CACHE_SUFFIX)
+
+    def _read(self, key: str) -> ast.Program | None:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            program = decode_program(data)
+        except (ValueError, IndexError, UnicodeDecodeError, TypeError, struct.error):
+            # Truncated, corrupt or from an incompatible build: drop it and re-parse
+            _remove(path)
+            return None
+        try:
+            # Eviction goes by modification time, so a hit marks it as used
+            os.utime(path)
+        except OSError:
+            pass
+        return program
+
+    def _write(self, key: str, program: ast.Program) -> None:
+        if self.directory is None:
+            return
+        data = encode_program(program)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary name first so readers never see half a file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = sum(size for _, size, _ in self._files())
+            else:
+                self.disk_bytes += len(data)
+            if self.disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def _files(self) -> list:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(CACHE_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((path, st.st_size, st.st_mtime))
+        return files
+
+    def _evict(self) -> None:
+        # Other processes write to the same directory, so recount before
+        # deciding what to remove
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_disk_bytes:
+                break
+            if _remove(path):
+                total -= size
+        self.disk_bytes = total
+
+class ResultCache():
+    """
+    Keeps whole Yada() results in memory so identical requests skip parsing
+    and evaluation. Results are stored as JSON text, which is what bounds
+    memory (`max_bytes` counts its UTF-8 size) and gives every hit a fresh
+    copy the caller may modify. Entries older than `ttl` seconds are dropped
+    when looked up; past `max_entries` or `max_bytes` the least recently used
+    go first. Yada() only stores results of deterministic programs.
+    """
+    max_entries: int
+    max_bytes: int
+    ttl: float | None
+    entries: OrderedDict
+    size: int
+    stats: Dict[str, int]
+
+    def __init__(self, max_entries: int = RESULT_MAX_ENTRIES, max_bytes: int = RESULT_MAX_BYTES,
+                 ttl: float | None = RESULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def key(self, source: str, config: tuple, fields: tuple) -> str:
+        h = hashlib.sha256(repr((config, fields)).encode("utf-8"))
+        h.update(b"\0")
+        h.update(source.encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= time.monotonic():
+                self._drop(key)
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            text = entry[1]
+        return json.loads(text)
+
+    def put(self, key: str, result: dict) -> bool:
+        """ Returns False when the result cannot be stored (too big, not JSON). """
+        try:
+            text = json.dumps(result)
+        except (TypeError, ValueError):
+            return False
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return False
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (expires, text, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.stats["evictions"] += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
+
+    def metrics(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.size)
+
+    def _drop(self, key: str) -> None:
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+def default_cache_dir() -> str | None:
+    """
+    $YADA_CACHE_DIR. The disk tier is only used when it is set to a
+    directory; otherwise programs are only cached in memory.
+    """
+    return os.environ.get("YADA_CACHE_DIR") or None
+
+_default_cache: ProgramCache | None = None
+_default_cache_lock = threading.Lock()
+
+def default_cache() -> ProgramCache:
+    """ The process-wide cache used by Yada() and the REPL. """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ProgramCache(default_cache_dir())
+        return _default_cache
@@ -1,40 +1,384 @@
 import yada.yada_python.yada_ast as ast
 import yada.yada_python.yada_object as obj
-from typing import Callable, Dict, List
+from yada.yada_python.yada_lexer import Lexer
+from yada.yada_python.yada_token import TokenEnum
+from yada.yada_python.yada_parser import Parser
+from yada.yada_python.yada_output import Output, StreamOutput, OutputLimitExceeded
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, Iterator, List
+
+# Below this length NumPy's per-call overhead outweighs the vectorized loop
+TYPED_ARRAY_MIN_LENGTH = 32
+ELEMENTWISE_OPERATORS = ("+", "-", "*", "/")
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
 
 TRUE = obj.Boolean(True)
 FALSE = obj.Boolean(False)
 NULL = obj.Null()
 
-def builtin_len(*args: List[obj.Object]) -> obj.Object:
+# Where `puts` goes when the caller does not provide an output
+STDOUT = StreamOutput()
+
+# Only the tree-walking evaluator below exists today
+ENGINES = ("tree",)
+
+# Steps (function calls and loop iterations) between two looks at the clock
+# and at the cancel event
+DEADLINE_CHECK_STEPS = 1000
+# Arithmetic on integers wider than this takes a step per word of its result
+WORD_BITS = 64
+# Results of infix expressions that count against a run's memory quota
+ALLOCATED_TYPES = frozenset((obj.String, obj.Array, obj.IntArray, obj.Hash))
+
+# Bump whenever a program could evaluate differently than before; cached
+# results are keyed on it
+INTERPRETER_VERSION = 1
+
+class RunResult():
+    program: ast.Program
+    errors: List[str]
+    env: obj.Environment
+    evaluated: obj.Object
+    out: Output
+    allocated_bytes: int
+    max_allocated_bytes: int | None
+    metrics: any # : Metrics | None
+    interp: any # : Interpreter | None
+
+    def __init__(self, program: ast.Program, errors: List[str], env: obj.Environment, evaluated: obj.Object, out: Output,
+                 allocated_bytes: int = 0, max_allocated_bytes: int | None = None, metrics: any = None,
+                 interp: any = None):
+        self.program = program
+        self.errors = errors
+        self.env = env
+        self.evaluated = evaluated
+        self.out = out
+        self.allocated_bytes = allocated_bytes
+        self.max_allocated_bytes = max_allocated_bytes
+        self.metrics = metrics
+        # What ran it, whose limits still apply to serializing lazy results
+        self.interp = interp
+
+class Metrics():
+    """
+    Where the time of one run went and how much work it did. The interpreter
+    only counts while a Metrics is passed to `run`; otherwise each counter
+    costs one `is None` test at most.
+
+    Lexing and parsing normally interleave; to time them apart, a measured
+    run lexes the whole source first. A program found in the program cache
+    is neither lexed nor parsed, and `program_cached` says so.
+    """
+    phases: Dict[str, List[float]]
+    tokens: int
+    ast_nodes: int
+    program_cached: bool
+    nodes_evaluated: int
+    function_calls: int
+    peak_env_depth: int
+    allocated: Counter
+
+    def __init__(self):
+        self.phases = dict()
+        self.tokens = 0
+        self.ast_nodes = 0
+        self.program_cached = False
+        self.nodes_evaluated = 0
+        self.function_calls = 0
+        self.peak_env_depth = 1
+        self.allocated = Counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        """ Adds the wall and CPU time of the `with` block to phase `name`. """
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, [0.0, 0.0])
+            totals[0] += time.perf_counter() - wall
+            totals[1] += time.thread_time() - cpu
+
+    def call(self, fn: obj.Function) -> None:
+        self.function_calls += 1
+        self.allocated["ENVIRONMENT"] += 1
+        depth, env = 1, fn.env
+        while env is not None:
+            depth += 1
+            env = env.outer
+        if depth > self.peak_env_depth:
+            self.peak_env_depth = depth
+
+    def to_json(self) -> dict:
+        return {
+            "phases": {name: {"wall_seconds": wall, "cpu_seconds": cpu} for name, (wall, cpu) in self.phases.items()},
+            "tokens": self.tokens,
+            "ast_nodes": self.ast_nodes,
+            "program_cached": self.program_cached,
+            "nodes_evaluated": self.nodes_evaluated,
+            "function_calls": self.function_calls,
+            "peak_env_depth": self.peak_env_depth,
+            "allocated": dict(self.allocated),
+        }
+
+class _TokenReplay():
+    """ Hands a Parser tokens lexed beforehand, as if it were the Lexer. """
+    def __init__(self, tokens: List[any]):
+        self.tokens = tokens
+        self.position = 0
+
+    def next_token(self):
+        # Past the end the lexer keeps returning EOF, and so does this
+        tok = self.tokens[min(self.position, len(self.tokens) - 1)]
+        self.position += 1
+        return tok
+
+class Interpreter():
+    """
+    Everything an evaluation needs besides the AST and the environment: the
+    builtins it may call, the engine that runs it, its limits, its hooks and,
+    while it runs, where `puts` writes and the environment it started in.
+    Interpreters share no mutable state (TRUE, FALSE and NULL are immutable),
+    so a server can keep one per worker thread. A single instance must not run
+    on two threads at once.
+
+    Hooks are objects with optional `before_eval(interp, program, env)` and
+    `after_eval(interp, program, env, evaluated)` methods.
+
+    With a `program_cache` (see yada_cache.ProgramCache), `parse` looks the
+    source up there before lexing and parsing it.
+
+    A run may take at most `max_steps` steps, one per function call, loop
+    iteration and element a range produces, and one per word of the result
+    of arithmetic on integers wider than a word (everything else a program
+    does is bounded by its length or by what it allocated), and
+    stops once `timeout` seconds have passed since it started; either way it
+    evaluates to an Error. So does a run whose `cancel` event (an argument of
+    `eval` and `run`) gets set, e.g. from another thread. Recursing deeper
+    than Python's stack allows is an Error too.
+
+    Every String, Array and Hash a run creates adds its approximate size (see
+    yada_object.allocation_size) to `allocated_bytes`, as do the elements of
+    a materialized Sequence, the lists builtins build and the digits of
+    integers wider than a word, and past
+    `max_allocated_bytes` the run evaluates to an Error. This counts all
+    that was ever allocated, not what is still alive, so the quota bounds
+    the work a program does with memory as well as what it keeps.
+    """
+    builtins: Dict[str, obj.Builtin]
+    engine: str
+    memo_max_entries: int | None
+    output_spill_bytes: int | None
+    max_output_bytes: int | None
+    hooks: List[any]
+    program_cache: any
+    max_steps: int | None
+    timeout: float | None
+    max_allocated_bytes: int | None
+    out: Output
+    env: obj.Environment | None
+    cancel: threading.Event | None
+    metrics: Metrics | None
+    countdown: int
+    timed_out: bool
+    cancelled: bool
+    allocated_bytes: int
+
+    def __init__(self, builtins: Dict[str, obj.Builtin] = None, engine: str = "tree",
+                 memo_max_entries: int | None = None, output_spill_bytes: int | None = None,
+                 max_output_bytes: int | None = None, hooks: List[any] = None,
+                 program_cache: any = None, max_steps: int | None = None, timeout: float | None = None,
+                 max_allocated_bytes: int | None = None):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine: {engine}")
+        self.builtins = dict(BUILTINS) if builtins is None else builtins
+        self.engine = engine
+        self.memo_max_entries = memo_max_entries
+        self.output_spill_bytes = output_spill_bytes
+        self.max_output_bytes = max_output_bytes
+        self.hooks = list(hooks) if hooks else []
+        self.program_cache = program_cache
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.max_allocated_bytes = max_allocated_bytes
+        self.out = STDOUT
+        self.env = None
+        self.cancel = None
+        self.metrics = None
+        self._start_budget()
+
+    def new_environment(self) -> obj.Environment:
+        return obj.new_environment(self.memo_max_entries)
+
+    def config_key(self) -> tuple:
+        """ Everything besides the source that decides what a run returns. """
+        builtins = tuple(sorted((name, id(b.fn), b.pure, b.deterministic) for name, b in self.builtins.items()))
+        return (INTERPRETER_VERSION, self.engine, self.memo_max_entries, self.max_output_bytes, self.max_steps,
+                self.max_allocated_bytes, builtins)
+
+    def parse(self, source: str, metrics: Metrics = None) -> (ast.Program, List[str]):
+        if self.program_cache is not None:
+            program = self.program_cache.get(source)
+            if program is not None:
+                if metrics is not None:
+                    metrics.program_cached = True
+                    metrics.ast_nodes = ast.count_nodes(program)
+                return program, []
+        if metrics is None:
+            p = Parser(Lexer(source))
+            program = p.parse_program()
+        else:
+            with metrics.phase("lex"):
+                tokens = list(_lex(source))
+            metrics.tokens = len(tokens)
+            with metrics.phase("parse"):
+                p = Parser(_TokenReplay(tokens))
+                program = p.parse_program()
+            metrics.ast_nodes = ast.count_nodes(program)
+        if self.program_cache is not None and len(p.errors) == 0:
+            self.program_cache.put(source, program)
+        return program, p.errors
+
+    def eval(self, program: ast.Node, env: obj.Environment, out: Output = None,
+             cancel: threading.Event = None, metrics: Metrics = None) -> obj.Object:
+        self.out = out if out is not None else STDOUT
+        self.env = env
+        self.cancel = cancel
+        self.metrics = metrics
+        self._start_budget()
+        for hook in self.hooks:
+            if hasattr(hook, "before_eval"):
+                hook.before_eval(self, program, env)
+        try:
+            if metrics is None:
+                evaluated = Eval(program, env, self)
+            else:
+                with metrics.phase("eval"):
+                    evaluated = Eval(program, env, self)
+        except RecursionError:
+            evaluated = new_error("maximum recursion depth exceeded")
+        for hook in self.hooks:
+            if hasattr(hook, "after_eval"):
+                hook.after_eval(self, program, env, evaluated)
+        return evaluated
+
+    def step(self) -> obj.Error | None:
+        """
+        Called by the evaluator once `countdown` reaches zero; returns the
+        Error to stop with once the run is out of steps or time.
+        """
+        self.steps_taken += self.countdown_from - self.countdown
+        if self.max_steps is not None and self.steps_taken > self.max_steps:
+            self.countdown = self.countdown_from = 1
+            return new_error(f"step budget exhausted: more than {self.max_steps} steps")
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.timed_out = True
+            self.countdown = self.countdown_from = 1
+            return new_error(f"timed out after {self.timeout}s")
+        if self.cancel is not None and self.cancel.is_set():
+            self.cancelled = True
+            self.countdown = self.countdown_from = 1
+            return new_error("evaluation cancelled")
+        self.countdown_from = DEADLINE_CHECK_STEPS
+        if self.max_steps is not None:
+            self.countdown_from = min(self.countdown_from, self.max_steps - self.steps_taken + 1)
+        self.countdown = self.countdown_from
+        return None
+
+    def spend(self, steps: int) -> obj.Error | None:
+        """
+        Takes `steps` steps at once for work that is about to take that long,
+        such as arithmetic on big integers. The limits are checked right away
+        rather than after the next DEADLINE_CHECK_STEPS steps, since one such
+        operation can take longer than the whole timeout.
+        """
+        self.countdown -= steps
+        return self.step()
+
+    def allocate(self, val: obj.Object) -> obj.Object:
+        """ Accounts for a newly created `val`; returns it, or the Error to stop with. """
+        if self.metrics is not None:
+            self.metrics.allocated[val.type().value] += 1
+        stop = self.charge(obj.allocation_size(val))
+        return stop if stop is not None else val
+
+    def charge(self, nbytes: int) -> obj.Error | None:
+        """ Accounts for `nbytes` allocated outside of any object; returns the Error to stop with. """
+        self.allocated_bytes += nbytes
+        if self.max_allocated_bytes is not None and self.allocated_bytes > self.max_allocated_bytes:
+            return new_error(f"memory quota exceeded: allocated more than {self.max_allocated_bytes} bytes")
+        return None
+
+    def _start_budget(self) -> None:
+        self.allocated_bytes = 0
+        self.steps_taken = 0
+        self.deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        self.timed_out = False
+        self.cancelled = False
+        # Steps taken are added up when the countdown runs out, not one by one
+        self.countdown_from = 0
+        self.countdown = 0
+        self.step()
+
+    def run(self, source: str, env: obj.Environment = None, out: Output = None,
+            cancel: threading.Event = None, metrics: Metrics = None) -> RunResult:
+        program, errors = self.parse(source, metrics)
+        env = env if env is not None else self.new_environment()
+        out = out if out is not None else Output(self.output_spill_bytes, self.max_output_bytes)
+        evaluated = self.eval(program, env, out, cancel, metrics)
+        return RunResult(program, errors, env, evaluated, out, self.allocated_bytes, self.max_allocated_bytes,
+                         metrics, self)
+
+def _lex(source: str) -> Iterator[any]:
+    lexer = Lexer(source)
+    while True:
+        tok = lexer.next_token()
+        yield tok
+        if tok.type == TokenEnum.EOF:
+            return
+
+def builtin_len(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
     if len(args) != 1:
         return new_error(f"wrong number of arguments. got={len(args)}, want=1")
     arg = args[0]
     arg_type = type(arg)
-    if arg_type == obj.Array:
-        return obj.Integer(len(arg.elements))
+    if isinstance(arg, obj.Array):
+        return obj.Integer(sequence_length(arg))
     if arg_type == obj.String:
         return obj.Integer(len(arg.value))
+    if arg_type == obj.Sequence:
+        if arg.length is not None:
+            return obj.Integer(arg.length)
+        els = arg.materialize(interp)
+        if len(els) > 0 and is_error(els[-1]):
+            return els[-1]
+        return obj.Integer(len(els))
     else:
         return new_error(f"argument to 'len' not supported, got={arg.type()}")
 
-def builtin_first(*args: List[obj.Object]) -> obj.Object:
+def builtin_first(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
     if len(args) != 1:
         return new_error(f"wrong number of arguments. got={len(args)}, want=1")
     arg = args[0]
     arg_type = type(arg)
-    if arg_type != obj.Array:
+    if arg_type == obj.Sequence:
+        return arg.nth(0, interp)
+    if not isinstance(arg, obj.Array):
         return new_error(f"argument to 'first' must be ARRAY, got={arg.type()}")
     if len(arg.elements) > 0:
         return arg.elements[0]
     return None # TODO: Should this be NULL?
 
-def builtin_last(*args: List[obj.Object]) -> obj.Object:
+def builtin_last(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
     if len(args) != 1:
         return new_error(f"wrong number of arguments. got={len(args)}, want=1")
     arg = args[0]
     arg_type = type(arg)
-    if arg_type != obj.Array:
+    if not isinstance(arg, obj.Array):
         return new_error(f"argument to 'last' must be ARRAY, got={arg.type()}")
     length = len(arg.elements)
     if length > 0:
@@ -42,88 +386,297 @@ def builtin_last(*args: List[obj.Object]) -> obj.Object:
     return None # TODO: Should this be NULL?
 
 
-def builtin_rest(*args: List[obj.Object]) -> obj.Object:
+def builtin_rest(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
     if len(args) != 1:
         return new_error(f"wrong number of arguments. got={len(args)}, want=1")
     arg = args[0]
     arg_type = type(arg)
-    if arg_type != obj.Array:
+    if not isinstance(arg, obj.Array):
         return new_error(f"argument to 'rest' must be ARRAY, got={arg.type()}")
     length = len(arg.elements)
     if length > 0:
         els = [e for e in arg.elements[1:]]
-        return obj.Array(els)
+        return interp.allocate(obj.Array(els))
     return None # TODO: Should this be NULL?
 
-def builtin_push(*args: List[obj.Object]) -> obj.Object:
+def builtin_push(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
     if len(args) != 2:
         return new_error(f"wrong number of arguments. got={len(args)}, want=1")
     arr = args[0]
-    arg_type = type(arr)
-    if arg_type != obj.Array:
+    if not isinstance(arr, obj.Array):
         return new_error(f"argument to 'push' must be ARRAY, got={arr.type()}")
     
     els = [e for e in arr.elements]
     els.append(args[1])
-    return obj.Array(els)
+    return interp.allocate(obj.Array(els))
 
-def builtin_puts(*args: List[obj.Object]) -> obj.Object:
+def builtin_puts(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
     for a in args:
-        print(a.inspect())
+        stop = materialize_all(a, interp)
+        if stop is not None:
+            return stop
+    try:
+        interp.out.write("".join(f"{a.inspect()}\n" for a in args))
+    except OutputLimitExceeded as e:
+        return new_error(str(e))
     return NULL
 
+def builtin_range(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) not in (1, 2):
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1 or 2")
+    for a in args:
+        if type(a) != obj.Integer:
+            return new_error(f"argument to 'range' must be INTEGER, got={a.type()}")
+    bounds = range(*[a.value for a in args])
+    def counted(interp: Interpreter) -> Iterator[obj.Object]:
+        # Every element is a step, like a loop iteration, so nothing that
+        # walks a range can outrun the run's limits
+        for i in bounds:
+            interp.countdown -= 1
+            if interp.countdown <= 0:
+                stop = interp.step()
+                if stop is not None:
+                    yield stop
+                    return
+            yield obj.Integer(i)
+    return obj.Sequence(counted, len(bounds), interp)
+
+def builtin_map(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 2:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=2")
+    coll, fn = args
+    if not is_iterable(coll):
+        return new_error(f"argument to 'map' must be ARRAY or SEQUENCE, got={coll.type()}")
+    def mapped(interp: Interpreter) -> Iterator[obj.Object]:
+        for e in iter_elements(coll, interp):
+            if is_error(e):
+                yield e
+                return
+            result = apply_function(fn, [e], interp)
+            yield result
+            if is_error(result):
+                return
+    return obj.Sequence(mapped, sequence_length(coll), interp)
+
+def builtin_filter(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 2:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=2")
+    coll, fn = args
+    if not is_iterable(coll):
+        return new_error(f"argument to 'filter' must be ARRAY or SEQUENCE, got={coll.type()}")
+    def filtered(interp: Interpreter) -> Iterator[obj.Object]:
+        for e in iter_elements(coll, interp):
+            if is_error(e):
+                yield e
+                return
+            keep = apply_function(fn, [e], interp)
+            if is_error(keep):
+                yield keep
+                return
+            if is_truthy(keep):
+                yield e
+    return obj.Sequence(filtered, interp=interp)
+
+def builtin_take(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 2:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=2")
+    coll, n = args
+    if not is_iterable(coll):
+        return new_error(f"argument to 'take' must be ARRAY or SEQUENCE, got={coll.type()}")
+    if type(n) != obj.Integer:
+        return new_error(f"argument to 'take' must be INTEGER, got={n.type()}")
+    count = max(n.value, 0)
+    length = sequence_length(coll)
+    return obj.Sequence(
+        lambda interp: islice(iter_elements(coll, interp), count),
+        min(length, count) if length is not None else None,
+        interp,
+    )
+
+def builtin_array(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 1:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1")
+    coll = args[0]
+    if not is_iterable(coll):
+        return new_error(f"argument to 'array' must be ARRAY or SEQUENCE, got={coll.type()}")
+    if isinstance(coll, obj.Array):
+        return coll
+    els = coll.materialize(interp)
+    if len(els) > 0 and is_error(els[-1]):
+        return els[-1]
+    return interp.allocate(new_array(els))
+
+def integer_values(name: str, coll: obj.Object, interp: Interpreter) -> any:
+    """
+    Returns what a numeric builtin should reduce over: the int64 vector of an
+    IntArray, a list of Python ints for any other collection, or an Error.
+    """
+    if not is_iterable(coll):
+        return new_error(f"argument to '{name}' must be ARRAY or SEQUENCE, got={coll.type()}")
+    if type(coll) == obj.IntArray:
+        return coll.values
+    values = []
+    for e in iter_elements(coll, interp):
+        if is_error(e):
+            return e
+        if type(e) != obj.Integer:
+            return new_error(f"argument to '{name}' must only contain INTEGER, got={e.type()}")
+        stop = interp.charge(obj.SLOT_BYTES)
+        if stop is not None:
+            return stop
+        values.append(e.value)
+    return values
+
+def builtin_sum(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 1:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1")
+    values = integer_values("sum", args[0], interp)
+    if type(values) == obj.Error:
+        return values
+    if type(values) != list and len(values) * int64_magnitude(values) > INT64_MAX:
+        # The int64 sum could wrap around; Yada integers never do
+        values = values.tolist()
+    return obj.Integer(int(values.sum()) if type(values) != list else sum(values))
+
+def builtin_min(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 1:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1")
+    values = integer_values("min", args[0], interp)
+    if type(values) == obj.Error:
+        return values
+    if len(values) == 0:
+        return None # TODO: Should this be NULL?
+    return obj.Integer(int(values.min()) if type(values) != list else min(values))
+
+def builtin_max(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 1:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1")
+    values = integer_values("max", args[0], interp)
+    if type(values) == obj.Error:
+        return values
+    if len(values) == 0:
+        return None # TODO: Should this be NULL?
+    return obj.Integer(int(values.max()) if type(values) != list else max(values))
+
+def builtin_dot(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 2:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=2")
+    left = integer_values("dot", args[0], interp)
+    if type(left) == obj.Error:
+        return left
+    right = integer_values("dot", args[1], interp)
+    if type(right) == obj.Error:
+        return right
+    if len(left) != len(right):
+        return new_error(f"array length mismatch: {len(left)} dot {len(right)}")
+    if type(left) != list and type(right) != list and \
+            len(left) * int64_magnitude(left) * int64_magnitude(right) <= INT64_MAX:
+        return obj.Integer(int(left.dot(right)))
+    return obj.Integer(sum(int(l) * int(r) for l, r in zip(left, right)))
+
+DEFAULT_MEMO_MAXSIZE = 128
+
+def builtin_memo(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) not in (1, 2):
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1 or 2")
+    fn = args[0]
+    if type(fn) != obj.Function:
+        return new_error(f"argument to 'memo' must be FUNCTION, got={fn.type()}")
+    maxsize = DEFAULT_MEMO_MAXSIZE
+    if len(args) == 2:
+        if type(args[1]) != obj.Integer or args[1].value < 1:
+            return new_error(f"maxsize of 'memo' must be a positive INTEGER, got={args[1].inspect()}")
+        maxsize = args[1].value
+    # The budget of the evaluation running now: a function from a frozen
+    # prelude (see yada_frontend.Prelude) is shared by every fork of it
+    env = interp.env if interp.env is not None else fn.env
+    budget = env.root().memo_budget or obj.MemoBudget(None)
+    return obj.MemoizedFunction(fn, maxsize, budget)
+
+def builtin_memo_stats(interp: Interpreter, *args: List[obj.Object]) -> obj.Object:
+    if len(args) != 1:
+        return new_error(f"wrong number of arguments. got={len(args)}, want=1")
+    fn = args[0]
+    if type(fn) != obj.MemoizedFunction:
+        return new_error(f"argument to 'memo_stats' must be MEMOIZED_FUNCTION, got={fn.type()}")
+    pairs: Dict[obj.HashKey, obj.HashPair] = dict()
+    for k, v in fn.stats().items():
+        key = obj.String(k)
+        pairs[key.hash_key()] = obj.HashPair(key, obj.Integer(v))
+    return obj.Hash(pairs)
+
+# The default builtin table; every Interpreter starts from a copy of it
 BUILTINS: Dict[str, obj.Builtin] = {
     "len": obj.Builtin(builtin_len),
     "first": obj.Builtin(builtin_first),
     "last": obj.Builtin(builtin_last),
     "rest": obj.Builtin(builtin_rest),
     "push": obj.Builtin(builtin_push),
-    "puts": obj.Builtin(builtin_puts),
+    "puts": obj.Builtin(builtin_puts, pure=False),
+    "range": obj.Builtin(builtin_range),
+    "map": obj.Builtin(builtin_map),
+    "filter": obj.Builtin(builtin_filter),
+    "take": obj.Builtin(builtin_take),
+    "array": obj.Builtin(builtin_array),
+    "sum": obj.Builtin(builtin_sum),
+    "min": obj.Builtin(builtin_min),
+    "max": obj.Builtin(builtin_max),
+    "dot": obj.Builtin(builtin_dot),
+    "memo": obj.Builtin(builtin_memo),
+    "memo_stats": obj.Builtin(builtin_memo_stats),
 }
 
-def Eval(node: ast.Node, env: obj.Environment) -> obj.Object:
+def Eval(node: ast.Node, env: obj.Environment, interp: Interpreter = None) -> obj.Object:
+    if interp is None:
+        interp = Interpreter()
+    if interp.metrics is not None:
+        interp.metrics.nodes_evaluated += 1
     node_type = type(node)
     # Statements
     if node_type == ast.Program:
-        return eval_program(node, env)
+        return eval_program(node, env, interp)
     
     elif node_type == ast.ExpressionStatement:
-        return Eval(node.expression, env)
+        return Eval(node.expression, env, interp)
     
     elif node_type == ast.BlockStatement:
-        return eval_block_statement(node, env)
+        return eval_block_statement(node, env, interp)
     
     elif node_type == ast.IfExpression:
-        return eval_if_expression(node, env)
+        return eval_if_expression(node, env, interp)
+
+    elif node_type == ast.WhileStatement:
+        return eval_while_statement(node, env, interp)
+
+    elif node_type == ast.ForStatement:
+        return eval_for_statement(node, env, interp)
     
     elif node_type == ast.ReturnStatement:
-        val = Eval(node.return_value, env)
+        val = Eval(node.return_value, env, interp)
         if (is_error(val)):
             return val
         return obj.ReturnValue(val)
 
     elif node_type == ast.LetStatement:
-        val = Eval(node.value, env)
+        val = Eval(node.value, env, interp)
         if (is_error(val)):
             return val
         env.set(node.name.value, val)
 
     elif node_type == ast.FunctionLiteral:
-        params = node.parameters
-        body = node.body
-        return obj.Function(params, body, env)
+        return eval_function_literal(node, env, interp)
 
     elif node_type == ast.CallExpression:
-        function = Eval(node.function, env)
+        function = Eval(node.function, env, interp)
         if (is_error(function)):
             return function
-        args: List[obj.Object] = eval_expressions(node.arguments, env)
+        args: List[obj.Object] = eval_expressions(node.arguments, env, interp)
         if len(args) == 1 and is_error(args[0]):
             return args[0]
-        return apply_function(function, args)
+        return apply_function(function, args, interp)
 
     elif node_type == ast.Identifier:
-        return eval_identifier(node, env)
+        return eval_identifier(node, env, interp)
     
     elif node_type == ast.IntegerLiteral:
         return obj.Integer(node.value)
@@ -132,47 +685,50 @@ def Eval(node: ast.Node, env: obj.Environment) -> obj.Object:
         return native_bool_to_boolean_object(node.value)
 
     elif node_type == ast.StringLiteral:
-        return obj.String(node.value)
+        return interp.allocate(obj.String(node.value))
     
     elif node_type == ast.PrefixExpression:
-        right = Eval(node.right, env)
+        right = Eval(node.right, env, interp)
         if (is_error(right)):
             return right
-        return eval_prefix_expression(node.operator, right)
+        return eval_prefix_expression(node.operator, right, interp)
     
     elif node_type == ast.InfixExpression:
-        left = Eval(node.left, env)
+        left = Eval(node.left, env, interp)
         if (is_error(left)):
             return left
-        right = Eval(node.right, env)
+        right = Eval(node.right, env, interp)
         if (is_error(right)):
             return right
-        return eval_infix_expression(node.operator, left, right)
+        result = eval_infix_expression(node.operator, left, right, interp)
+        if type(result) in ALLOCATED_TYPES:
+            return interp.allocate(result)
+        return result
     
     elif node_type == ast.ArrayLiteral:
-        elements = eval_expressions(node.elements, env)
+        elements = eval_expressions(node.elements, env, interp)
         if len(elements) == 1 and is_error(elements[0]):
             return elements[0]
-        return obj.Array(elements)
+        return interp.allocate(new_array(elements))
     
     elif node_type == ast.IndexExpression:
-        left = Eval(node.left, env)
+        left = Eval(node.left, env, interp)
         if (is_error(left)):
             return left
-        index = Eval(node.index, env)
+        index = Eval(node.index, env, interp)
         if (is_error(index)):
             return index
-        return eval_index_expression(left, index)
+        return eval_index_expression(left, index, interp)
     
     elif node_type == ast.HashLiteral:
-        return eval_hash_literal(node, env)
+        return eval_hash_literal(node, env, interp)
 
     return None
 
-def eval_program(program: ast.Program, env: obj.Environment) -> obj.Object:
+def eval_program(program: ast.Program, env: obj.Environment, interp: Interpreter) -> obj.Object:
     result: obj.Object
     for statement in program.statements:
-        result = Eval(statement, env)
+        result = Eval(statement, env, interp)
         # result_type = type(result)
         if result:
             result_type = result.type()
@@ -183,19 +739,19 @@ def eval_program(program: ast.Program, env: obj.Environment) -> obj.Object:
     return result
 
 # TODO: Is this used?
-def eval_statements(stmts: List[ast.Statement], env: obj.Environment) -> obj.Object:
+def eval_statements(stmts: List[ast.Statement], env: obj.Environment, interp: Interpreter) -> obj.Object:
     result = obj.Object()
     for statement in stmts:
-        result = Eval(statement, env)
+        result = Eval(statement, env, interp)
 
         if type(result) == obj.ReturnValue:
             return result.value
     return result
 
-def eval_block_statement(block: ast.BlockStatement, env: obj.Environment) -> obj.Object:
+def eval_block_statement(block: ast.BlockStatement, env: obj.Environment, interp: Interpreter) -> obj.Object:
     result = obj.Object()
     for statement in block.statements:
-        result = Eval(statement, env)
+        result = Eval(statement, env, interp)
         if result:
             result_type = result.type()
             if result_type == obj.ObjectTypeEnum.RETURN_VALUE_OBJ or result_type == obj.ObjectTypeEnum.ERROR_OBJ:
@@ -203,28 +759,38 @@ def eval_block_statement(block: ast.BlockStatement, env: obj.Environment) -> obj
     return result
 
 
-def eval_expressions(exps: List[ast.Expression], env: obj.Environment) -> List[obj.Object]:
+def eval_function_literal(node: ast.FunctionLiteral, env: obj.Environment, interp: Interpreter) -> obj.Function:
+    params = node.parameters
+    body = node.body
+    if interp.metrics is not None:
+        interp.metrics.allocated[obj.ObjectTypeEnum.FUNCTION_OBJ.value] += 1
+    return obj.Function(params, body, env)
+
+def eval_expressions(exps: List[ast.Expression], env: obj.Environment, interp: Interpreter) -> List[obj.Object]:
     result: List[obj.Object()] = []
     for e in exps:
-        evaluated = Eval(e, env)
+        evaluated = Eval(e, env, interp)
         if is_error(evaluated):
-            return [obj.Object(evaluated)]
+            return [evaluated]
         result.append(evaluated)
     return result
 
-def eval_prefix_expression(operator: str, right: obj.Object) -> obj.Object:
+def eval_prefix_expression(operator: str, right: obj.Object, interp: Interpreter = None) -> obj.Object:
     if operator == "!":
         return eval_bang_operator_expression(right)
     elif operator == "-":
-        return eval_minus_prefix_operator_expression(right)
+        return eval_minus_prefix_operator_expression(right, interp)
     else:
         return new_error(f"unknown operator: {operator}{right.type()}")
 
-def eval_infix_expression(operator: str, left: obj.Object, right: obj.Object) -> obj.Object:
+def eval_infix_expression(operator: str, left: obj.Object, right: obj.Object, interp: Interpreter = None) -> obj.Object:
     if left.type() == obj.ObjectTypeEnum.INTEGER_OBJ and right.type() == obj.ObjectTypeEnum.INTEGER_OBJ:
-        return eval_integer_infix_expression(operator, left, right)
+        return eval_integer_infix_expression(operator, left, right, interp)
     elif left.type() == obj.ObjectTypeEnum.STRING_OBJ and right.type() == obj.ObjectTypeEnum.STRING_OBJ:
         return eval_string_infix_expression(operator, left, right)
+    elif operator in ELEMENTWISE_OPERATORS and \
+            (left.type() == obj.ObjectTypeEnum.ARRAY_OBJ or right.type() == obj.ObjectTypeEnum.ARRAY_OBJ):
+        return eval_array_infix_expression(operator, left, right, interp)
     elif operator == "==":
         return native_bool_to_boolean_object(left == right)
     elif operator == "!=":
@@ -234,9 +800,11 @@ def eval_infix_expression(operator: str, left: obj.Object, right: obj.Object) ->
     else:
         return new_error(f"unknown operator: {left.type()} {operator} {right.type()}")
     
-def eval_index_expression(left: obj.Object, index: obj.Object) -> obj.Object:
+def eval_index_expression(left: obj.Object, index: obj.Object, interp: Interpreter) -> obj.Object:
     if left.type() == obj.ObjectTypeEnum.ARRAY_OBJ and index.type() == obj.ObjectTypeEnum.INTEGER_OBJ:
         return eval_array_index_expression(left, index)
+    elif left.type() == obj.ObjectTypeEnum.SEQUENCE_OBJ and index.type() == obj.ObjectTypeEnum.INTEGER_OBJ:
+        return eval_sequence_index_expression(left, index, interp)
     elif left.type() == obj.ObjectTypeEnum.HASH_OBJ:
         return eval_hash_index_expression(left, index)
     else:
@@ -244,25 +812,33 @@ def eval_index_expression(left: obj.Object, index: obj.Object) -> obj.Object:
 
 def eval_array_index_expression(left: obj.Array, index: obj.Integer) -> obj.Object:
     idx = index.value
-    max_idx = len(left.elements) - 1
+    max_idx = sequence_length(left) - 1
     if idx < 0 or idx > max_idx:
         return None # TODO: Should this return NULL?
+    if type(left) == obj.IntArray:
+        return obj.Integer(int(left.values[idx]))
     return left.elements[idx]
 
-def eval_hash_literal(node: ast.HashLiteral, env: obj.Environment) -> obj.Object:
+def eval_sequence_index_expression(left: obj.Sequence, index: obj.Integer, interp: Interpreter) -> obj.Object:
+    idx = index.value
+    if idx < 0 or (left.length is not None and idx >= left.length):
+        return None # TODO: Should this return NULL?
+    return left.nth(idx, interp)
+
+def eval_hash_literal(node: ast.HashLiteral, env: obj.Environment, interp: Interpreter) -> obj.Object:
     pairs: Dict[obj.HashKey, obj.HashPair] = dict()
     for k_node, v_node in node.pairs.items():
-        key = Eval(k_node, env)
+        key = Eval(k_node, env, interp)
         if is_error(key):
             return key
         if not isinstance(key, obj.Hashable):
             return new_error(f"unusable as hash key: {key.type()}")
-        value = Eval(v_node, env)
+        value = Eval(v_node, env, interp)
         if is_error(value):
             return value
         hashed = key.hash_key()
         pairs[hashed] = obj.HashPair(key, value)
-    return obj.Hash(pairs)
+    return interp.allocate(obj.Hash(pairs))
 
 def eval_hash_index_expression(left: obj.Hash, index: obj.Integer) -> obj.Object:
     if not isinstance(index, obj.Hashable): 
@@ -282,15 +858,49 @@ def eval_bang_operator_expression(right: obj.Object) -> obj.Object:
     else:
         return FALSE
 
-def eval_minus_prefix_operator_expression(right: obj.Object) -> obj.Object:
+def eval_minus_prefix_operator_expression(right: obj.Object, interp: Interpreter = None) -> obj.Object:
     if right.type() != obj.ObjectTypeEnum.INTEGER_OBJ:
         return new_error(f"unknown operator: -{right.type()}")
     value = right.value
+    if interp is not None and not INT64_MIN <= value <= INT64_MAX:
+        stop = charge_integer_operation(value.bit_length(), interp)
+        if stop is not None:
+            return stop
     return obj.Integer(-value)
 
-def eval_integer_infix_expression(operator: str, left: obj.Integer, right: obj.Integer) -> obj.Object:
+def integer_result_bits(operator: str, left_val: int, right_val: int) -> int:
+    """ At most how many bits the result of `left_val operator right_val` takes; 0 for comparisons. """
+    if operator == "*":
+        return left_val.bit_length() + right_val.bit_length()
+    elif operator == "+" or operator == "-":
+        return max(left_val.bit_length(), right_val.bit_length()) + 1
+    elif operator == "/":
+        return left_val.bit_length()
+    return 0
+
+def charge_integer_operation(bits: int, interp: Interpreter) -> obj.Error | None:
+    """
+    Python integers grow without bound and the time arithmetic takes grows
+    with them, so an operation whose result may be wider than a word is
+    charged before it runs, its bytes and its steps; returns the Error to
+    stop with.
+    """
+    if bits <= WORD_BITS:
+        return None
+    stop = interp.charge((bits + 7) // 8)
+    if stop is not None:
+        return stop
+    return interp.spend(bits // WORD_BITS)
+
+def eval_integer_infix_expression(operator: str, left: obj.Integer, right: obj.Integer,
+                                  interp: Interpreter = None) -> obj.Object:
     left_val = left.value
     right_val = right.value
+    # Results of word-sized operands are cheap to compute whatever they are
+    if interp is not None and not (INT64_MIN <= left_val <= INT64_MAX and INT64_MIN <= right_val <= INT64_MAX):
+        stop = charge_integer_operation(integer_result_bits(operator, left_val, right_val), interp)
+        if stop is not None:
+            return stop
     if operator == "+":
         return obj.Integer(left_val + right_val)
     elif operator == "-":
@@ -310,6 +920,69 @@ def eval_integer_infix_expression(operator: str, left: obj.Integer, right: obj.I
     else:
         return new_error(f"unknown operator: {left.type()} {operator} {right.type()}")
 
+def eval_array_infix_expression(operator: str, left: obj.Object, right: obj.Object,
+                                interp: Interpreter = None) -> obj.Object:
+    left_is_array = left.type() == obj.ObjectTypeEnum.ARRAY_OBJ
+    right_is_array = right.type() == obj.ObjectTypeEnum.ARRAY_OBJ
+    if left_is_array and right_is_array and sequence_length(left) != sequence_length(right):
+        return new_error(f"array length mismatch: {sequence_length(left)} {operator} {sequence_length(right)}")
+    vectorized = eval_typed_array_infix_expression(operator, left, right)
+    if vectorized is not None:
+        return vectorized
+    if left_is_array and right_is_array:
+        pairs = zip(left.elements, right.elements)
+    elif left_is_array:
+        pairs = ((e, right) for e in left.elements)
+    else:
+        pairs = ((left, e) for e in right.elements)
+    result: List[obj.Object] = []
+    for l, r in pairs:
+        evaluated = eval_infix_expression(operator, l, r, interp)
+        if is_error(evaluated):
+            return evaluated
+        result.append(evaluated)
+    return new_array(result)
+
+# "/" is left to the element-by-element path so typed and untyped arrays
+# divide exactly like two Integer objects do.
+TYPED_ARRAY_OPERATORS = {
+    "+": lambda l, r: l + r,
+    "-": lambda l, r: l - r,
+    "*": lambda l, r: l * r,
+}
+
+def eval_typed_array_infix_expression(operator: str, left: obj.Object, right: obj.Object) -> obj.Object | None:
+    if operator not in TYPED_ARRAY_OPERATORS:
+        return None
+    if type(left) != obj.IntArray and type(right) != obj.IntArray:
+        return None
+    operands = []
+    magnitudes = []
+    for o in (left, right):
+        if type(o) == obj.IntArray:
+            operands.append(o.values)
+            magnitudes.append(int64_magnitude(o.values))
+        elif type(o) == obj.Integer and INT64_MIN <= o.value <= INT64_MAX:
+            operands.append(o.value)
+            magnitudes.append(abs(o.value))
+        else:
+            return None
+    # int64 arithmetic wraps around; when a result might not fit, the
+    # element-by-element path computes it with Python ints instead
+    if operator == "*":
+        bound = magnitudes[0] * magnitudes[1]
+    else:
+        bound = magnitudes[0] + magnitudes[1]
+    if bound > INT64_MAX:
+        return None
+    return obj.IntArray(TYPED_ARRAY_OPERATORS[operator](*operands))
+
+def int64_magnitude(values: any) -> int:
+    """ The largest absolute value in an int64 vector, as a Python int. """
+    if len(values) == 0:
+        return 0
+    return max(int(values.max()), -int(values.min()))
+
 def eval_string_infix_expression(operator: str, left: obj.String, right: obj.String) -> obj.Object:
     if operator != "+":
         return new_error(f"unknown operator: {left.type()} {operator} {right.type()}")
@@ -317,40 +990,100 @@ def eval_string_infix_expression(operator: str, left: obj.String, right: obj.Str
     right_val = right.value
     return obj.String(left_val + right_val)
 
-def eval_if_expression(ie: ast.IfExpression, env: obj.Environment) -> obj.Object:
-    condition = Eval(ie.condition, env)
+def eval_if_expression(ie: ast.IfExpression, env: obj.Environment, interp: Interpreter) -> obj.Object:
+    condition = Eval(ie.condition, env, interp)
     if (is_error(condition)):
             return condition
     if is_truthy(condition):
-        return Eval(ie.consequence, env)
+        return Eval(ie.consequence, env, interp)
     elif ie.alternative is not None:
-        return Eval(ie.alternative, env)
+        return Eval(ie.alternative, env, interp)
     else:
         return None
 
-def eval_identifier(node: ast.Identifier, env: obj.Environment) -> obj.Object:
+# Loops run in the enclosing environment and never recurse, so an
+# iteration costs one block evaluation and no Environment allocation.
+def eval_while_statement(ws: ast.WhileStatement, env: obj.Environment, interp: Interpreter) -> obj.Object:
+    while True:
+        condition = Eval(ws.condition, env, interp)
+        if (is_error(condition)):
+            return condition
+        if not is_truthy(condition):
+            return None
+        interp.countdown -= 1
+        if interp.countdown <= 0:
+            stop = interp.step()
+            if stop is not None:
+                return stop
+        result = eval_block_statement(ws.body, env, interp)
+        if type(result) == obj.ReturnValue or type(result) == obj.Error:
+            return result
+
+def eval_for_statement(fs: ast.ForStatement, env: obj.Environment, interp: Interpreter) -> obj.Object:
+    iterable = Eval(fs.iterable, env, interp)
+    if (is_error(iterable)):
+        return iterable
+    if not is_iterable(iterable):
+        return new_error(f"for loop over non-iterable: {iterable.type()}")
+    name = fs.variable.value
+    for e in iter_elements(iterable, interp):
+        if is_error(e):
+            return e
+        interp.countdown -= 1
+        if interp.countdown <= 0:
+            stop = interp.step()
+            if stop is not None:
+                return stop
+        env.set(name, e)
+        result = eval_block_statement(fs.body, env, interp)
+        if type(result) == obj.ReturnValue or type(result) == obj.Error:
+            return result
+    return None
+
+def eval_identifier(node: ast.Identifier, env: obj.Environment, interp: Interpreter) -> obj.Object:
     try:
         val = env.get(node.value)
         return val
     except: pass
     try:
-        builtin = BUILTINS[node.value]
+        builtin = interp.builtins[node.value]
         return builtin
     except: pass
     return new_error(f"identifier not found: {node.value}")
 
-def apply_function(fn: obj.Object, args: List[obj.Object]) -> obj.Object:
+def apply_function(fn: obj.Object, args: List[obj.Object], interp: Interpreter) -> obj.Object:
     fn_type = type(fn)
     if fn_type == obj.Function:
+        interp.countdown -= 1
+        if interp.countdown <= 0:
+            stop = interp.step()
+            if stop is not None:
+                return stop
+        if interp.metrics is not None:
+            interp.metrics.call(fn)
         extended_env = extend_function_env(fn, args)
-        evaluated = Eval(fn.body, extended_env)
+        evaluated = Eval(fn.body, extended_env, interp)
         return unwrap_return_value(evaluated)
     elif fn_type == obj.Builtin:
-        return fn.fn(*args)
+        return fn.fn(interp, *args)
+    elif fn_type == obj.MemoizedFunction:
+        return apply_memoized_function(fn, args, interp)
     else:
         return new_error(f"not a function: {fn.type()}")
         # raise Exception(f"not a function: {fn.type()}")
     
+def apply_memoized_function(fn: obj.MemoizedFunction, args: List[obj.Object], interp: Interpreter) -> obj.Object:
+    if not all(isinstance(a, obj.Hashable) for a in args):
+        return apply_function(fn.fn, args, interp)
+    key = tuple(a.hash_key() for a in args)
+    cached = fn.lookup(key)
+    if cached is not None:
+        return cached
+    result = apply_function(fn.fn, args, interp)
+    if result is not None and not is_error(result):
+        fn.store(key, result)
+    return result
+
 def extend_function_env(fn: obj.Object, args: List[obj.Object]) -> obj.Environment:
     env = obj.new_enclosed_environment(fn.env)
     for param_idx, param in enumerate(fn.parameters):
@@ -362,6 +1095,55 @@ def unwrap_return_value(m_obj: obj.Object) -> obj.Object:
         return m_obj.value
     return m_obj
 
+def is_iterable(m_obj: obj.Object) -> bool:
+    return isinstance(m_obj, (obj.Array, obj.Sequence))
+
+def iter_elements(m_obj: obj.Object, interp: Interpreter) -> Iterator[obj.Object]:
+    if type(m_obj) == obj.Sequence:
+        return m_obj.iter(interp)
+    return iter(m_obj.elements)
+
+def materialize_all(m_obj: obj.Object, interp: Interpreter) -> obj.Error | None:
+    """
+    Materializes every Sequence in `m_obj`, looking into arrays and hashes,
+    under `interp`'s limits, so that serializing it afterwards (`inspect`,
+    `to_json`) neither runs unchecked nor on the interpreter that created
+    the sequences. Returns the Error a sequence stopped with, if any.
+    """
+    m_type = type(m_obj)
+    if m_type == obj.Sequence:
+        els = m_obj.materialize(interp)
+        if len(els) > 0 and is_error(els[-1]):
+            return els[-1]
+        items = els
+    elif m_type == obj.Array:
+        items = m_obj.elements
+    elif m_type == obj.Hash:
+        items = [p.value for p in m_obj.pairs.values()]
+    else:
+        return None
+    for e in items:
+        stop = materialize_all(e, interp)
+        if stop is not None:
+            return stop
+    return None
+
+def sequence_length(m_obj: obj.Object) -> int | None:
+    if type(m_obj) == obj.Sequence:
+        return m_obj.length
+    if type(m_obj) == obj.IntArray:
+        return len(m_obj.values)
+    return len(m_obj.elements)
+
+def new_array(elements: List[obj.Object]) -> obj.Array:
+    if obj.TYPED_ARRAYS and len(elements) >= TYPED_ARRAY_MIN_LENGTH and \
+            all(type(e) == obj.Integer for e in elements):
+        try:
+            return obj.IntArray.from_elements(elements)
+        except OverflowError:
+            pass
+    return obj.Array(elements)
+
 def native_bool_to_boolean_object(input: bool) -> obj.Boolean:
     if input:
         return TRUE
@@ -1,37 +1,372 @@
+import asyncio
+import hashlib
 import json
-import sys
-
-from io import StringIO
-
-from yada.yada_python.yada_ast import Program
-from yada.yada_python.yada_lexer import Lexer
-from yada.yada_python.yada_parser import Parser
-from yada.yada_python.yada_token import TokenEnum
-from yada.yada_python.yada_object import new_environment
-from yada.yada_python.yada_evaluator import Eval
-
-def Yada(input: str):
-    l = Lexer(input)
-    p = Parser(l)
-    program: Program = p.parse_program()
-    if len(p.errors) != 0:
+import os
+import queue
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List
+
+from yada.yada_python.yada_ast import Program, iter_json
+from yada.yada_python.yada_cache import default_cache, ResultCache
+from yada.yada_python.yada_purity import is_deterministic_program
+from yada.yada_python.yada_evaluator import Interpreter, RunResult, Metrics, materialize_all
+from yada.yada_python.yada_object import Builtin, Environment, Error, new_forked_environment
+from yada.yada_python.yada_output import QueueOutput, OutputClosed, END_OF_OUTPUT
+
+# Upper bound on the results all `memo` functions of one run may keep
+MEMO_MAX_ENTRIES = 100000
+# Output past OUTPUT_SPILL_BYTES goes to a temporary file, and a program
+# stops with an error once it tries to write more than MAX_OUTPUT_BYTES
+OUTPUT_SPILL_BYTES = 1024 * 1024
+MAX_OUTPUT_BYTES = 64 * 1024 * 1024
+
+# Sections of a result, in the order they are serialized
+FIELDS = ("program", "evaluated", "environment", "output", "errors", "memory")
+# Sections only returned when asked for
+OPTIONAL_FIELDS = ("metrics",)
+# YadaJSON() sends the result in pieces of about this many characters
+JSON_CHUNK_SIZE = 64 * 1024
+# YadaPool.map() hands each worker about this many chunks of a batch
+# (a few, so a slow chunk does not leave the other workers idle at the
+# end), but never more than BATCH_MAX_CHUNK sources at once
+BATCH_CHUNKS_PER_WORKER = 4
+BATCH_MAX_CHUNK = 256
+
+def Yada(input: str, memo_max_entries: int | None = MEMO_MAX_ENTRIES, interpreter: Interpreter = None,
+         fields: Iterable[str] = None, result_cache: ResultCache = None, env: Environment = None,
+         prelude: any = None, cancel: threading.Event = None):
+    """
+    Runs `input` and returns its AST, value, global environment, output,
+    parse errors and the bytes it allocated. Sources seen before are not parsed again (see
+    yada_cache.default_cache). Pass an `interpreter` to reuse one configured
+    Interpreter (e.g. one per server thread); `memo_max_entries` is then
+    ignored.
+    `fields` picks which of FIELDS to return; the others are never computed.
+    Asking for "metrics" as well adds the timings and counters of the run
+    (see yada_evaluator.Metrics), which are not collected otherwise.
+
+    With a `result_cache`, a deterministic program run again with the same
+    configuration returns its earlier result without being evaluated, so
+    interpreter hooks do not see it.
+
+    Passing `env` runs the program in that environment (e.g. a session's)
+    instead of a new one; such results are never cached. With a `prelude`
+    (see Prelude) the program runs in a fresh fork of it instead.
+
+    Setting `cancel` from another thread stops the program, which then
+    evaluates to an Error (see Interpreter).
+    """
+    fields = check_fields(fields)
+    if interpreter is None:
+        interpreter = new_interpreter(memo_max_entries)
+    metrics = Metrics() if "metrics" in fields else None
+    if env is not None or metrics is not None:
+        result_cache = None
+    if result_cache is not None:
+        config = interpreter.config_key()
+        if prelude is not None:
+            config += (prelude.digest,)
+        key = result_cache.key(input, config, fields)
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+    if env is None and prelude is not None:
+        env = prelude.fork()
+    result = interpreter.run(input, env, cancel=cancel, metrics=metrics)
+    if len(result.errors) != 0:
         # TODO: Something
         pass
-    # Print program ast style
-    # print(program.string())
-    
-    temp_out = StringIO() # Create the in-memory "file"
-    sys.stdout = temp_out # Replace default stdout (terminal) with our stream
-    env = new_environment()
-    evaluated = Eval(program, env)
-    sys.stdout = sys.__stdout__ # Restore the original
-    return {
-        "program": program.to_json(),
-        "evaluated": evaluated.inspect() if evaluated else evaluated,
-        "environment": env.to_json(),
-        "output": temp_out.getvalue(),
-        "errors": p.errors,
-    }
+    try:
+        value = _result_to_json(result, fields)
+    finally:
+        result.out.close()
+    # A run cut short by the clock or a cancel might finish the next time
+    if result_cache is not None and not interpreter.timed_out and not interpreter.cancelled and \
+            is_deterministic_program(result.program, interpreter.builtins) and \
+            (prelude is None or prelude.is_deterministic(interpreter.builtins)):
+        result_cache.put(key, value)
+    return value
+
+async def yada_eval(input: str, memo_max_entries: int | None = MEMO_MAX_ENTRIES, interpreter: Interpreter = None,
+                    fields: Iterable[str] = None, prelude: any = None, executor: Executor = None) -> dict:
+    """
+    Like Yada(), but for coroutines: the program runs on `executor` (the
+    event loop's default one if None) while the loop goes on serving others.
+    Cancelling the awaiting task stops the program at its next step check,
+    so the thread is free again shortly after instead of running it to the
+    end. `executor` must run callables on threads of this process.
+    """
+    cancel = threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, lambda: Yada(input, memo_max_entries, interpreter, fields,
+                                                         prelude=prelude, cancel=cancel))
+    try:
+        return await future
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+def YadaJSON(input: str, memo_max_entries: int | None = MEMO_MAX_ENTRIES, interpreter: Interpreter = None,
+             fields: Iterable[str] = None) -> Iterator[str]:
+    """
+    Like Yada(), but yields the result as JSON text in pieces. The AST is
+    written straight from the nodes (see yada_ast.iter_json) instead of going
+    through one big nested dict.
+    """
+    fields = check_fields(fields)
+    if interpreter is None:
+        interpreter = new_interpreter(memo_max_entries)
+    result = interpreter.run(input)
+    try:
+        yield from _coalesce(_iter_result_json(result, fields))
+    finally:
+        result.out.close()
+
+def check_fields(fields: Iterable[str] | None) -> tuple:
+    if fields is None:
+        return FIELDS
+    fields = tuple(fields)
+    for f in fields:
+        if f not in FIELDS and f not in OPTIONAL_FIELDS:
+            raise ValueError(f"unknown result field: {f}")
+    return fields
+
+def new_interpreter(memo_max_entries: int | None = MEMO_MAX_ENTRIES, max_steps: int | None = None,
+                    timeout: float | None = None, max_allocated_bytes: int | None = None) -> Interpreter:
+    return Interpreter(
+        memo_max_entries=memo_max_entries,
+        output_spill_bytes=OUTPUT_SPILL_BYTES,
+        max_output_bytes=MAX_OUTPUT_BYTES,
+        program_cache=default_cache(),
+        max_steps=max_steps,
+        timeout=timeout,
+        max_allocated_bytes=max_allocated_bytes,
+    )
+
+class Prelude():
+    """
+    Definitions evaluated once and then frozen, for many programs to start
+    from instead of each evaluating them again. `fork` gives every program its
+    own empty global environment on top of the prelude's; it takes the same
+    time however big the prelude is, and since nothing writes to a frozen
+    environment any number of threads can run forks of one Prelude at once.
+
+    Memoized functions defined in the prelude keep the results the prelude
+    itself computed, but programs cannot add to them. Functions and lazy
+    sequences it defines run on the interpreter of the program using them,
+    with that program's limits and output.
+    """
+    source: str
+    digest: str
+    program: Program
+    env: Environment
+    memo_max_entries: int | None
+
+    def __init__(self, source: str, interpreter: Interpreter = None):
+        if interpreter is None:
+            interpreter = new_interpreter()
+        result = interpreter.run(source)
+        result.out.close()
+        if len(result.errors) != 0:
+            raise ValueError(f"prelude has {len(result.errors)} parse errors, the first: {result.errors[0]}")
+        if type(result.evaluated) == Error:
+            raise ValueError(f"prelude failed: {result.evaluated.message}")
+        self.source = source
+        self.digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+        self.program = result.program
+        self.env = result.env
+        self.env.freeze()
+        self.memo_max_entries = interpreter.memo_max_entries
+        self._deterministic = dict()
+
+    def fork(self) -> Environment:
+        return new_forked_environment(self.env, self.memo_max_entries)
+
+    def is_deterministic(self, builtins: Dict[str, Builtin]) -> bool:
+        """
+        Whether the prelude never names a nondeterministic builtin, so calls
+        into it cannot make a program's result vary (see Yada's result_cache).
+        """
+        key = frozenset(name for name, b in builtins.items() if not b.deterministic)
+        deterministic = self._deterministic.get(key)
+        if deterministic is None:
+            deterministic = self._deterministic[key] = is_deterministic_program(self.program, builtins)
+        return deterministic
+
+def YadaStream(input: str, memo_max_entries: int | None = MEMO_MAX_ENTRIES, interpreter: Interpreter = None,
+               fields: Iterable[str] = None, cancel: threading.Event = None) -> Iterator[dict]:
+    """
+    Like Yada(), but yields `{"output": ...}` chunks while the program runs
+    and finishes with `{"result": ...}`, which holds the requested `fields`
+    except the output. The program runs on its own thread. Closing the
+    generator early, or setting `cancel`, stops the program at its next
+    step check or `puts`.
+    """
+    fields = tuple(f for f in check_fields(fields) if f != "output")
+    if interpreter is None:
+        interpreter = new_interpreter(memo_max_entries)
+    if cancel is None:
+        cancel = threading.Event()
+    out = QueueOutput()
+    outcome = []
+    def run():
+        try:
+            outcome.append(interpreter.run(input, out=out, cancel=cancel))
+        except OutputClosed:
+            pass
+        except BaseException as e:
+            outcome.append(e)
+        finally:
+            out.finish()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        done = False
+        while not done:
+            # Send everything that piled up since the last chunk in one go
+            chunks = [out.queue.get()]
+            try:
+                while chunks[-1] is not END_OF_OUTPUT:
+                    chunks.append(out.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if chunks[-1] is END_OF_OUTPUT:
+                done = True
+                chunks.pop()
+            if chunks:
+                yield {"output": "".join(chunks)}
+        thread.join()
+        if isinstance(outcome[0], BaseException):
+            raise outcome[0]
+        yield {"result": _result_to_json(outcome[0], fields)}
+    finally:
+        if thread.is_alive():
+            # Closed early, and the program might never write again
+            cancel.set()
+        out.close()
+
+class YadaPool():
+    """
+    Worker processes for evaluating many independent programs. Each worker
+    imports the interpreter and builds its Interpreter once, when it starts,
+    and keeps them for every program it runs, so a pool is best kept around
+    for as many batches as possible. Use it as a context manager, or call
+    `close()`.
+    """
+    workers: int
+    fields: tuple
+    executor: ProcessPoolExecutor
+
+    def __init__(self, workers: int = None, memo_max_entries: int | None = MEMO_MAX_ENTRIES,
+                 fields: Iterable[str] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.fields = check_fields(fields)
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(memo_max_entries, self.fields),
+        )
+
+    def map(self, sources: Iterable[str], chunksize: int = None) -> List[dict]:
+        """ Runs every source like Yada() and returns the results in order. """
+        sources = list(sources)
+        if chunksize is None:
+            chunksize = -(-len(sources) // (self.workers * BATCH_CHUNKS_PER_WORKER))
+            chunksize = max(1, min(chunksize, BATCH_MAX_CHUNK))
+        return list(self.executor.map(_run_in_worker, sources, chunksize=chunksize))
+
+    def close(self) -> None:
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def YadaBatch(sources: Iterable[str], workers: int = None, chunksize: int = None,
+              memo_max_entries: int | None = MEMO_MAX_ENTRIES, fields: Iterable[str] = None) -> List[dict]:
+    """ Runs every source in a fresh YadaPool and returns the results in order. """
+    with YadaPool(workers, memo_max_entries, fields) as pool:
+        return pool.map(sources, chunksize)
+
+# Set in each YadaPool worker process by _init_worker
+_worker_interpreter: Interpreter | None = None
+_worker_fields: tuple = FIELDS
+
+def _init_worker(memo_max_entries: int | None, fields: tuple) -> None:
+    global _worker_interpreter, _worker_fields
+    _worker_interpreter = new_interpreter(memo_max_entries)
+    _worker_fields = fields
+
+def _run_in_worker(source: str) -> dict:
+    return Yada(source, interpreter=_worker_interpreter, fields=_worker_fields)
+
+def _field_to_json(result: RunResult, field: str):
+    if field == "program":
+        return result.program.to_json()
+    elif field == "evaluated":
+        evaluated = result.evaluated
+        return evaluated.inspect() if evaluated else evaluated
+    elif field == "environment":
+        return result.env.to_json()
+    elif field == "output":
+        return result.out.getvalue()
+    elif field == "errors":
+        return result.errors
+    elif field == "memory":
+        return {"allocated_bytes": result.allocated_bytes, "quota_bytes": result.max_allocated_bytes}
+    elif field == "metrics":
+        return result.metrics.to_json() if result.metrics is not None else None
+
+def _materialize(result: RunResult, fields: tuple) -> None:
+    """
+    Computes the lazy sequences the `fields` will serialize, still under the
+    run's limits and memory quota, before any field is serialized.
+    """
+    if result.interp is None:
+        return
+    if "evaluated" in fields:
+        stop = materialize_all(result.evaluated, result.interp)
+        if stop is not None:
+            result.evaluated = stop
+    if "environment" in fields:
+        for val in result.env.store.values():
+            # A sequence that stops keeps the Error as its last element
+            materialize_all(val, result.interp)
+    result.allocated_bytes = result.interp.allocated_bytes
+
+def _result_to_json(result: RunResult, fields: tuple = FIELDS) -> dict:
+    if result.metrics is None:
+        _materialize(result, fields)
+        return {f: _field_to_json(result, f) for f in fields}
+    with result.metrics.phase("serialize"):
+        _materialize(result, fields)
+        value = {f: _field_to_json(result, f) for f in fields if f != "metrics"}
+    return {f: value[f] if f != "metrics" else result.metrics.to_json() for f in fields}
+
+def _iter_result_json(result: RunResult, fields: tuple) -> Iterator[str]:
+    _materialize(result, fields)
+    yield "{"
+    for i, f in enumerate(fields):
+        yield f'{", " if i > 0 else ""}"{f}": '
+        if f == "program":
+            yield from iter_json(result.program)
+        else:
+            yield json.dumps(_field_to_json(result, f))
+    yield "}"
+
+def _coalesce(pieces: Iterator[str]) -> Iterator[str]:
+    buffer, size = [], 0
+    for p in pieces:
+        buffer.append(p)
+        size += len(p)
+        if size >= JSON_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
 
 
 if __name__ == "__main__":
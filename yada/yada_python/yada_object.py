@@ -1,8 +1,18 @@
 from abc import ABC
-from typing import Callable, Dict, List
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterator, List
 import yada.yada_python.yada_ast as ast
 from enum import Enum
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Integer-only arrays are stored as NumPy int64 vectors when NumPy is installed
+TYPED_ARRAYS = np is not None
+
 class ObjectTypeEnum(Enum):
     INTEGER_OBJ = "INTEGER"
     BOOLEAN_OBJ = "BOOLEAN"
@@ -14,6 +24,8 @@ class ObjectTypeEnum(Enum):
     BUILTIN_OBJ = "BUILTIN"
     ARRAY_OBJ = "ARRAY"
     HASH_OBJ = "HASH"
+    SEQUENCE_OBJ = "SEQUENCE"
+    MEMOIZED_FUNCTION_OBJ = "MEMOIZED_FUNCTION"
 
 
 class HashKey(object):
@@ -151,13 +163,43 @@ class Error(Object):
         return f"ERROR: {self.message}"
     
 
+class MemoBudget():
+    """
+    Caps the number of results all memoized functions of one evaluation may
+    hold at once. `remaining` is None when there is no cap.
+    """
+    remaining: int | None
+
+    def __init__(self, max_entries: int | None):
+        self.remaining = max_entries
+
+    def acquire(self) -> bool:
+        if self.remaining is None:
+            return True
+        if self.remaining <= 0:
+            return False
+        self.remaining -= 1
+        return True
+
+    def release(self) -> None:
+        if self.remaining is not None:
+            self.remaining += 1
+
 class Environment():
+    """
+    A frozen environment is never written to again (see `freeze`), which is
+    what lets many evaluations share it as their outer environment.
+    """
     store: dict[str, Object]
     outer: any # : Environment
+    memo_budget: MemoBudget
+    frozen: bool
 
-    def __init__(self, store: dict[str, Object], outer: any):
+    def __init__(self, store: dict[str, Object], outer: any, memo_budget: MemoBudget = None):
         self.store = store
         self.outer = outer
+        self.memo_budget = memo_budget
+        self.frozen = False
     
     def get(self, name: str) -> Object:
         if name in self.store:
@@ -170,9 +212,32 @@ class Environment():
             raise "TODO"
 
     def set(self, name: str, val: Object) -> Object:
+        if self.frozen:
+            raise RuntimeError(f"cannot bind {name} in a frozen environment")
         self.store[name] = val
         return val
     
+    def root(self): # -> Environment
+        # The global environment of an evaluation, which ends where a frozen
+        # environment it was forked from begins
+        env = self
+        while env.outer and not env.outer.frozen:
+            env = env.outer
+        return env
+
+    def freeze(self) -> None:
+        """
+        Makes this environment and its outer ones read-only, along with the
+        result caches of the memoized functions bound in them.
+        """
+        env = self
+        while env:
+            env.frozen = True
+            for val in env.store.values():
+                if type(val) == MemoizedFunction:
+                    val.frozen = True
+            env = env.outer
+
     def to_json(self) -> dict:
         result = dict()
         for k, v in self.store.items():
@@ -184,15 +249,29 @@ def new_enclosed_environment(outer: Environment) -> Environment:
     env.outer = outer
     return env
 
-def new_environment() -> Environment:
+def new_forked_environment(base: Environment, memo_max_entries: int | None = None) -> Environment:
+    """
+    A new global environment on top of the frozen `base`: the base's
+    bindings are visible, new ones go into the fork only. It takes the same
+    time however large the base is.
+    """
+    if not base.frozen:
+        raise ValueError("can only fork a frozen environment")
+    return Environment(dict(), base, MemoBudget(memo_max_entries))
+
+def new_environment(memo_max_entries: int | None = None) -> Environment:
     store = dict()
     outer_env = None
-    return Environment(store, outer_env)
+    return Environment(store, outer_env, MemoBudget(memo_max_entries))
 
 
 
 
 class Function(Object):
+    """
+    Whether a function is pure depends on what its free variables are bound
+    to at the time, so it is not stored here; see yada_purity.is_pure_value.
+    """
     parameters: List[ast.Identifier]
     body: ast.BlockStatement
     env: Environment
@@ -213,11 +292,89 @@ class Function(Object):
         # TODO: This
         return "FUNCTION"
 
+class MemoizedFunction(Object):
+    """
+    Wraps a Function with a least-recently-used cache of its results, keyed
+    by the hash keys of the arguments. Every cached entry also counts against
+    the `budget` shared by all memoized functions of the evaluation.
+    """
+    fn: Function
+    maxsize: int
+    budget: MemoBudget
+    cache: OrderedDict
+    hits: int
+    misses: int
+
+    def __init__(self, fn: Function, maxsize: int, budget: MemoBudget):
+        self.fn = fn
+        self.maxsize = maxsize
+        self.budget = budget
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.frozen = False
+
+    def type(self) -> str:
+        return ObjectTypeEnum.MEMOIZED_FUNCTION_OBJ
+
+    def lookup(self, key: tuple) -> Object | None:
+        if self.frozen:
+            # Shared between threads: only plain reads
+            val = self.cache.get(key)
+            if val is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return val
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+        return None
+
+    def store(self, key: tuple, val: Object) -> None:
+        if self.frozen:
+            return
+        if len(self.cache) >= self.maxsize:
+            self.cache.popitem(last=False)
+            self.budget.release()
+        if not self.budget.acquire():
+            # The evaluation-wide cap is reached: recycle our own oldest entry
+            if len(self.cache) == 0:
+                return
+            self.cache.popitem(last=False)
+        self.cache[key] = val
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.cache),
+            "maxsize": self.maxsize,
+        }
+
+    def inspect(self) -> str:
+        return f"memo({self.fn.inspect()}, {self.maxsize})"
+
+    def to_json(self):
+        return {"memo": self.stats()}
+
 class Builtin(Object):
+    """
+    pure: has no side effects, so calls to it can be memoized
+    deterministic: returns (and writes) the same thing for the same arguments
+        every time; a builtin that reads the clock, a random source or the
+        outside world must set this to False so whole results are not cached
+    """
     fn: Callable[..., Object]
+    pure: bool
+    deterministic: bool
 
-    def __init__(self, fn: Callable[..., Object]):
+    def __init__(self, fn: Callable[..., Object], pure: bool = True, deterministic: bool = True):
         self.fn = fn
+        self.pure = pure
+        self.deterministic = deterministic
 
     def type(self) -> str:
         return ObjectTypeEnum.BUILTIN_OBJ
@@ -235,12 +392,114 @@ class Array(Object):
         return ObjectTypeEnum.ARRAY_OBJ
 
     def inspect(self) -> str:
-        els = [e.string() for e in self.elements]
+        els = [e.inspect() for e in self.elements]
         return f"[{', '.join(els)}]"
     
     def to_json(self):
         return [e.to_json() for e in self.elements]
+
+class IntArray(Array):
+    """
+    An Array whose elements are all integers, stored as a NumPy int64 vector.
+    It behaves like any other Array: `elements` builds (and keeps) the list of
+    Integer objects the first time something needs it, while the evaluator
+    works on `values` directly for indexing, arithmetic and reductions,
+    except where a result might not fit in an int64, which is computed
+    with Python ints like for any other Array.
+    """
+    values: any # : np.ndarray
+
+    def __init__(self, values: any):
+        self.values = values
+        self._elements = None
+
+    @classmethod
+    def from_elements(cls, els: List[Integer]):
+        # Raises OverflowError when a value does not fit in an int64
+        return cls(np.fromiter((e.value for e in els), dtype=np.int64, count=len(els)))
+
+    @property
+    def elements(self) -> List[Object]:
+        if self._elements is None:
+            self._elements = [Integer(v) for v in self.values.tolist()]
+        return self._elements
+
+    def inspect(self) -> str:
+        return f"[{', '.join(str(v) for v in self.values.tolist())}]"
+
+    def to_json(self):
+        return self.values.tolist()
     
+class Sequence(Object):
+    """
+    A lazy, read-only list of objects. Elements are produced on demand by
+    `factory`, which returns a fresh iterator every time it is called, so a
+    sequence can be walked many times without ever holding all of its
+    elements. The elements are only kept around once something asks for all
+    of them (see `materialize`).
+
+    `factory` is passed the Interpreter of the run walking the sequence,
+    whose limits and output then apply, which need not be the one that
+    created it (e.g. for a sequence defined in a prelude). `interp`, the
+    creator, is only used when the caller has none to give, as in `inspect`.
+    """
+    factory: Callable[[any], Iterator[Object]]
+    length: int | None
+    interp: any # : Interpreter
+
+    def __init__(self, factory: Callable[[any], Iterator[Object]], length: int | None = None, interp: any = None):
+        self.factory = factory
+        self.length = length
+        self.interp = interp
+        self._elements = None
+
+    def type(self) -> str:
+        return ObjectTypeEnum.SEQUENCE_OBJ
+
+    @property
+    def materialized(self) -> bool:
+        return self._elements is not None
+
+    def iter(self, interp: any = None) -> Iterator[Object]:
+        if self._elements is not None:
+            return iter(self._elements)
+        return self.factory(interp if interp is not None else self.interp)
+
+    def nth(self, idx: int, interp: any = None) -> Object | None:
+        if self._elements is not None:
+            return self._elements[idx] if idx < len(self._elements) else None
+        for i, e in enumerate(self.iter(interp)):
+            # An error on the way (e.g. out of steps) is the answer too
+            if i == idx or e.type() == ObjectTypeEnum.ERROR_OBJ:
+                return e
+        return None
+
+    def materialize(self, interp: any = None) -> List[Object]:
+        # Stops at the first error so the caller can report it
+        if self._elements is None:
+            interp = interp if interp is not None else self.interp
+            els = []
+            for e in self.iter(interp):
+                els.append(e)
+                if e.type() == ObjectTypeEnum.ERROR_OBJ:
+                    break
+                # Each element is now kept alive, and counts against the
+                # memory quota of the run that made it so
+                stop = interp.charge(MATERIALIZED_ELEMENT_BYTES) if interp is not None else None
+                if stop is not None:
+                    els.append(stop)
+                    break
+            self._elements = els
+            self.length = len(els)
+        return self._elements
+
+    def inspect(self) -> str:
+        els = [e.inspect() for e in self.materialize()]
+        return f"[{', '.join(els)}]"
+
+    def to_json(self):
+        return [e.to_json() for e in self.materialize()]
+
 class HashPair():
     key: Object
     value: Object
@@ -259,12 +518,38 @@ class Hash():
         return ObjectTypeEnum.HASH_OBJ
 
     def inspect(self) -> str:
-        prs = [f"{p.key.inspect}: {p.value.inspect()}" for p in self.pairs]
+        prs = [f"{p.key.inspect()}: {p.value.inspect()}" for p in self.pairs.values()]
         return f"{{{', '.join(prs)}}}"
     
     def to_json(self):
-        # TODO: This will have to be addressed
-        result = dict()
-        for k, hp in self.pairs.items():
-            result[k] = hp.value.to_json()
-        return result
+        # JSON objects only have string keys, so 1 and "1" end up the same
+        return {hp.key.inspect(): hp.value.to_json() for hp in self.pairs.values()}
+
+def new_materialized_sequence(elements: List[Object]) -> Sequence:
+    """ A sequence whose elements are already known, e.g. a decoded one. """
+    seq = Sequence(lambda interp: iter(elements), len(elements))
+    seq._elements = elements
+    return seq
+
+# Rough CPython sizes, enough to account for what a program allocates
+OBJECT_BYTES = 56
+BINDING_BYTES = 104
+SLOT_BYTES = 8
+# A kept element of a materialized Sequence: its slot and the object itself
+MATERIALIZED_ELEMENT_BYTES = SLOT_BYTES + OBJECT_BYTES
+
+def allocation_size(val: Object) -> int:
+    """
+    Approximate bytes taken by `val` itself. The objects it refers to are not
+    counted: they were accounted for when they were created.
+    """
+    val_type = type(val)
+    if val_type == String:
+        return OBJECT_BYTES + len(val.value)
+    elif val_type == IntArray:
+        return OBJECT_BYTES * 2 + val.values.nbytes
+    elif val_type == Array:
+        return OBJECT_BYTES + SLOT_BYTES * len(val.elements)
+    elif val_type == Hash:
+        return OBJECT_BYTES + BINDING_BYTES * len(val.pairs)
+    return OBJECT_BYTES
@@ -0,0 +1,127 @@
+import mmap
+import queue
+import sys
+import tempfile
+from typing import BinaryIO, List, TextIO
+
+class OutputLimitExceeded(Exception):
+    limit: int
+
+    def __init__(self, limit: int):
+        super().__init__(f"output limit exceeded: {limit} bytes")
+        self.limit = limit
+
+class Output():
+    """
+    Collects what `puts` writes during one evaluation. Each evaluation gets
+    its own Output, so evaluations running on different threads never see
+    each other's output and nothing global has to be swapped out.
+
+    Once more than `spill_bytes` have been written, the output moves to a
+    temporary file, and `getvalue` memory-maps it back. Writing past
+    `max_bytes` raises OutputLimitExceeded. Sizes are UTF-8 bytes; both limits
+    are off when None.
+    """
+    chunks: List[str]
+    spill_bytes: int | None
+    max_bytes: int | None
+    size: int
+    spill: BinaryIO | None
+
+    def __init__(self, spill_bytes: int | None = None, max_bytes: int | None = None):
+        self.chunks = []
+        self.spill_bytes = spill_bytes
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.spill = None
+
+    def write(self, text: str) -> None:
+        if self.spill_bytes is None and self.max_bytes is None:
+            self.chunks.append(text)
+            return
+        data = text.encode("utf-8")
+        if self.max_bytes is not None and self.size + len(data) > self.max_bytes:
+            raise OutputLimitExceeded(self.max_bytes)
+        self.size += len(data)
+        if self.spill is not None:
+            self.spill.write(data)
+            return
+        self.chunks.append(text)
+        if self.spill_bytes is not None and self.size > self.spill_bytes:
+            self.spill = tempfile.TemporaryFile()
+            self.spill.write("".join(self.chunks).encode("utf-8"))
+            self.chunks = []
+
+    def getvalue(self) -> str:
+        if self.spill is None:
+            return "".join(self.chunks)
+        self.spill.flush()
+        with mmap.mmap(self.spill.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return str(m, "utf-8")
+
+    def close(self) -> None:
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+class StreamOutput():
+    """
+    Writes straight through to a text stream, stdout unless told otherwise.
+    """
+    stream: TextIO
+
+    def __init__(self, stream: TextIO = None):
+        self.stream = stream
+
+    def write(self, text: str) -> None:
+        (self.stream or sys.stdout).write(text)
+
+    def getvalue(self) -> str:
+        return ""
+
+class OutputClosed(Exception):
+    """
+    Raised inside an evaluation whose output nobody is reading anymore, which
+    unwinds the evaluation.
+    """
+    pass
+
+# Put on a QueueOutput's queue once the evaluation is done
+END_OF_OUTPUT = None
+
+class QueueOutput():
+    """
+    Hands each chunk to a reader on another thread through a bounded queue.
+    A writer that gets `maxsize` chunks ahead waits for the reader, so a
+    chatty script never holds more than that in memory. Once the reader
+    calls `close`, the next write raises OutputClosed.
+    """
+    queue: queue.Queue
+    closed: bool
+
+    def __init__(self, maxsize: int = 64):
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def _put(self, item: str | None) -> bool:
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def write(self, text: str) -> None:
+        if not self._put(text):
+            raise OutputClosed()
+
+    def finish(self) -> None:
+        self._put(END_OF_OUTPUT)
+
+    def close(self) -> None:
+        self.closed = True
+
+    def getvalue(self) -> str:
+        # Everything has already been handed to the reader
+        return ""
@@ -91,6 +91,10 @@ class Parser():
             return self._parse_let_statement()
         elif self.curr_token.type == TokenEnum.RETURN:
             return self._parse_return_statement()
+        elif self.curr_token.type == TokenEnum.WHILE:
+            return self._parse_while_statement()
+        elif self.curr_token.type == TokenEnum.FOR:
+            return self._parse_for_statement()
         else:
             return self._parse_expression_statement()
 
@@ -115,6 +119,41 @@ class Parser():
             self.next_token()
         return ast.ReturnStatement(return_token, return_value)
 
+    def _parse_while_statement(self) -> ast.WhileStatement | None:
+        token = self.curr_token
+        if not self._expect_peek(TokenEnum.LPAREN):
+            return None
+        self.next_token()
+        condition = self._parse_expression(ParsePrecedence.LOWEST)
+        if not self._expect_peek(TokenEnum.RPAREN):
+            return None
+        if not self._expect_peek(TokenEnum.LBRACE):
+            return None
+        body = self._parse_block_statement()
+        if self._peek_token_is(TokenEnum.SEMICOLON):
+            self.next_token()
+        return ast.WhileStatement(token, condition, body)
+
+    def _parse_for_statement(self) -> ast.ForStatement | None:
+        token = self.curr_token
+        if not self._expect_peek(TokenEnum.LPAREN):
+            return None
+        if not self._expect_peek(TokenEnum.IDENT):
+            return None
+        variable = ast.Identifier(self.curr_token, self.curr_token.literal)
+        if not self._expect_peek(TokenEnum.IN):
+            return None
+        self.next_token()
+        iterable = self._parse_expression(ParsePrecedence.LOWEST)
+        if not self._expect_peek(TokenEnum.RPAREN):
+            return None
+        if not self._expect_peek(TokenEnum.LBRACE):
+            return None
+        body = self._parse_block_statement()
+        if self._peek_token_is(TokenEnum.SEMICOLON):
+            self.next_token()
+        return ast.ForStatement(token, variable, iterable, body)
+
     def _parse_expression_statement(self) -> ast.ExpressionStatement | None:
         expression_statement_token = self.curr_token
         expression_statement = self._parse_expression(ParsePrecedence.LOWEST)
@@ -0,0 +1,196 @@
+from typing import Dict, List, Set
+import yada.yada_python.yada_ast as ast
+import yada.yada_python.yada_object as obj
+
+# Builtins that call one of their arguments, and the position of that argument
+HIGHER_ORDER_BUILTINS: Dict[str, int] = {
+    "map": 1,
+    "filter": 1,
+}
+
+class FunctionFacts():
+    """
+    What a function literal's body says about purity on its own, before we
+    know what its free variables are bound to.
+
+    free: identifiers referenced in the body but not bound by it
+    called: the free identifiers that end up being called
+    unknown_calls: true when the body calls something we cannot resolve
+        statically, such as a parameter or the result of another call
+    """
+    free: Set[str]
+    called: Set[str]
+    unknown_calls: bool
+
+    def __init__(self):
+        self.free = set()
+        self.called = set()
+        self.unknown_calls = False
+
+def function_facts(literal: ast.FunctionLiteral) -> FunctionFacts:
+    return body_facts(literal.parameters, literal.body)
+
+def body_facts(parameters: List[ast.Identifier], body: ast.BlockStatement) -> FunctionFacts:
+    # The AST never changes once parsed, so the facts are cached on the body,
+    # which every closure made from one literal shares
+    facts = getattr(body, "_purity_facts", None)
+    if facts is None:
+        facts = FunctionFacts()
+        local = {p.value for p in parameters}
+        _collect_bindings(body, local)
+        _walk(body, local, facts)
+        body._purity_facts = facts
+    return facts
+
+def is_pure_function(fn: obj.Function, builtins: Dict[str, obj.Builtin], checking: Set[int] = None) -> bool:
+    """
+    A function is pure when it never calls `puts` or another impure builtin,
+    only calls things it can resolve, and none of its free variables is bound
+    to an impure function. A later let statement can rebind a free variable,
+    so they are looked up as they are bound when asked, not when the closure
+    was created. Functions in `checking`, the ones being asked about further
+    up, count as pure, which keeps recursion pure.
+    """
+    facts = body_facts(fn.parameters, fn.body)
+    if facts.unknown_calls:
+        return False
+    checking = set() if checking is None else checking
+    checking.add(id(fn))
+    for name in facts.free:
+        val = _lookup(fn.env, name)
+        if val is None:
+            val = builtins.get(name)
+        if val is None:
+            if name in facts.called:
+                return False
+            continue
+        if not is_pure_value(val, builtins, checking):
+            return False
+    return True
+
+def is_pure_value(val: obj.Object, builtins: Dict[str, obj.Builtin], checking: Set[int] = None) -> bool:
+    """ Whether calling `val`, when it is something callable, has no side effects. """
+    val_type = type(val)
+    if val_type == obj.Function:
+        return (checking is not None and id(val) in checking) or is_pure_function(val, builtins, checking)
+    elif val_type == obj.Builtin:
+        return val.pure
+    elif val_type == obj.MemoizedFunction:
+        return is_pure_value(val.fn, builtins, checking)
+    return True
+
+def is_pure_program(program: ast.Program, builtins: Dict[str, obj.Builtin]) -> bool:
+    """
+    Every side effect goes through an impure builtin, and a program can only
+    reach a builtin by naming it, so a program that never mentions one is pure.
+    """
+    return not _mentions(program, {name for name, b in builtins.items() if not b.pure})
+
+def is_deterministic_program(program: ast.Program, builtins: Dict[str, obj.Builtin]) -> bool:
+    """
+    Likewise, a program that never names a nondeterministic builtin computes
+    the same result and output on every run.
+    """
+    return not _mentions(program, {name for name, b in builtins.items() if not b.deterministic})
+
+def _mentions(program: ast.Program, names: Set[str]) -> bool:
+    if not names:
+        return False
+    found: Set[str] = set()
+    _collect_identifiers(program, found)
+    return not found.isdisjoint(names)
+
+def _lookup(env: obj.Environment, name: str) -> obj.Object | None:
+    while env:
+        if name in env.store:
+            return env.store[name]
+        env = env.outer
+    return None
+
+def _children(node: ast.Node) -> List[ast.Node]:
+    # Programs with parse errors are still evaluated, so lists may be None
+    node_type = type(node)
+    if node_type == ast.Program or node_type == ast.BlockStatement:
+        return node.statements or []
+    elif node_type == ast.ExpressionStatement:
+        return [node.expression]
+    elif node_type == ast.LetStatement:
+        return [node.value]
+    elif node_type == ast.ReturnStatement:
+        return [node.return_value]
+    elif node_type == ast.IfExpression:
+        return [node.condition, node.consequence, node.alternative]
+    elif node_type == ast.WhileStatement:
+        return [node.condition, node.body]
+    elif node_type == ast.ForStatement:
+        return [node.iterable, node.body]
+    elif node_type == ast.FunctionLiteral:
+        return [node.body]
+    elif node_type == ast.CallExpression:
+        return [node.function] + (node.arguments or [])
+    elif node_type == ast.PrefixExpression:
+        return [node.right]
+    elif node_type == ast.InfixExpression:
+        return [node.left, node.right]
+    elif node_type == ast.ArrayLiteral:
+        return node.elements or []
+    elif node_type == ast.IndexExpression:
+        return [node.left, node.index]
+    elif node_type == ast.HashLiteral:
+        return list(node.pairs.keys()) + list(node.pairs.values()) if node.pairs else []
+    return []
+
+def _collect_bindings(node: ast.Node, local: Set[str]) -> None:
+    # Names bound anywhere in a function body, not looking into nested functions
+    node_type = type(node)
+    if node_type == ast.LetStatement:
+        local.add(node.name.value)
+    elif node_type == ast.ForStatement:
+        local.add(node.variable.value)
+    elif node_type == ast.FunctionLiteral:
+        return
+    for child in _children(node):
+        if child is not None:
+            _collect_bindings(child, local)
+
+def _collect_identifiers(node: ast.Node, names: Set[str]) -> None:
+    if type(node) == ast.Identifier:
+        names.add(node.value)
+        return
+    for child in _children(node):
+        if child is not None:
+            _collect_identifiers(child, names)
+
+def _walk(node: ast.Node, local: Set[str], facts: FunctionFacts) -> None:
+    node_type = type(node)
+    if node_type == ast.Identifier:
+        if node.value not in local:
+            facts.free.add(node.value)
+        return
+    elif node_type == ast.FunctionLiteral:
+        inner = function_facts(node)
+        facts.free |= inner.free - local
+        facts.called |= inner.called - local
+        facts.unknown_calls = facts.unknown_calls or inner.unknown_calls
+        return
+    elif node_type == ast.CallExpression:
+        _note_callee(node.function, local, facts)
+        callee = node.function
+        if type(callee) == ast.Identifier and callee.value not in local and \
+                callee.value in HIGHER_ORDER_BUILTINS:
+            position = HIGHER_ORDER_BUILTINS[callee.value]
+            if position < len(node.arguments):
+                _note_callee(node.arguments[position], local, facts)
+    for child in _children(node):
+        if child is not None:
+            _walk(child, local, facts)
+
+def _note_callee(callee: ast.Expression, local: Set[str], facts: FunctionFacts) -> None:
+    callee_type = type(callee)
+    if callee_type == ast.Identifier:
+        if callee.value in local:
+            facts.unknown_calls = True
+        else:
+            facts.called.add(callee.value)
+    elif callee_type != ast.FunctionLiteral:
+        facts.unknown_calls = True
@@ -1,14 +1,18 @@
 import os
+import sys
 
 from yada.yada_python.yada_lexer import Lexer
 from yada.yada_python.yada_parser import Parser
 from yada.yada_python.yada_token import TokenEnum
-from yada.yada_python.yada_object import new_environment
-from yada.yada_python.yada_evaluator import Eval
+from yada.yada_python.yada_object import ObjectTypeEnum
+from yada.yada_python.yada_evaluator import Interpreter
+from yada.yada_python.yada_cache import default_cache
 
 PROMPT = ">>"
 
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_script(sys.argv[1]))
     print("yada yada yada")
     print()
     print(f"Hello {os.getlogin()}! This is the Yada Programming Language!")
@@ -18,7 +22,8 @@ def main():
     start()
 
 def start():
-    env = new_environment()
+    interp = Interpreter()
+    env = interp.new_environment()
     while True:
         print(PROMPT, end=" ")
         line = input()
@@ -32,11 +37,25 @@ def start():
             continue
         # Print program ast style
         # print(program.string())
-        evaluated = Eval(program, env)
+        evaluated = interp.eval(program, env)
         if evaluated:
             print(evaluated.inspect())
             print()
 
+def run_script(path: str) -> int:
+    with open(path) as f:
+        source = f.read()
+    interp = Interpreter(program_cache=default_cache())
+    program, errors = interp.parse(source)
+    if len(errors) != 0:
+        print_parser_errors(errors)
+        return 1
+    evaluated = interp.eval(program, interp.new_environment())
+    if evaluated and evaluated.type() == ObjectTypeEnum.ERROR_OBJ:
+        print(evaluated.inspect())
+        return 1
+    return 0
+
 def print_parser_errors(errors):
     print("ERROR: Paring errors:")
     for e in errors:
@@ -43,6 +43,9 @@ class TokenEnum(Enum):
     IF = "IF"
     ELSE = "ELSE"
     RETURN = "RETURN"
+    WHILE = "WHILE"
+    FOR = "FOR"
+    IN = "IN"
 
 
 class Token:
@@ -70,7 +73,10 @@ keywords = {
     "false": TokenEnum.FALSE,
     "if": TokenEnum.IF,
     "else": TokenEnum.ELSE,
-    "return": TokenEnum.RETURN
+    "return": TokenEnum.RETURN,
+    "while": TokenEnum.WHILE,
+    "for": TokenEnum.FOR,
+    "in": TokenEnum.IN,
 }
 
 def lookup_ident(ident: str) -> TokenEnum:
@@ -1,16 +1,236 @@
+import json
+import threading
+import time
+import types
+from typing import Callable, Iterator
+
 import cherrypy
-from yada.yada_python.yada_frontend import Yada
+from yada.yada_python.yada_evaluator import Interpreter
+from yada.yada_python.yada_frontend import Yada, YadaStream, YadaJSON, check_fields, new_interpreter, FIELDS
+from yada.yada_server.prometheus import Registry, CONTENT_TYPE
+from yada.yada_server.worker_pool import WorkerPool, PoolBusy, EvaluationTimeout, WorkerCrashed, \
+    pool_from_env, limits_from_env, RETRY_AFTER_SECONDS, DEFAULT_TIMEOUT
+
+# Phases of a result's "metrics" section that get a latency histogram
+PHASES = ("lex", "parse", "eval", "serialize")
+
+def parse_fields(fields: str | None) -> tuple | None:
+    """
+    Reads the `fields` query parameter, a comma-separated list of result
+    sections such as `output,errors`. Answers 400 for unknown sections.
+    """
+    if not fields:
+        return None
+    try:
+        return check_fields(f.strip() for f in fields.split(","))
+    except ValueError as e:
+        raise cherrypy.HTTPError(400, str(e))
+
+def run_in_pool(pool: WorkerPool, code: str, fields: tuple | None) -> dict:
+    """
+    Runs `code` in a pool worker, answering 503 when the pool's queue is
+    full and 504 when the program runs past the pool's timeout.
+    """
+    try:
+        return pool.run(code, fields)
+    except PoolBusy as e:
+        cherrypy.response.headers["Retry-After"] = str(RETRY_AFTER_SECONDS)
+        raise cherrypy.HTTPError(503, str(e))
+    except EvaluationTimeout as e:
+        raise cherrypy.HTTPError(504, str(e))
+    except WorkerCrashed as e:
+        raise cherrypy.HTTPError(500, str(e))
 
 class YadaWebServer(object):
+    """
+    With a `pool`, evaluations run in its worker processes; without one they
+    run on CherryPy's request threads, stopped after `timeout` seconds,
+    `max_steps` steps or `max_allocated_bytes` allocated (see Interpreter).
+
+    GET /metrics answers in the Prometheus text format. Requests to every
+    other endpoint are counted and timed, streamed ones when their body ends.
+    Every evaluation is run with the "metrics" result section (see
+    yada_frontend.Yada), whose phase timings feed the histograms; it is only
+    sent back to clients that asked for it.
+    """
+    pool: WorkerPool | None
+    registry: Registry
+    timeout: float | None
+    max_steps: int | None
+    max_allocated_bytes: int | None
+
+    def __init__(self, pool: WorkerPool = None, registry: Registry = None, timeout: float | None = DEFAULT_TIMEOUT,
+                 max_steps: int | None = None, max_allocated_bytes: int | None = None):
+        self.pool = pool
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.max_allocated_bytes = max_allocated_bytes
+        self.registry = registry if registry is not None else Registry()
+        r = self.registry
+        self.requests_started = r.counter("yada_requests_started_total", "Requests received, by endpoint",
+                                          ("endpoint",))
+        self.requests = r.counter("yada_requests_total", "Requests answered, by endpoint and HTTP status",
+                                  ("endpoint", "status"))
+        self.request_seconds = r.histogram("yada_request_seconds", "Time to answer a request, by endpoint",
+                                           ("endpoint",))
+        self.phase_seconds = r.histogram("yada_phase_seconds", "Wall time of each phase of an evaluation",
+                                         ("phase",))
+        self.program_cache = r.counter("yada_program_cache_lookups_total",
+                                       "Parsed-program cache lookups of evaluations, by result", ("result",))
+        r.gauge("yada_program_cache_hit_ratio", "Share of program cache lookups that were hits",
+                self._program_cache_hit_ratio)
+        r.gauge("yada_inflight_evaluations", "Evaluation requests received but not answered yet",
+                self._inflight_evaluations)
+        r.gauge("yada_pool_queue_depth", "Requests waiting for a pool worker",
+                lambda: self.pool.queue_depth() if self.pool is not None else None)
+        r.gauge("yada_pool_workers", "Worker processes in the pool",
+                lambda: len(self.pool.workers) if self.pool is not None else None)
+        for event, name, help in (
+            ("restarts", "yada_worker_restarts_total", "Pool workers replaced after a timeout or crash"),
+            ("timeouts", "yada_evaluation_timeouts_total", "Evaluations stopped by the pool timeout"),
+            ("crashes", "yada_worker_crashes_total", "Pool workers that died while evaluating"),
+            ("rejected", "yada_pool_rejected_total", "Requests turned away because the pool queue was full"),
+        ):
+            r.gauge(name, help, lambda event=event: self.pool.stats[event] if self.pool is not None else None,
+                    type="counter")
+
     @cherrypy.expose
+    @cherrypy.config(**{"response.stream": True})
     @cherrypy.tools.json_in()
-    @cherrypy.tools.json_out()
-    def index(self, **params):
+    def index(self, fields=None, **params):
+        return self._answer("index", self._index, fields, params)
+
+    def _index(self, fields: str | None, params: dict):
         request_code = "let x = 1;"
-        result = Yada(request_code)
+        selected = parse_fields(fields)
         print(params)
-        return {"result": result}
+        cherrypy.response.headers["Content-Type"] = "application/json"
+        if self.pool is not None:
+            result = run_in_pool(self.pool, request_code, selected)
+            return json.dumps({"result": result}).encode("utf-8")
+        def body():
+            yield b'{"result": '
+            for chunk in YadaJSON(request_code, fields=selected):
+                yield chunk.encode("utf-8")
+            yield b"}"
+        return body()
+
+    @cherrypy.expose
+    @cherrypy.tools.json_in()
+    @cherrypy.tools.json_out()
+    def eval(self, fields=None, **params):
+        """ Runs the program in the `code` member of the JSON body. """
+        return self._answer("eval", self._eval, fields)
+
+    def _eval(self, fields: str | None) -> dict:
+        body = cherrypy.request.json
+        if not isinstance(body, dict) or not isinstance(body.get("code"), str):
+            raise cherrypy.HTTPError(400, 'body must be a JSON object with a "code" string')
+        return {"result": self._evaluate(body["code"], parse_fields(fields))}
+
+    def _answer(self, endpoint: str, handler: Callable, *args) -> any:
+        """
+        Calls `handler` and counts the request and its latency under
+        `endpoint`. A streamed body (a generator) is counted once it has been
+        sent, or has failed part way.
+        """
+        start = time.perf_counter()
+        self.requests_started.inc(endpoint)
+        status = 200
+        streamed = False
+        try:
+            answer = handler(*args)
+            if isinstance(answer, types.GeneratorType):
+                streamed = True
+                return self._counted_body(endpoint, start, answer)
+            return answer
+        except cherrypy.HTTPError as e:
+            status = e.status
+            raise
+        except Exception:
+            status = 500
+            raise
+        finally:
+            if not streamed:
+                self._count(endpoint, status, start)
+
+    def _counted_body(self, endpoint: str, start: float, body: Iterator[bytes]) -> Iterator[bytes]:
+        # The status line has gone out with the first chunk, so a failure
+        # later on only shows in the metrics
+        status = 200
+        try:
+            yield from body
+        except Exception:
+            status = 500
+            raise
+        finally:
+            self._count(endpoint, status, start)
+
+    def _count(self, endpoint: str, status: int, start: float) -> None:
+        self.requests.inc(endpoint, str(status))
+        self.request_seconds.observe(time.perf_counter() - start, endpoint)
+
+    @cherrypy.expose
+    def metrics(self):
+        cherrypy.response.headers["Content-Type"] = CONTENT_TYPE
+        return self.registry.expose().encode("utf-8")
+
+    def _evaluate(self, code: str, selected: tuple | None) -> dict:
+        fields = selected if selected is not None else FIELDS
+        measured = fields if "metrics" in fields else fields + ("metrics",)
+        if self.pool is not None:
+            result = run_in_pool(self.pool, code, measured)
+        else:
+            result = Yada(code, interpreter=self._interpreter(), fields=measured)
+        metrics = result["metrics"] if "metrics" in fields else result.pop("metrics")
+        for phase, times in metrics["phases"].items():
+            if phase in PHASES:
+                self.phase_seconds.observe(times["wall_seconds"], phase)
+        self.program_cache.inc("hit" if metrics["program_cached"] else "miss")
+        return result
+
+    def _interpreter(self) -> Interpreter:
+        # Interpreters are not shared between threads, and making one is cheap
+        return new_interpreter(max_steps=self.max_steps, timeout=self.timeout,
+                               max_allocated_bytes=self.max_allocated_bytes)
+
+    def _inflight_evaluations(self) -> float:
+        # Kept as two counters so request threads never share a gauge
+        return sum(self.requests_started.values().values()) - sum(self.requests.values().values())
+
+    def _program_cache_hit_ratio(self) -> float | None:
+        hits, misses = self.program_cache.value("hit"), self.program_cache.value("miss")
+        return hits / (hits + misses) if hits + misses > 0 else None
+
+    @cherrypy.expose
+    @cherrypy.config(**{"response.stream": True})
+    @cherrypy.tools.json_in()
+    def stream(self, fields=None, **params):
+        """
+        Streams newline-delimited JSON: one `{"output": ...}` line per chunk of
+        `puts` output as the program produces it, then a `{"result": ...}`
+        line. The body is sent with chunked transfer encoding.
+        """
+        return self._answer("stream", self._stream, fields)
 
+    def _stream(self, fields: str | None) -> Iterator[bytes]:
+        request_code = cherrypy.request.json.get("code", "")
+        selected = parse_fields(fields)
+        cherrypy.response.headers["Content-Type"] = "application/x-ndjson"
+        cancel = threading.Event()
+        def events():
+            try:
+                for event in YadaStream(request_code, interpreter=self._interpreter(), fields=selected,
+                                        cancel=cancel):
+                    yield (json.dumps(event) + "\n").encode("utf-8")
+            finally:
+                # CherryPy closes the body when the client goes away; stop the
+                # program rather than leave it running on its own thread
+                cancel.set()
+        return events()
 
 if __name__ == '__main__':
-    cherrypy.quickstart(YadaWebServer())
+    pool = pool_from_env()
+    if pool is not None:
+        cherrypy.engine.subscribe("stop", pool.close)
+    cherrypy.quickstart(YadaWebServer(pool, **limits_from_env()))
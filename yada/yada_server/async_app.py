@@ -0,0 +1,312 @@
+"""
+An asyncio HTTP/1.1 front end for the interpreter. Connections are
+coroutines, so idle or slow clients cost no thread; only evaluations leave
+the event loop, for a WorkerPool (or, without one, a thread pool).
+
+    POST /eval                 {"code": "...", "fields": ["evaluated", "output"]}
+    POST /sessions             -> {"session": "<id>"}
+    POST /sessions/<id>/eval   {"code": "..."}, run on top of the session's earlier lines
+    DELETE /sessions/<id>
+"""
+
+import argparse
+import asyncio
+import json
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+
+from yada.yada_python.yada_frontend import Yada, check_fields, new_interpreter
+from yada.yada_server.worker_pool import WorkerPool, PoolBusy, EvaluationTimeout, WorkerCrashed, \
+    pool_from_env, limits_from_env, RETRY_AFTER_SECONDS, DEFAULT_TIMEOUT
+from yada.yada_server.sessions import SessionStore
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# A keep-alive connection that sends nothing for this long is closed
+IDLE_TIMEOUT_SECONDS = 60.0
+# Threads that run evaluations when there is no pool
+INLINE_WORKERS = 4
+# How often a connection waiting for its evaluation checks that the client
+# is still there
+DISCONNECT_POLL_SECONDS = 0.1
+
+log = logging.getLogger(__name__)
+
+class HTTPError(Exception):
+    status: HTTPStatus
+    headers: dict
+
+    def __init__(self, status: HTTPStatus, message: str = None, headers: dict = None):
+        super().__init__(message or status.phrase)
+        self.status = status
+        self.headers = headers or {}
+
+class Request():
+    method: str
+    path: str
+    query: dict
+    headers: dict
+    body: bytes
+
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def keep_alive(self, version: str) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+class AsyncYadaServer():
+    """
+    Evaluations go to `pool` when there is one, and otherwise run on
+    INLINE_WORKERS threads, stopped after `timeout` seconds, `max_steps`
+    steps or `max_allocated_bytes` allocated (see Interpreter). At most
+    `limit` of them are in flight at once (by default the pool's workers plus
+    its queue), and requests past that get 503 straight away.
+
+    Session lines always run in this process, where their environments live,
+    on the same threads, and the default `sessions` store gives each line
+    the same memory quota.
+
+    When a client disconnects before its response is ready, evaluations
+    running in this process are cancelled (see Interpreter); ones in pool
+    workers run on until they finish or time out.
+    """
+    pool: WorkerPool | None
+    sessions: SessionStore
+    limit: int
+    inflight: int
+    timeout: float | None
+    max_steps: int | None
+    max_allocated_bytes: int | None
+
+    def __init__(self, pool: WorkerPool = None, limit: int = None, sessions: SessionStore = None,
+                 timeout: float | None = DEFAULT_TIMEOUT, max_steps: int | None = None,
+                 max_allocated_bytes: int | None = None):
+        self.pool = pool
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.max_allocated_bytes = max_allocated_bytes
+        self.sessions = sessions if sessions is not None else SessionStore(max_allocated_bytes=max_allocated_bytes)
+        if pool is not None:
+            # These threads only wait on pool workers; one per admitted
+            # request means none waits for a thread
+            threads = pool.size + pool.max_queue
+        else:
+            threads = INLINE_WORKERS
+        self.limit = limit if limit is not None else threads
+        self.inflight = 0
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080) -> asyncio.base_events.Server:
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    version, request = await asyncio.wait_for(read_request(reader), IDLE_TIMEOUT_SECONDS)
+                except HTTPError as e:
+                    await write_response(writer, e.status, encode_body({"error": str(e)}), e.headers,
+                                         keep_alive=False)
+                    return
+                if request is None:
+                    return
+                response = await _until_disconnected(reader, self.dispatch(request))
+                if response is None:
+                    return
+                status, data, headers = response
+                keep_alive = request.keep_alive(version)
+                await write_response(writer, status, data, headers, keep_alive, version)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, request: Request) -> (HTTPStatus, bytes, dict):
+        """ The status, encoded body and extra headers to answer `request` with. """
+        try:
+            status, body, headers = await self.route(request)
+            # Inside the try, so a result that cannot be encoded is a 500 too
+            return status, encode_body(body), headers
+        except HTTPError as e:
+            return e.status, encode_body({"error": str(e)}), e.headers
+        except Exception:
+            # Answer anyway, so a keep-alive client is not left waiting
+            log.exception("error answering %s %s", request.method, request.path)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, encode_body({"error": HTTPStatus.INTERNAL_SERVER_ERROR.phrase}), {}
+
+    async def route(self, request: Request) -> (HTTPStatus, dict, dict):
+        if request.path == "/eval":
+            _allow(request, "POST")
+            return HTTPStatus.OK, await self.eval(request), {}
+        elif request.path == "/sessions":
+            _allow(request, "POST")
+            return HTTPStatus.CREATED, {"session": self.sessions.create().id}, {}
+        elif request.path.startswith("/sessions/"):
+            return await self.session(request, request.path[len("/sessions/"):].split("/"))
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    async def eval(self, request: Request) -> dict:
+        code, fields = _read_program(request)
+        return {"result": await self._run(self._evaluate, code, fields)}
+
+    async def session(self, request: Request, parts: list) -> (HTTPStatus, dict, dict):
+        session = self.sessions.get(parts[0])
+        if session is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "no such session")
+        if len(parts) == 1:
+            _allow(request, "DELETE")
+            self.sessions.delete(session.id)
+            return HTTPStatus.OK, {"session": session.id}, {}
+        elif parts[1:] == ["eval"]:
+            _allow(request, "POST")
+            code, fields = _read_program(request)
+            result = await self._run(self.sessions.eval, session, code, fields)
+            return HTTPStatus.OK, {"session": session.id, "result": result}, {}
+        raise HTTPError(HTTPStatus.NOT_FOUND)
+
+    async def _run(self, fn, *args) -> dict:
+        """ Runs `fn(*args, cancel=...)` on a thread; cancelling this sets `cancel`. """
+        if self.inflight >= self.limit:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, f"{self.inflight} evaluations already in progress",
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        self.inflight += 1
+        cancel = threading.Event()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(fn, *args, cancel=cancel))
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+        except PoolBusy as e:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, str(e), {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        except EvaluationTimeout as e:
+            raise HTTPError(HTTPStatus.GATEWAY_TIMEOUT, str(e))
+        except WorkerCrashed as e:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+        finally:
+            self.inflight -= 1
+
+    def _evaluate(self, code: str, fields: tuple | None, cancel: threading.Event = None) -> dict:
+        if self.pool is not None:
+            return self.pool.run(code, fields)
+        interp = new_interpreter(max_steps=self.max_steps, timeout=self.timeout,
+                                 max_allocated_bytes=self.max_allocated_bytes)
+        return Yada(code, interpreter=interp, fields=fields, cancel=cancel)
+
+    def close(self) -> None:
+        self.executor.shutdown()
+        if self.pool is not None:
+            self.pool.close()
+
+async def _until_disconnected(reader: asyncio.StreamReader, coro) -> any:
+    """ Awaits `coro`, or cancels it and returns None once the client has gone. """
+    task = asyncio.ensure_future(coro)
+    while not task.done():
+        await asyncio.wait((task,), timeout=DISCONNECT_POLL_SECONDS)
+        if not task.done() and reader.at_eof():
+            task.cancel()
+            return None
+    return task.result()
+
+def _allow(request: Request, method: str) -> None:
+    if request.method != method:
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, headers={"Allow": method})
+
+def _read_program(request: Request) -> (str, tuple | None):
+    try:
+        params = json.loads(request.body or b"{}")
+    except ValueError as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"invalid JSON body: {e}")
+    if not isinstance(params, dict) or not isinstance(params.get("code"), str):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, 'body must be a JSON object with a "code" string')
+    fields = params.get("fields", request.query.get("fields"))
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    try:
+        return params["code"], check_fields(f.strip() for f in fields) if fields else None
+    except (ValueError, TypeError, AttributeError) as e:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+async def read_request(reader: asyncio.StreamReader) -> (str, Request | None):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "incomplete request")
+        return None, None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "malformed request line")
+    headers = dict()
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "malformed header")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length > 0 else b""
+    return version, Request(method, target, headers, body)
+
+def encode_body(body: dict) -> bytes:
+    return json.dumps(body).encode("utf-8")
+
+async def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, data: bytes, headers: dict = None,
+                         keep_alive: bool = True, version: str = "HTTP/1.1") -> None:
+    lines = [
+        f"{version} {status.value} {status.phrase}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(data)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+    await writer.drain()
+
+async def main(host: str, port: int) -> None:
+    app = AsyncYadaServer(pool_from_env(), **limits_from_env())
+    server = await app.serve(host, port)
+    print(f"serving on http://{host}:{port}/eval")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        app.close()
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Serve POST /eval with an asyncio front end")
+    arg_parser.add_argument("--host", default=os.environ.get("YADA_HOST", "127.0.0.1"))
+    arg_parser.add_argument("--port", type=int, default=int(os.environ.get("YADA_PORT", 8080)))
+    args = arg_parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
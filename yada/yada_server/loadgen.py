@@ -0,0 +1,113 @@
+"""
+Load generator for POST /eval. Each of `--concurrency` keep-alive
+connections sends requests back to back until `--requests` have been sent in
+total or `--duration` seconds have passed, then the latency percentiles and
+throughput are printed.
+
+    python -m yada.yada_server.loadgen -c 64 -d 10 --code 'let x = 1; x + 1'
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import List
+from urllib.parse import urlsplit
+
+DEFAULT_CODE = "let fib = fn(n) { if (n < 2) { n } else { fib(n - 1) + fib(n - 2) } }; fib(12);"
+
+class Stats():
+    latencies: List[float]
+    statuses: Counter
+    errors: int
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = Counter()
+        self.errors = 0
+
+async def connection(host: str, port: int, request: bytes, stats: Stats, budget: List[int], deadline: float) -> None:
+    reader, writer = None, None
+    try:
+        while budget[0] > 0 and time.perf_counter() < deadline:
+            budget[0] -= 1
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            start = time.perf_counter()
+            try:
+                writer.write(request)
+                status, keep_alive = await read_response(reader)
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+                stats.errors += 1
+                writer.close()
+                reader, writer = None, None
+                continue
+            # Rejected requests return at once and would flatter the percentiles
+            if status < 400:
+                stats.latencies.append(time.perf_counter() - start)
+            stats.statuses[status] += 1
+            if not keep_alive:
+                writer.close()
+                reader, writer = None, None
+    finally:
+        if writer is not None:
+            writer.close()
+
+async def read_response(reader: asyncio.StreamReader) -> (int, bool):
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    status = int(head[0].split(" ")[1])
+    headers = {}
+    for line in head[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, headers.get("connection", "").lower() != "close"
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    idx = min(int(round(p / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[idx]
+
+def report(stats: Stats, elapsed: float) -> None:
+    latencies = sorted(stats.latencies)
+    total = sum(stats.statuses.values())
+    print(f"requests:  {total} in {elapsed:.2f}s ({total / elapsed:.1f} req/s, {len(latencies) / elapsed:.1f} ok/s)")
+    print(f"statuses:  {dict(sorted(stats.statuses.items()))}  connection errors: {stats.errors}")
+    print("latency of successful requests:")
+    for p in (50, 90, 99):
+        print(f"p{p:<2}:       {percentile(latencies, p) * 1000:.2f} ms")
+    if latencies:
+        print(f"max:       {latencies[-1] * 1000:.2f} ms")
+
+async def run(url: str, code: str, concurrency: int, requests: int, duration: float) -> None:
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    body = json.dumps({"code": code, "fields": ["evaluated", "errors"]}).encode("utf-8")
+    request = (
+        f"POST {parts.path or '/eval'} HTTP/1.1\r\n"
+        f"Host: {host}:{port}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "\r\n"
+    ).encode("latin-1") + body
+    stats = Stats()
+    budget = [requests]
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(connection(host, port, request, stats, budget, deadline) for _ in range(concurrency)))
+    report(stats, time.perf_counter() - start)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure latency and throughput of POST /eval")
+    arg_parser.add_argument("url", nargs="?", default="http://127.0.0.1:8080/eval")
+    arg_parser.add_argument("-c", "--concurrency", type=int, default=32)
+    arg_parser.add_argument("-n", "--requests", type=int, default=10**9)
+    arg_parser.add_argument("-d", "--duration", type=float, default=10.0)
+    arg_parser.add_argument("--code", default=DEFAULT_CODE)
+    args = arg_parser.parse_args()
+    asyncio.run(run(args.url, args.code, args.concurrency, args.requests, args.duration))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Starts a WorkerPool, runs some programs through it and prints how much
+memory the zygote and each worker hold. USS is what a process alone holds
+(and would free on exit); PSS also counts its share of the pages it shares
+with others, so the PSS of all processes adds up to what the pool costs.
+Linux only, as it reads /proc/<pid>/smaps_rollup.
+
+    python -m yada.yada_server.memory_report -w 4 --prelude prelude.yada
+"""
+
+import argparse
+import time
+from typing import Dict
+
+from yada.yada_server.worker_pool import WorkerPool
+from yada.yada_server.loadgen import DEFAULT_CODE
+
+def memory(pid: int) -> Dict[str, int]:
+    """ Rss, Pss and Uss of a process, in kB. """
+    fields = dict()
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return {
+        "Rss": fields.get("Rss", 0),
+        "Pss": fields.get("Pss", 0),
+        "Uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+def report(pool: WorkerPool) -> None:
+    print(f"{'process':<10} {'pid':>8} {'RSS kB':>10} {'PSS kB':>10} {'USS kB':>10}")
+    rows = [("zygote", pool.zygote.pid)] + [(f"worker {i}", w.pid) for i, w in enumerate(pool.workers)]
+    total_pss = 0
+    for name, pid in rows:
+        m = memory(pid)
+        total_pss += m["Pss"]
+        print(f"{name:<10} {pid:>8} {m['Rss']:>10} {m['Pss']:>10} {m['Uss']:>10}")
+    print(f"total PSS: {total_pss} kB")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Report memory held by each worker of a WorkerPool")
+    arg_parser.add_argument("-w", "--workers", type=int, default=4)
+    arg_parser.add_argument("-n", "--requests", type=int, default=100, help="programs to run before measuring")
+    arg_parser.add_argument("--prelude", help="path of a Yada file the workers start from")
+    arg_parser.add_argument("--code", default=DEFAULT_CODE)
+    args = arg_parser.parse_args()
+    prelude = None
+    if args.prelude:
+        with open(args.prelude) as f:
+            prelude = f.read()
+
+    start = time.perf_counter()
+    with WorkerPool(args.workers, prelude=prelude) as pool:
+        print(f"pool of {args.workers} started in {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        worker = pool.zygote.fork()
+        print(f"forking one worker takes {(time.perf_counter() - start) * 1000:.2f} ms")
+        worker.stop()
+        for _ in range(args.requests):
+            pool.run(args.code, ("evaluated",))
+        print(f"after {args.requests} programs:")
+        report(pool)
+
+if __name__ == "__main__":
+    main()
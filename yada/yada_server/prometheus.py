@@ -0,0 +1,194 @@
+"""
+Counters, histograms and gauges in the Prometheus text exposition format,
+without the client library.
+
+Request threads never take a lock to record something: each thread adds to
+its own shard of every metric, and a scrape sums the shards up. A scrape can
+therefore see a histogram's buckets and its sum from slightly different
+moments, which Prometheus tolerates.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; from well under a cached lookup to a program near the pool timeout
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+
+class Metric():
+    name: str
+    help: str
+    labels: Tuple[str, ...]
+    type: str
+
+    def __init__(self, registry, name: str, help: str, labels: Tuple[str, ...]):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        """ (name, labels, value) of every line this metric exposes. """
+        raise NotImplementedError
+
+    def _totals(self) -> Dict[tuple, any]:
+        totals = dict()
+        for shard in self.registry.shards():
+            # list() copies the dict in one step under the GIL, so a thread
+            # adding a new label set meanwhile cannot break the iteration
+            for (metric, labels), value in list(shard.items()):
+                if metric is self:
+                    totals[labels] = self._merge(totals.get(labels), value)
+        return totals
+
+    def _merge(self, total: any, value: any) -> any:
+        return value if total is None else total + value
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self.registry.shard()
+        key = (self, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._totals().get(labels, 0)
+
+    def values(self) -> Dict[tuple, float]:
+        """ Totals by label values. """
+        return self._totals()
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        return [(self.name, dict(zip(self.labels, labels)), value) for labels, value in self._totals().items()]
+
+class Histogram(Metric):
+    type = "histogram"
+    buckets: Tuple[float, ...]
+
+    def __init__(self, registry, name: str, help: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self.registry.shard()
+        key = (self, labels)
+        cells = shard.get(key)
+        if cells is None:
+            # A count per bucket, +Inf last, then the sum
+            cells = shard[key] = [0] * (len(self.buckets) + 2)
+        cells[bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+    def _merge(self, total: any, value: any) -> any:
+        if total is None:
+            return list(value)
+        return [t + v for t, v in zip(total, value)]
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        samples = []
+        for labels, cells in self._totals().items():
+            base = dict(zip(self.labels, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), cells):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(base, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", base, cells[-1]))
+            samples.append((f"{self.name}_count", base, cumulative))
+        return samples
+
+class Gauge(Metric):
+    """
+    Read when scraped from `fn`, which returns a number, or a dict of numbers
+    by label values when the gauge has labels. Also used for counters that
+    are kept elsewhere (`type="counter"`), such as a pool's.
+    """
+    fn: Callable[[], any]
+
+    def __init__(self, registry, name: str, help: str, labels: Tuple[str, ...], fn: Callable[[], any],
+                 type: str = "gauge"):
+        super().__init__(registry, name, help, labels)
+        self.fn = fn
+        self.type = type
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        value = self.fn()
+        if value is None:
+            return []
+        if not self.labels:
+            return [(self.name, {}, value)]
+        return [(self.name, dict(zip(self.labels, labels)), v) for labels, v in value.items()]
+
+class Registry():
+    """ The metrics of one process, in the order they are exposed. """
+    metrics: List[Metric]
+
+    def __init__(self):
+        self.metrics = []
+        self._shards = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(self, name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], any], labels: Tuple[str, ...] = (),
+              type: str = "gauge") -> Gauge:
+        return self._add(Gauge(self, name, help, labels, fn, type))
+
+    def shard(self) -> dict:
+        """ This thread's values; only this thread writes to it. """
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = dict()
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def shards(self) -> List[dict]:
+        with self._lock:
+            return list(self._shards)
+
+    def expose(self) -> str:
+        lines = []
+        for m in self.metrics:
+            lines.append(f"# HELP {m.name} {_escape_help(m.help)}")
+            lines.append(f"# TYPE {m.name} {m.type}")
+            for name, labels, value in m.samples():
+                if labels:
+                    text = ",".join(f'{k}="{_escape_label(str(v))}"' for k, v in labels.items())
+                    name = f"{name}{{{text}}}"
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _add(self, metric: Metric) -> Metric:
+        with self._lock:
+            if any(m.name == metric.name for m in self.metrics):
+                raise ValueError(f"metric already registered: {metric.name}")
+            self.metrics.append(metric)
+        return metric
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _escape_label(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
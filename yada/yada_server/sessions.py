@@ -0,0 +1,253 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set
+
+import yada.yada_python.yada_object as obj
+from yada.yada_python.yada_evaluator import Interpreter
+from yada.yada_python.yada_binary import encode_environment, decode_environment
+from yada.yada_python.yada_frontend import Yada, new_interpreter, MEMO_MAX_ENTRIES
+
+# Sessions unused for this long are dropped
+SESSION_IDLE_TTL_SECONDS = 30 * 60
+# All sessions together may hold about this much
+SESSIONS_MAX_BYTES = 256 * 1024 * 1024
+# A line runs in the server process itself, so it is stopped after this long
+SESSION_EVAL_TIMEOUT_SECONDS = 10.0
+
+class Bindings(dict):
+    """ The store of a session's environment, which remembers the names bound since `changed` was reset. """
+    changed: Set[str]
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.changed = set(self)
+
+    def __setitem__(self, name: str, val: obj.Object) -> None:
+        super().__setitem__(name, val)
+        self.changed.add(name)
+
+class Session():
+    """
+    A live global environment on the server, so an interactive client can
+    send one line at a time and have it evaluated on top of everything it
+    sent before, like the REPL does. Lines of one session run one at a time.
+
+    `size` is kept up to date from the bindings each line makes (see
+    `measure`) rather than by walking the whole environment again. Values
+    that grow without being bound again, memoized functions and lazy
+    sequences, are measured again after every line.
+    """
+    id: str
+    interp: Interpreter
+    env: obj.Environment
+    size: int
+    bindings: Dict[str, int]
+    growing: Set[str]
+    last_used: float
+
+    def __init__(self, id: str, interp: Interpreter, env: obj.Environment):
+        self.id = id
+        self.interp = interp
+        self.env = env
+        env.store = Bindings(env.store)
+        self.size = _frame_size(env)
+        self.bindings = dict()
+        self.growing = set()
+        self.measure()
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def measure(self) -> None:
+        """ Updates `size` for the bindings made since the last call and those that may have grown. """
+        store = self.env.store
+        names = store.changed | self.growing
+        store.changed = set()
+        # Values shared by the bindings measured together are counted once;
+        # closures over this environment do not count it again
+        seen = {id(self.env)}
+        for name in names:
+            growing = []
+            size = obj.BINDING_BYTES + len(name) + value_size(store[name], seen, growing)
+            self.size += size - self.bindings.get(name, 0)
+            self.bindings[name] = size
+            if growing:
+                self.growing.add(name)
+            else:
+                self.growing.discard(name)
+
+class SessionStore():
+    """
+    Sessions by id. A session not used for `idle_ttl` seconds is dropped the
+    next time the store is touched. Each session's size is updated after
+    every line it runs; when all sessions together grow past `max_bytes`, the
+    least recently used are evicted, the one that just ran last of all. A
+    line still running after `timeout` seconds, or allocating more than
+    `max_allocated_bytes`, evaluates to an Error.
+    """
+    idle_ttl: float
+    max_bytes: int
+    sessions: OrderedDict
+    total_bytes: int
+    stats: Dict[str, int]
+
+    def __init__(self, idle_ttl: float = SESSION_IDLE_TTL_SECONDS, max_bytes: int = SESSIONS_MAX_BYTES,
+                 memo_max_entries: int | None = MEMO_MAX_ENTRIES, timeout: float | None = SESSION_EVAL_TIMEOUT_SECONDS,
+                 max_allocated_bytes: int | None = None):
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.memo_max_entries = memo_max_entries
+        self.timeout = timeout
+        self.max_allocated_bytes = max_allocated_bytes
+        self.sessions = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"created": 0, "expired": 0, "evicted": 0, "deleted": 0}
+        self._lock = threading.Lock()
+
+    def create(self) -> Session:
+        interp = self._interpreter()
+        session = Session(secrets.token_urlsafe(16), interp, interp.new_environment())
+        with self._lock:
+            self._expire()
+            self.sessions[session.id] = session
+            self.total_bytes += session.size
+            self.stats["created"] += 1
+        return session
+
+    def get(self, id: str) -> Session | None:
+        with self._lock:
+            self._expire()
+            session = self.sessions.get(id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self.sessions.move_to_end(id)
+            return session
+
+    def delete(self, id: str) -> bool:
+        with self._lock:
+            if id not in self.sessions:
+                return False
+            self._drop(id)
+            self.stats["deleted"] += 1
+            return True
+
+    def eval(self, session: Session, code: str, fields: Iterable[str] = None, cancel: threading.Event = None) -> dict:
+        """ Runs `code` in the session's environment and returns it like Yada(). """
+        with session.lock:
+            result = Yada(code, interpreter=session.interp, fields=fields, env=session.env, cancel=cancel)
+            before = session.size
+            session.measure()
+            growth = session.size - before
+        with self._lock:
+            session.last_used = time.monotonic()
+            if session.id in self.sessions:
+                self.total_bytes += growth
+                self.sessions.move_to_end(session.id)
+            self._evict()
+        return result
+
+    def snapshot(self, session: Session) -> bytes:
+        """
+        The session's environment as bytes, e.g. to keep it across a restart.
+        Raises ValueError when it holds a sequence whose elements were never
+        computed (see yada_binary).
+        """
+        with session.lock:
+            return encode_environment(session.env, session.interp.builtins)
+
+    def restore(self, data: bytes) -> Session:
+        """ A new session holding the environment from snapshot(). """
+        interp = self._interpreter()
+        session = Session(secrets.token_urlsafe(16), interp, decode_environment(data, interp.builtins))
+        with self._lock:
+            self._expire()
+            self.sessions[session.id] = session
+            self.total_bytes += session.size
+            self.stats["created"] += 1
+            self._evict()
+        return session
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def _interpreter(self) -> Interpreter:
+        return new_interpreter(self.memo_max_entries, timeout=self.timeout,
+                               max_allocated_bytes=self.max_allocated_bytes)
+
+    def _expire(self) -> None:
+        # Least recently used first, so the expired ones are all at the front
+        now = time.monotonic()
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if now - session.last_used < self.idle_ttl:
+                break
+            self._drop(session.id)
+            self.stats["expired"] += 1
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self.sessions:
+            self._drop(next(iter(self.sessions)))
+            self.stats["evicted"] += 1
+
+    def _drop(self, id: str) -> None:
+        session = self.sessions.pop(id)
+        self.total_bytes -= session.size
+
+def environment_size(env: obj.Environment, seen: Set[int] = None, growing: List[obj.Object] = None) -> int:
+    """
+    Approximate bytes held by an environment, its outer environments and
+    everything reachable from their bindings. Shared values are counted once;
+    ASTs belong to the parsed program and are not counted.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    while env is not None and id(env) not in seen:
+        seen.add(id(env))
+        size += obj.OBJECT_BYTES
+        for name, val in env.store.items():
+            size += obj.BINDING_BYTES + len(name) + value_size(val, seen, growing)
+        env = env.outer
+    return size
+
+def _frame_size(env: obj.Environment) -> int:
+    # The environment itself and its outer ones, which a line cannot change
+    return obj.OBJECT_BYTES + environment_size(env.outer, {id(env)})
+
+def value_size(val: obj.Object, seen: Set[int], growing: List[obj.Object] = None) -> int:
+    """
+    Approximate bytes held by `val` and what it reaches that is not in
+    `seen`. Values that may still grow in place are added to `growing`.
+    """
+    val_type = type(val)
+    if val_type in (obj.Boolean, obj.Null, obj.Builtin) or id(val) in seen:
+        return 0
+    seen.add(id(val))
+    if val_type == obj.Integer:
+        return obj.OBJECT_BYTES
+    elif val_type == obj.String:
+        return obj.OBJECT_BYTES + len(val.value)
+    elif val_type == obj.IntArray:
+        return obj.OBJECT_BYTES * 2 + val.values.nbytes
+    elif val_type == obj.Array:
+        return obj.OBJECT_BYTES + obj.SLOT_BYTES * len(val.elements) + \
+            sum(value_size(e, seen, growing) for e in val.elements)
+    elif val_type == obj.Hash:
+        return obj.OBJECT_BYTES + sum(obj.BINDING_BYTES + value_size(p.key, seen, growing) +
+                                      value_size(p.value, seen, growing) for p in val.pairs.values())
+    elif val_type == obj.Function:
+        return obj.OBJECT_BYTES + environment_size(val.env, seen, growing)
+    elif val_type == obj.MemoizedFunction:
+        if growing is not None:
+            growing.append(val)
+        return obj.OBJECT_BYTES + value_size(val.fn, seen, growing) + \
+            sum(obj.BINDING_BYTES + value_size(v, seen, growing) for v in val.cache.values())
+    elif val_type == obj.Sequence:
+        if not val.materialized:
+            if growing is not None:
+                growing.append(val)
+            return obj.OBJECT_BYTES
+        els = val.materialize()
+        return obj.OBJECT_BYTES + obj.SLOT_BYTES * len(els) + sum(value_size(e, seen, growing) for e in els)
+    return obj.OBJECT_BYTES
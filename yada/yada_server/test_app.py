@@ -0,0 +1,77 @@
+import json
+import urllib.request
+import cherrypy
+import pytest
+from yada.yada_server.app import YadaWebServer
+
+@pytest.fixture(scope="module")
+def base_url():
+    app = YadaWebServer()
+    cherrypy.tree.mount(app, "/")
+    cherrypy.config.update({"server.socket_host": "127.0.0.1", "server.socket_port": 0, "log.screen": False,
+                            "engine.autoreload.on": False, "checker.on": False})
+    cherrypy.engine.start()
+    cherrypy.engine.wait(cherrypy.engine.states.STARTED)
+    try:
+        yield f"http://127.0.0.1:{cherrypy.server.bound_addr[1]}"
+    finally:
+        cherrypy.engine.exit()
+
+def _post(url: str, body: bytes) -> (int, dict):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def _scrape(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url + "/metrics") as response:
+        assert response.headers["Content-Type"].startswith("text/plain"), "wrong content type"
+        text = response.read().decode("utf-8")
+    samples = dict()
+    for line in text.splitlines():
+        if not line.startswith("#"):
+            name, _, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+def test_metrics_endpoint(base_url):
+    for _ in range(3):
+        status, body = _post(base_url + "/eval?fields=evaluated", b'{"code": "let x = 20; x * 2 + 2"}')
+        assert (status, body) == (200, {"result": {"evaluated": "42"}}), f"wrong response, got={(status, body)}"
+    status, body = _post(base_url + "/eval?fields=metrics", b'{"code": "1"}')
+    assert "nodes_evaluated" in body["result"]["metrics"], f"metrics asked for but not sent, got={body}"
+    status, _ = _post(base_url + "/eval", b'{"nope": 1}')
+    assert status == 400, f"expected 400, got={status}"
+
+    samples = _scrape(base_url)
+    assert samples['yada_requests_total{endpoint="eval",status="200"}'] == 4, f"wrong request count, got={samples}"
+    assert samples['yada_requests_total{endpoint="eval",status="400"}'] == 1, f"400 not counted, got={samples}"
+    assert samples["yada_inflight_evaluations"] == 0, "finished requests still in flight"
+    assert samples['yada_request_seconds_count{endpoint="eval"}'] == 5, "request latencies not observed"
+    for phase in ("eval", "serialize"):
+        assert samples[f'yada_phase_seconds_count{{phase="{phase}"}}'] == 4, f"{phase} not timed for every evaluation"
+    # Only programs missing from the program cache are lexed and parsed
+    misses = samples.get('yada_program_cache_lookups_total{result="miss"}', 0)
+    for phase in ("lex", "parse"):
+        assert samples.get(f'yada_phase_seconds_count{{phase="{phase}"}}', 0) == misses, f"wrong {phase} count"
+    hits = samples['yada_program_cache_lookups_total{result="hit"}']
+    assert hits + misses == 4 and hits >= 2, f"repeated program not counted as a cache hit, got={samples}"
+    assert 0 < samples["yada_program_cache_hit_ratio"] <= 1, "hit ratio out of range"
+    assert "yada_pool_queue_depth" not in samples, "pool gauges exposed without a pool"
+
+def test_stream_requests_counted(base_url):
+    request = urllib.request.Request(base_url + "/stream?fields=evaluated", data=b'{"code": "puts(1); 2"}',
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        lines = [json.loads(line) for line in response.read().splitlines()]
+    assert lines[-1] == {"result": {"evaluated": "2"}}, f"wrong stream, got={lines}"
+    status, _ = _post(base_url + "/stream?fields=nope", b'{"code": "1"}')
+    assert status == 400, f"expected 400, got={status}"
+
+    samples = _scrape(base_url)
+    assert samples['yada_requests_total{endpoint="stream",status="200"}'] == 1, f"stream not counted, got={samples}"
+    assert samples['yada_requests_total{endpoint="stream",status="400"}'] == 1, f"400 not counted, got={samples}"
+    assert samples['yada_request_seconds_count{endpoint="stream"}'] == 2, "stream latencies not observed"
+    assert samples["yada_inflight_evaluations"] == 0, "finished streams still in flight"
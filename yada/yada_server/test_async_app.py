@@ -0,0 +1,149 @@
+import asyncio
+import json
+from yada.yada_server.async_app import AsyncYadaServer
+from yada.yada_server.loadgen import read_response
+
+async def _request(port: int, method: str, path: str, body: bytes = b"") -> (int, dict):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    payload = json.loads(await reader.read())
+    writer.close()
+    return int(head.split(" ")[1]), payload
+
+async def _exercise() -> list:
+    app = AsyncYadaServer(limit=1)
+    server = await app.serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        results = [
+            await _request(port, "POST", "/eval?fields=evaluated,output", b'{"code": "puts(1); 40 + 2"}'),
+            await _request(port, "POST", "/eval", b'{"code": "1", "fields": ["bogus"]}'),
+            await _request(port, "POST", "/eval", b"not json"),
+            await _request(port, "GET", "/eval"),
+            await _request(port, "POST", "/missing"),
+        ]
+        status, created = await _request(port, "POST", "/sessions")
+        path = f"/sessions/{created['session']}"
+        results += [
+            (status, created),
+            await _request(port, "POST", path + "/eval", b'{"code": "let x = 41;"}'),
+            await _request(port, "POST", path + "/eval", b'{"code": "x + 1", "fields": ["evaluated"]}'),
+            await _request(port, "DELETE", path),
+            await _request(port, "POST", path + "/eval", b'{"code": "x"}'),
+        ]
+        # Two requests on one keep-alive connection
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = b'{"code": "2 * 3", "fields": ["evaluated"]}'
+        request = f"POST /eval HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        for _ in range(2):
+            writer.write(request)
+            results.append(await read_response(reader))
+        writer.close()
+        return results
+    finally:
+        server.close()
+        await server.wait_closed()
+        app.close()
+
+def test_eval_endpoint():
+    results = asyncio.run(_exercise())
+    assert results[0] == (200, {"result": {"evaluated": "42", "output": "1\n"}}), f"wrong response, got={results[0]}"
+    statuses = [r[0] for r in results[1:5]]
+    assert statuses == [400, 400, 405, 404], f"wrong error statuses, got={statuses}"
+    statuses = [r[0] for r in results[5:10]]
+    assert statuses == [201, 200, 200, 200, 404], f"wrong session statuses, got={statuses}"
+    assert results[7][1]["result"] == {"evaluated": "42"}, f"session lost its bindings, got={results[7][1]}"
+    assert results[10:] == [(200, True), (200, True)], f"keep-alive requests failed, got={results[10:]}"
+
+async def _disconnect_mid_eval() -> tuple:
+    app = AsyncYadaServer(limit=2)
+    server = await app.serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = b'{"code": "while (true) { 1 }"}'
+        writer.write(f"POST /eval HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await asyncio.sleep(0.2)
+        writer.close()
+        # Once the stuck evaluation is cancelled its thread is free for the next one
+        status, result = await asyncio.wait_for(
+            _request(port, "POST", "/eval", b'{"code": "1 + 1", "fields": ["evaluated"]}'), 5)
+        return status, result, app.inflight
+    finally:
+        server.close()
+        await server.wait_closed()
+        app.close()
+
+def test_disconnect_cancels_evaluation(monkeypatch):
+    monkeypatch.setattr("yada.yada_server.async_app.INLINE_WORKERS", 1)
+    status, result, inflight = asyncio.run(_disconnect_mid_eval())
+    assert (status, result) == (200, {"result": {"evaluated": "2"}}), f"wrong response, got={(status, result)}"
+    assert inflight == 0, f"cancelled evaluation still counted as in flight, got={inflight}"
+
+async def _runaway(code: bytes) -> tuple:
+    app = AsyncYadaServer(timeout=0.1)
+    server = await app.serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return await asyncio.wait_for(_request(port, "POST", "/eval", code), 5)
+    finally:
+        server.close()
+        await server.wait_closed()
+        app.close()
+
+def test_inline_evaluation_timeout():
+    for code in (b'{"code": "while (true) { 1 }", "fields": ["evaluated"]}',
+                 b'{"code": "sum(range(1000000000))", "fields": ["evaluated"]}'):
+        status, result = asyncio.run(_runaway(code))
+        assert (status, result) == (200, {"result": {"evaluated": "ERROR: timed out after 0.1s"}}), \
+            f"wrong response, got={(status, result)}"
+
+async def _failing_eval() -> list:
+    app = AsyncYadaServer()
+    def fail(*args, **kwargs):
+        raise RuntimeError("boom")
+    app._evaluate = fail
+    server = await app.serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = b'{"code": "1"}'
+        request = f"POST /eval HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        results = []
+        for _ in range(2):
+            writer.write(request)
+            results.append(await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5))
+            length = int(results[-1].split(b"Content-Length: ")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+        writer.close()
+        return results
+    finally:
+        server.close()
+        await server.wait_closed()
+        app.close()
+
+def test_unexpected_error_answers_500():
+    heads = asyncio.run(_failing_eval())
+    assert all(h.startswith(b"HTTP/1.1 500 ") for h in heads), f"wrong responses, got={heads}"
+    assert b"Connection: keep-alive" in heads[0], "connection not kept alive after a 500"
+
+async def _unencodable() -> list:
+    app = AsyncYadaServer()
+    server = await app.serve("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        results = [await _request(port, "POST", "/eval", b'{"code": "let h = {\\"a\\": 1}; h[\\"a\\"]"}')]
+        app._evaluate = lambda *args, **kwargs: {"evaluated": object()}
+        results.append(await _request(port, "POST", "/eval", b'{"code": "1"}'))
+        return results
+    finally:
+        server.close()
+        await server.wait_closed()
+        app.close()
+
+def test_results_are_encoded_before_answering():
+    (status, body), (failed, _) = asyncio.run(_unencodable())
+    assert status == 200, f"hash binding not answered, got={status}"
+    assert body["result"]["environment"]["h"] == {"a": 1}, f"wrong environment, got={body}"
+    assert failed == 500, f"unencodable result should answer 500, got={failed}"
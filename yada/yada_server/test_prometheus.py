@@ -0,0 +1,50 @@
+import threading
+from yada.yada_server.prometheus import Registry
+
+def test_exposition():
+    r = Registry()
+    requests = r.counter("app_requests_total", "Requests\nby status", ("status",))
+    latency = r.histogram("app_seconds", "Latency", buckets=(0.1, 1.0))
+    r.gauge("app_depth", "Depth", lambda: 3)
+    r.gauge("app_absent", "Not there yet", lambda: None)
+    requests.inc("200")
+    requests.inc("200")
+    requests.inc('5"0"0')
+    for v in (0.05, 0.1, 0.5, 2):
+        latency.observe(v)
+    expected = "\n".join([
+        "# HELP app_requests_total Requests\\nby status",
+        "# TYPE app_requests_total counter",
+        'app_requests_total{status="200"} 2',
+        'app_requests_total{status="5\\"0\\"0"} 1',
+        "# HELP app_seconds Latency",
+        "# TYPE app_seconds histogram",
+        'app_seconds_bucket{le="0.1"} 2',
+        'app_seconds_bucket{le="1"} 3',
+        'app_seconds_bucket{le="+Inf"} 4',
+        "app_seconds_sum 2.65",
+        "app_seconds_count 4",
+        "# HELP app_depth Depth",
+        "# TYPE app_depth gauge",
+        "app_depth 3",
+        "# HELP app_absent Not there yet",
+        "# TYPE app_absent gauge",
+    ]) + "\n"
+    assert r.expose() == expected, f"wrong exposition, got=\n{r.expose()}"
+
+def test_threads_add_up():
+    r = Registry()
+    hits = r.counter("hits_total", "Hits")
+    def work():
+        for _ in range(10000):
+            hits.inc()
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    # Scraping while the threads write must not fail
+    while any(t.is_alive() for t in threads):
+        r.expose()
+    for t in threads:
+        t.join()
+    assert hits.value() == 80000, f"lost increments, got={hits.value()}"
+    assert len(r.shards()) == 8, f"expected one shard per thread, got={len(r.shards())}"
@@ -0,0 +1,90 @@
+import time
+import pytest
+import yada.yada_python.yada_object as obj
+from yada.yada_server.sessions import SessionStore, environment_size
+
+def test_incremental_eval():
+    store = SessionStore()
+    session = store.create()
+    store.eval(session, "let add = fn(a, b) { a + b };")
+    store.eval(session, "let x = add(40, 1);")
+    result = store.eval(session, "add(x, 1)", fields=["evaluated"])
+    assert result == {"evaluated": "42"}, f"session did not keep its bindings, got={result}"
+    assert store.get(session.id) is session, "session should be found by id"
+    assert store.delete(session.id) and store.get(session.id) is None, "deleted session still found"
+
+def test_size_accounting():
+    store = SessionStore()
+    session = store.create()
+    before = session.size
+    store.eval(session, 'let s = "' + "x" * 10000 + '"; let a = [s, s, s];')
+    assert session.size >= before + 10000, f"size not updated, got={session.size}"
+    assert session.size < before + 20000, f"shared string counted more than once, got={session.size}"
+    assert store.total_bytes == session.size, f"total wrong, got={store.total_bytes}, want={session.size}"
+    store.eval(session, "let f = fn(n) { if (n < 1) { 0 } else { f(n - 1) } }; f(3);")
+    assert environment_size(session.env) == session.size, "recursive closure should not loop the size walk"
+
+def test_size_tracks_changed_bindings():
+    store = SessionStore()
+    session = store.create()
+    store.eval(session, 'let s = "' + "x" * 10000 + '";')
+    store.eval(session, 'let s = "";')
+    assert session.size < 1000, f"rebound value still counted, got={session.size}"
+    store.eval(session, "let r = range(100000);")
+    store.eval(session, "let n = len(r);")
+    assert session.size >= 100000 * obj.SLOT_BYTES, f"materialized sequence not counted, got={session.size}"
+    store.eval(session, "let f = memo(fn(n) { [n, n, n] }); let i = 0; while (i < 50) { f(i); let i = i + 1; }")
+    assert session.size == environment_size(session.env), "memoized results added in place not counted"
+    assert store.total_bytes == session.size, f"total wrong, got={store.total_bytes}, want={session.size}"
+
+def test_idle_ttl():
+    store = SessionStore(idle_ttl=0.05)
+    session = store.create()
+    time.sleep(0.1)
+    assert store.get(session.id) is None, "idle session should expire"
+    assert store.stats["expired"] == 1, f"wrong stats, got={store.stats}"
+
+def test_lru_eviction():
+    store = SessionStore(max_bytes=30000)
+    a, b = store.create(), store.create()
+    store.eval(a, 'let s = "' + "a" * 12000 + '";')
+    store.eval(b, 'let s = "' + "b" * 12000 + '";')
+    store.get(a.id)
+    c = store.create()
+    store.eval(c, 'let s = "' + "c" * 12000 + '";')
+    assert store.get(b.id) is None, "least recently used session should be evicted"
+    assert store.get(a.id) is a and store.get(c.id) is c, "recently used sessions should be kept"
+    assert store.total_bytes <= 30000, f"memory cap not enforced, got={store.total_bytes}"
+
+def test_snapshot_restore():
+    store = SessionStore()
+    session = store.create()
+    store.eval(session, "let counter = fn(n) { fn() { n + 1 } }; let next = counter(41);")
+    data = store.snapshot(session)
+    restored = SessionStore().restore(data)
+    assert restored.id != session.id, "restored session should get a new id"
+    result = SessionStore().eval(restored, "next()", fields=["evaluated"])
+    assert result == {"evaluated": "42"}, f"restored session lost its closures, got={result}"
+
+    store.eval(session, "let r = range(100000000);", fields=["evaluated"])
+    with pytest.raises(ValueError):
+        store.snapshot(session)
+    store.eval(session, "let r = range(3);")
+    restored = SessionStore().restore(store.snapshot(session))
+    assert restored.env.get("r").type() == obj.ObjectTypeEnum.SEQUENCE_OBJ, "sequence restored as another type"
+
+def test_eval_timeout():
+    store = SessionStore(timeout=0.05)
+    session = store.create()
+    store.eval(session, "let x = 1;")
+    result = store.eval(session, "while (true) { 1 }", fields=["evaluated"])
+    assert result == {"evaluated": "ERROR: timed out after 0.05s"}, f"runaway line not stopped, got={result}"
+    result = store.eval(session, "x", fields=["evaluated"])
+    assert result == {"evaluated": "1"}, f"session unusable after a timeout, got={result}"
+
+def test_eval_memory_quota():
+    store = SessionStore(max_allocated_bytes=10000)
+    session = store.create()
+    result = store.eval(session, 'let s = ""; while (true) { let s = s + "x"; }', fields=["evaluated"])
+    assert result == {"evaluated": "ERROR: memory quota exceeded: allocated more than 10000 bytes"}, \
+        f"quota not applied to session lines, got={result}"
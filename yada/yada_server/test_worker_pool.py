@@ -0,0 +1,59 @@
+import threading
+import time
+import pytest
+from yada.yada_server.worker_pool import WorkerPool, PoolBusy, EvaluationTimeout, limits_from_env
+
+LOOP_FOREVER = "while (true) { 1 }"
+
+@pytest.fixture(scope="module")
+def pool():
+    with WorkerPool(size=1, timeout=2, max_queue=0) as p:
+        yield p
+
+def test_run(pool):
+    result = pool.run("let x = 2; puts(x); x * 21")
+    assert result["evaluated"] == "42", f"wrong result, got={result['evaluated']}"
+    assert result["output"] == "2\n", f"wrong output, got={result['output']}"
+    result = pool.run("1 + 1", fields=("evaluated",))
+    assert result == {"evaluated": "2"}, f"fields not applied, got={result}"
+
+def test_timeout_replaces_worker(pool):
+    before = pool.workers[0].pid
+    with pytest.raises(EvaluationTimeout):
+        pool.run(LOOP_FOREVER)
+    assert len(pool.workers) == 1, f"pool size changed, got={len(pool.workers)}"
+    assert pool.workers[0].pid != before, "stuck worker was not replaced"
+    assert pool.stats["timeouts"] == 1 and pool.stats["restarts"] == 1, f"wrong pool stats, got={pool.stats}"
+    assert pool.run("5")["evaluated"] == "5", "replacement worker does not run programs"
+
+def test_backpressure(pool):
+    busy = threading.Thread(target=lambda: pytest.raises(EvaluationTimeout, pool.run, LOOP_FOREVER))
+    busy.start()
+    deadline = time.time() + 2
+    while pool.pending == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(PoolBusy):
+        pool.run("1")
+    busy.join()
+    assert pool.run("1")["evaluated"] == "1", "pool did not recover after the busy worker was replaced"
+
+def test_prelude():
+    with WorkerPool(size=2, prelude="let base = 40; let add = fn(x) { base + x };") as p:
+        result = p.run("let base = 1; add(2) + base")
+        assert result["evaluated"] == "43", f"prelude not visible to programs, got={result['evaluated']}"
+        assert p.run("base")["evaluated"] == "40", "a program changed the prelude for later ones"
+        zygote = p.zygote.pid
+        p.zygote.process.kill()
+        p.zygote.process.join()
+        p._add_worker()
+        assert p.zygote.pid != zygote, "zygote not restarted"
+        assert len(p.workers) == 3, f"no worker added, got={len(p.workers)}"
+        results = [p.run("add(0)")["evaluated"] for _ in range(6)]
+        assert results == ["40"] * 6, f"workers from the restarted zygote lost the prelude, got={results}"
+
+def test_limits_from_env(monkeypatch):
+    monkeypatch.setenv("YADA_TIMEOUT", "2.5")
+    monkeypatch.setenv("YADA_MAX_STEPS", "1000")
+    monkeypatch.setenv("YADA_MAX_ALLOCATED_BYTES", "4096")
+    limits = limits_from_env()
+    assert limits == {"timeout": 2.5, "max_steps": 1000, "max_allocated_bytes": 4096}, f"wrong limits, got={limits}"
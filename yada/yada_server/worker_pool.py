@@ -0,0 +1,301 @@
+import gc
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import threading
+from multiprocessing.connection import Connection
+from typing import Dict, List
+
+from yada.yada_python.yada_frontend import Yada, Prelude, new_interpreter, MEMO_MAX_ENTRIES
+
+# Modules the fork server imports once, so the zygote it forks starts warm
+PRELOAD = ["yada.yada_python.yada_frontend"]
+# The zygote runs this before forking any worker so no first request is slower
+WARMUP_PROGRAM = "let f = fn(x) { x + 1 }; f(1);"
+
+DEFAULT_TIMEOUT = 10.0
+# Seconds a client is told to wait before retrying when every worker is busy
+RETRY_AFTER_SECONDS = 1
+
+class PoolBusy(Exception):
+    """ Raised instead of queueing when too many requests are already waiting. """
+
+class EvaluationTimeout(Exception):
+    """ Raised when a program runs past the pool's timeout; its worker is replaced. """
+
+class WorkerCrashed(Exception):
+    """ Raised when a worker dies while running a program; it is replaced. """
+
+class Worker():
+    pid: int
+    conn: Connection
+
+    def __init__(self, pid: int, conn: Connection):
+        self.pid = pid
+        self.conn = conn
+
+    def kill(self) -> None:
+        # Workers are children of the zygote, which reaps them
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+
+class Zygote():
+    """
+    A process that builds everything a worker needs once (interpreter,
+    parsed and evaluated prelude, warmed-up code paths) and then forks
+    workers from itself, so they share those pages with it instead of each
+    building a copy, and start in about the time a fork takes.
+
+    Before the first fork it calls gc.freeze(), which moves everything built
+    so far out of the collector's reach: collections in the workers then
+    never write to those objects' GC headers, which would copy the pages.
+    Reference counts still change when a worker touches an object, so pages
+    holding objects the programs use are copied all the same.
+    """
+    pid: int
+    sock: socket.socket
+
+    def __init__(self, ctx, memo_max_entries: int | None, prelude: str | None, max_allocated_bytes: int | None):
+        self.sock, child = socket.socketpair()
+        self.process = ctx.Process(target=_zygote_main, args=(child, memo_max_entries, prelude, max_allocated_bytes),
+                                   daemon=True)
+        self.process.start()
+        child.close()
+        self.pid = self.process.pid
+        self._lock = threading.Lock()
+        if self.sock.recv(1) != b"R":
+            self.process.join()
+            raise RuntimeError(f"worker zygote failed to start (exit code {self.process.exitcode})")
+
+    def fork(self) -> Worker:
+        with self._lock:
+            self.sock.sendall(b"F")
+            msg, fds, _, _ = socket.recv_fds(self.sock, 8, 1)
+        if len(fds) != 1:
+            raise EOFError("worker zygote exited")
+        return Worker(int.from_bytes(msg, "little"), Connection(fds[0]))
+
+    def stop(self) -> None:
+        self.sock.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+
+class WorkerPool():
+    """
+    A fixed number of worker processes that run Yada programs for the server,
+    so evaluations use every core instead of taking turns on the GIL.
+
+    Workers are forked from a Zygote that has already imported and warmed up
+    the interpreter and evaluated the `prelude` source, if any; every
+    program then runs in a fork of that prelude (see yada_frontend.Prelude).
+    `run` blocks the calling thread
+    until an idle worker has run the program. A program still running after
+    `timeout` seconds gets its worker killed and replaced, and the caller gets
+    EvaluationTimeout. A program allocating more than `max_allocated_bytes`
+    evaluates to an Error instead of growing its worker without bound. Once
+    every worker is busy and `max_queue` more callers are waiting for one,
+    further callers get PoolBusy right away.
+    """
+    size: int
+    timeout: float | None
+    max_queue: int
+    memo_max_entries: int | None
+    prelude: str | None
+    max_allocated_bytes: int | None
+    zygote: Zygote
+    idle: queue.Queue
+    workers: List[Worker]
+    pending: int
+    stats: Dict[str, int]
+
+    def __init__(self, size: int = None, timeout: float | None = DEFAULT_TIMEOUT, max_queue: int = None,
+                 memo_max_entries: int | None = MEMO_MAX_ENTRIES, prelude: str = None,
+                 max_allocated_bytes: int | None = None):
+        self.size = size or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_queue = max_queue if max_queue is not None else 4 * self.size
+        self.memo_max_entries = memo_max_entries
+        self.prelude = prelude
+        self.max_allocated_bytes = max_allocated_bytes
+        self._ctx = multiprocessing.get_context("forkserver")
+        self._ctx.set_forkserver_preload(PRELOAD)
+        self.zygote = Zygote(self._ctx, memo_max_entries, prelude, max_allocated_bytes)
+        self._zygote_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.stats = {"timeouts": 0, "crashes": 0, "restarts": 0, "rejected": 0}
+        self.closed = False
+        self.idle = queue.Queue()
+        self.workers = []
+        for _ in range(self.size):
+            self._add_worker()
+
+    def run(self, source: str, fields: tuple = None) -> dict:
+        """ Runs `source` like Yada() in a worker and returns its result. """
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("worker pool is closed")
+            if self.pending >= self.size + self.max_queue:
+                self.stats["rejected"] += 1
+                raise PoolBusy(f"{self.pending - self.size} requests already waiting for a worker")
+            self.pending += 1
+        try:
+            return self._run(source, fields)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def _run(self, source: str, fields: tuple) -> dict:
+        worker = self.idle.get()
+        try:
+            worker.conn.send((source, fields))
+            if not worker.conn.poll(self.timeout):
+                with self._lock:
+                    self.stats["timeouts"] += 1
+                self._replace(worker)
+                worker = None
+                raise EvaluationTimeout(f"evaluation took longer than {self.timeout}s")
+            status, value = worker.conn.recv()
+        except (EOFError, OSError):
+            with self._lock:
+                self.stats["crashes"] += 1
+            self._replace(worker)
+            worker = None
+            raise WorkerCrashed("worker exited while running the program")
+        finally:
+            if worker is not None:
+                self.idle.put(worker)
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def queue_depth(self) -> int:
+        """ How many callers are waiting for a worker right now. """
+        with self._lock:
+            return max(self.pending - self.size, 0)
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            workers, self.workers = self.workers, []
+        for w in workers:
+            w.stop()
+        self.zygote.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _add_worker(self) -> None:
+        zygote = self.zygote
+        try:
+            worker = zygote.fork()
+        except (EOFError, OSError):
+            with self._zygote_lock:
+                if self.zygote is zygote:
+                    self.zygote = Zygote(self._ctx, self.memo_max_entries, self.prelude, self.max_allocated_bytes)
+            worker = self.zygote.fork()
+        with self._lock:
+            self.workers.append(worker)
+        self.idle.put(worker)
+
+    def _replace(self, worker: Worker) -> None:
+        worker.kill()
+        with self._lock:
+            if self.closed:
+                return
+            self.workers.remove(worker)
+            self.stats["restarts"] += 1
+        self._add_worker()
+
+def pool_from_env() -> WorkerPool | None:
+    """
+    YADA_WORKERS sets the number of worker processes (0 runs evaluations on
+    the request threads), YADA_TIMEOUT the seconds a program may run and
+    YADA_MAX_QUEUE how many requests may wait for a worker, YADA_PRELUDE
+    the path of a Yada file every program starts from and
+    YADA_MAX_ALLOCATED_BYTES the memory quota of each program.
+    """
+    workers = int(os.environ.get("YADA_WORKERS", os.cpu_count() or 1))
+    if workers <= 0:
+        return None
+    timeout = float(os.environ.get("YADA_TIMEOUT", DEFAULT_TIMEOUT))
+    max_queue = os.environ.get("YADA_MAX_QUEUE")
+    prelude = None
+    if os.environ.get("YADA_PRELUDE"):
+        with open(os.environ["YADA_PRELUDE"]) as f:
+            prelude = f.read()
+    max_allocated = os.environ.get("YADA_MAX_ALLOCATED_BYTES")
+    return WorkerPool(workers, timeout, int(max_queue) if max_queue else None, prelude=prelude,
+                      max_allocated_bytes=int(max_allocated) if max_allocated else None)
+
+def limits_from_env() -> dict:
+    """
+    Limits for evaluations a server runs on its own threads, where there is
+    no worker to kill: YADA_TIMEOUT seconds and YADA_MAX_ALLOCATED_BYTES (as
+    for the pool), and at most YADA_MAX_STEPS steps (see Interpreter).
+    """
+    max_steps = os.environ.get("YADA_MAX_STEPS")
+    max_allocated = os.environ.get("YADA_MAX_ALLOCATED_BYTES")
+    return {
+        "timeout": float(os.environ.get("YADA_TIMEOUT", DEFAULT_TIMEOUT)),
+        "max_steps": int(max_steps) if max_steps else None,
+        "max_allocated_bytes": int(max_allocated) if max_allocated else None,
+    }
+
+def _zygote_main(sock: socket.socket, memo_max_entries: int | None, prelude_source: str | None,
+                 max_allocated_bytes: int | None) -> None:
+    # No collections while the shared state is built; it is frozen as a whole
+    gc.disable()
+    interp = new_interpreter(memo_max_entries, max_allocated_bytes=max_allocated_bytes)
+    prelude = Prelude(prelude_source, interp) if prelude_source else None
+    Yada(WARMUP_PROGRAM, interpreter=interp, prelude=prelude)
+    gc.freeze()
+    # Workers are reaped as soon as they exit
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    sock.sendall(b"R")
+    while sock.recv(1) == b"F":
+        parent, child = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            sock.close()
+            parent.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            gc.enable()
+            try:
+                _worker_main(Connection(child.detach()), interp, prelude)
+            finally:
+                os._exit(0)
+        child.close()
+        socket.send_fds(sock, [pid.to_bytes(8, "little")], [parent.fileno()])
+        parent.close()
+
+def _worker_main(conn: Connection, interp, prelude: Prelude | None) -> None:
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        source, fields = msg
+        try:
+            conn.send(("ok", Yada(source, interpreter=interp, fields=fields, prelude=prelude)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))